@@ -1,257 +1,48 @@
-from fastapi import FastAPI, HTTPException
-import sqlite3
+from fastapi import FastAPI, HTTPException, Request
+import numpy as np
 import pandas as pd
-import joblib
-from datetime import datetime
 import os
 import time
 import threading
-from process import preprocess_data  # Fonction de prétraitement
-import sys
-from generate_fake_data import generate
+from artifacts import registry  # Modèle + colonnes de référence partagés
+from generate_fake_data import generate, stream_files, write_file
+from ingestion import IngestionEngine  # Pool de scoring + écrivain SQLite unique
+from db import (MAX_EXPORT_SIZE, PARTITION_BY, connect_readonly, connections_query, database_size, init_db,
+                list_partitions, stats_query, timeseries_query)  # Schéma, requêtes et réglages SQLite (WAL)
+from typing import Optional
+from cache import response_cache  # Cache des réponses invalidé à chaque commit d'ingestion
+from fastapi.responses import Response, StreamingResponse
+from formats import MEDIA_TYPES, STREAM_FORMATS, encode_frame, negotiate_format, stream_query  # Formats de réponse
+from online import PREDICT_PERSIST, PredictionBatcher, parse_records  # Scoring en ligne (/predict)
+from metrics import (DB_SIZE, HTTP_SECONDS, READ_PENDING, READ_REJECTED, WATCH_BACKLOG, WATCH_OLDEST_AGE,
+                     log_sampled, render)  # Métriques Prometheus
+from readpool import ReadOverloaded, ReadPool, ReadTimeout  # Lectures : connexions en lecture seule, admission, délais
+from watcher import folder_backlog
+from events import TooManySubscribers, event_broker  # Flux des nouvelles lignes (Server-Sent Events)
 
 # ------------------------ 1️⃣ 🚀 INITIALISATION VARIABLES ------------------------
 
-DB_PATH = "/app/network_traffic.db" # Chemin de la base de données SQLite
-MODEL_PATH = "model.pkl"
-WATCHED_FOLDER = "/app/watched_folder"
+DB_PATH = os.environ.get("DB_PATH", "/app/network_traffic.db") # Chemin de la base de données SQLite
+WATCHED_FOLDER = os.environ.get("WATCHED_FOLDER", "/app/watched_folder")
 
-# Charger le modèle ML
-model = joblib.load(MODEL_PATH)
+# Générateur de démonstration : 0 = petit fichier (1 à 10 lignes) toutes les 2 s ;
+# sinon débit cible en lignes/s, par fichiers de GENERATOR_FILE_ROWS lignes (tests de charge)
+GENERATOR_ROWS_PER_SECOND = float(os.environ.get("GENERATOR_ROWS_PER_SECOND", "0"))
+GENERATOR_FILE_ROWS = int(os.environ.get("GENERATOR_FILE_ROWS", "10000"))
+GENERATOR_SEED = int(os.environ["GENERATOR_SEED"]) if os.environ.get("GENERATOR_SEED") else None
+GENERATOR_ATTACK_RATIO = float(os.environ["GENERATOR_ATTACK_RATIO"]) if os.environ.get("GENERATOR_ATTACK_RATIO") else None
 
 # ------------------------ 2️⃣ 🗄️ INITIALISATION BDD ------------------------
 
-def init_db():
-    """
-    Initialise la base de données SQLite en créant la table `connections` si elle n’existe pas.
-    """
-    try:
-        conn = sqlite3.connect(DB_PATH, timeout=10)
-
-        cursor = conn.cursor()
-
-        # Création de la table avec 117 colonnes + timestamp
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                duration REAL,
-                src_bytes INTEGER,
-                dst_bytes INTEGER,
-                land INTEGER,
-                wrong_fragment INTEGER,
-                urgent INTEGER,
-                hot INTEGER,
-                num_failed_logins INTEGER,
-                logged_in INTEGER,
-                num_compromised INTEGER,
-                root_shell INTEGER,
-                su_attempted INTEGER,
-                num_root INTEGER,
-                num_file_creations INTEGER,
-                num_shells INTEGER,
-                num_access_files INTEGER,
-                num_outbound_cmds INTEGER,
-                is_host_login INTEGER,
-                is_guest_login INTEGER,
-                count INTEGER,
-                srv_count INTEGER,
-                serror_rate REAL,
-                srv_serror_rate REAL,
-                rerror_rate REAL,
-                srv_rerror_rate REAL,
-                same_srv_rate REAL,
-                diff_srv_rate REAL,
-                srv_diff_host_rate REAL,
-                dst_host_count INTEGER,
-                dst_host_srv_count INTEGER,
-                dst_host_same_srv_rate REAL,
-                dst_host_diff_srv_rate REAL,
-                dst_host_same_src_port_rate REAL,
-                dst_host_srv_diff_host_rate REAL,
-                dst_host_serror_rate REAL,
-                dst_host_srv_serror_rate REAL,
-                dst_host_rerror_rate REAL,
-                dst_host_srv_rerror_rate REAL,
-                protocol_type_icmp INTEGER,
-                protocol_type_tcp INTEGER,
-                protocol_type_udp INTEGER,
-                service_IRC INTEGER,
-                service_X11 INTEGER,
-                service_Z39_50 INTEGER,
-                service_auth INTEGER,
-                service_bgp INTEGER,
-                service_courier INTEGER,
-                service_csnet_ns INTEGER,
-                service_ctf INTEGER,
-                service_daytime INTEGER,
-                service_discard INTEGER,
-                service_domain INTEGER,
-                service_domain_u INTEGER,
-                service_echo INTEGER,
-                service_eco_i INTEGER,
-                service_ecr_i INTEGER,
-                service_efs INTEGER,
-                service_exec INTEGER,
-                service_finger INTEGER,
-                service_ftp INTEGER,
-                service_ftp_data INTEGER,
-                service_gopher INTEGER,
-                service_hostnames INTEGER,
-                service_http INTEGER,
-                service_http_443 INTEGER,
-                service_icmp INTEGER,
-                service_imap4 INTEGER,
-                service_iso_tsap INTEGER,
-                service_klogin INTEGER,
-                service_kshell INTEGER,
-                service_ldap INTEGER,
-                service_link INTEGER,
-                service_login INTEGER,
-                service_mtp INTEGER,
-                service_name INTEGER,
-                service_netbios_dgm INTEGER,
-                service_netbios_ns INTEGER,
-                service_netbios_ssn INTEGER,
-                service_netstat INTEGER,
-                service_nnsp INTEGER,
-                service_nntp INTEGER,
-                service_ntp_u INTEGER,
-                service_other INTEGER,
-                service_pm_dump INTEGER,
-                service_pop_2 INTEGER,
-                service_pop_3 INTEGER,
-                service_printer INTEGER,
-                service_private INTEGER,
-                service_remote_job INTEGER,
-                service_rje INTEGER,
-                service_shell INTEGER,
-                service_smtp INTEGER,
-                service_sql_net INTEGER,
-                service_ssh INTEGER,
-                service_sunrpc INTEGER,
-                service_supdup INTEGER,
-                service_systat INTEGER,
-                service_telnet INTEGER,
-                service_tftp_u INTEGER,
-                service_tim_i INTEGER,
-                service_time INTEGER,
-                service_urp_i INTEGER,
-                service_uucp INTEGER,
-                service_uucp_path INTEGER,
-                service_vmnet INTEGER,
-                service_whois INTEGER,
-                flag_OTH INTEGER,
-                flag_REJ INTEGER,
-                flag_RSTO INTEGER,
-                flag_RSTOS0 INTEGER,
-                flag_RSTR INTEGER,
-                flag_S0 INTEGER,
-                flag_S1 INTEGER,
-                flag_S2 INTEGER,
-                flag_S3 INTEGER,
-                flag_SF INTEGER,
-                flag_SH INTEGER,
-                Predicted_Class INTEGER,
-                Prediction_Probability REAL
-            )
-        """)
-        conn.commit()
-        print("✅ Table 'connections' initialisée avec succès.", flush=True)
-    except Exception as e:
-        print(f"❌ Erreur lors de l'initialisation de la base de données : {e}",flush=True)
-    finally:
-        conn.close()
-
-# Lancer l'initialisation au démarrage
-init_db()
+# Schéma, réglages SQLite et écrivain unique : voir db.py
 
 # ------------------------ 3️⃣ 👀 SURVEILLANCE TEMPS RÉEL ------------------------
 
-def watch_and_process():
-    """
-    Surveille un dossier en temps réel et insère les données en BDD.
-    """
-    if not os.path.exists(WATCHED_FOLDER):
-        os.makedirs(WATCHED_FOLDER)
-
-    while True:
-        try:
-            files = [f for f in os.listdir(WATCHED_FOLDER) if os.path.isfile(os.path.join(WATCHED_FOLDER, f))]
-            
-            if files:
-                latest_file = min(files, key=lambda f: os.path.getctime(os.path.join(WATCHED_FOLDER, f)))
-                file_path = os.path.join(WATCHED_FOLDER, latest_file)
-                
-                print(f"📂 Nouvelle alerte détectée : {latest_file}", flush=True)
-
-                df_raw = pd.read_csv(file_path, delimiter=",", header=None)
-                print(f"🔍 {len(df_raw)} lignes trouvées", flush=True)
-
-                df_processed = preprocess_data(df_raw)
-
-                if df_processed.shape[1] != 119:
-                    print(f"⚠️ Erreur après preprocessing : {df_processed.shape[1]} colonnes trouvées, 119 attendues.", flush=True)
-                    os.remove(file_path)
-                    continue
-                
-                # Ajouter un timestamp en première position
-                df_processed.insert(0, "timestamp", datetime.utcnow().isoformat())
-
-                
-                conn = sqlite3.connect(DB_PATH, timeout=10)
-
-                cursor = conn.cursor()
-
-                # print(f"🔍 Colonnes du DataFrame après preprocessing: {df_processed.columns.tolist()}", flush=True)
-
-
-                try:
-                    cursor.executemany("""
-                        INSERT INTO connections 
-                        (timestamp, duration, src_bytes, dst_bytes, land, wrong_fragment, urgent, hot, 
-                        num_failed_logins, logged_in, num_compromised, root_shell, su_attempted, num_root, 
-                        num_file_creations, num_shells, num_access_files, num_outbound_cmds, is_host_login, 
-                        is_guest_login, count, srv_count, serror_rate, srv_serror_rate, rerror_rate, 
-                        srv_rerror_rate, same_srv_rate, diff_srv_rate, srv_diff_host_rate, dst_host_count, 
-                        dst_host_srv_count, dst_host_same_srv_rate, dst_host_diff_srv_rate, 
-                        dst_host_same_src_port_rate, dst_host_srv_diff_host_rate, dst_host_serror_rate, 
-                        dst_host_srv_serror_rate, dst_host_rerror_rate, dst_host_srv_rerror_rate, 
-                        protocol_type_icmp, protocol_type_tcp, protocol_type_udp, service_IRC, service_X11, 
-                        service_Z39_50, service_auth, service_bgp, service_courier, service_csnet_ns, 
-                        service_ctf, service_daytime, service_discard, service_domain, service_domain_u, 
-                        service_echo, service_eco_i, service_ecr_i, service_efs, service_exec, service_finger, 
-                        service_ftp, service_ftp_data, service_gopher, service_hostnames, service_http, 
-                        service_http_443, service_icmp, service_imap4, service_iso_tsap, service_klogin, service_kshell, 
-                        service_ldap, service_link, service_login, service_mtp, service_name, service_netbios_dgm, 
-                        service_netbios_ns, service_netbios_ssn, service_netstat, service_nnsp, service_nntp, 
-                        service_ntp_u, service_other, service_pm_dump, service_pop_2, service_pop_3, service_printer, 
-                        service_private, service_remote_job, service_rje, service_shell, service_smtp, 
-                        service_sql_net, service_ssh, service_sunrpc, service_supdup, service_systat, 
-                        service_telnet,service_tftp_u, service_tim_i, service_time, service_urp_i, service_uucp, service_uucp_path, 
-                        service_vmnet, service_whois, flag_OTH, flag_REJ, flag_RSTO, flag_RSTOS0, flag_RSTR, 
-                        flag_S0, flag_S1, flag_S2, flag_S3, flag_SF, flag_SH, Predicted_Class, Prediction_Probability) 
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? ,? , ?, ?, ?, ?, ?, ?, ?)
-                    """, df_processed.values.tolist())
-
-                    conn.commit()
-                    print(f"✅ {len(df_processed)} lignes insérées", flush=True)
-                except Exception as e:
-                    print(f"❌ Erreur lors de l'insertion SQL: {e}", flush=True)
-                finally:
-                    conn.close()
-
-                os.remove(file_path)
-                print(f"🗑️ Fichier supprimé : {latest_file}", flush=True)
-
-            time.sleep(2)
-
-        except Exception as e:
-            print(f"⚠️ Erreur : {e}", flush=True)
-            time.sleep(3)
-
-# Délai avant lancement pour s'assurer que la BDD est prête
-time.sleep(4)
+# Créés au lancement du serveur (cf. `start_background_threads`) et non à l'import :
+# les processus de scoring ("spawn") réexécutent ce module, ils ne doivent ni threads ni connexions
+ingestion_engine = None  # Distribution sur un pool de processus, écriture ordonnée par un thread unique
+prediction_batcher = None  # Scoring en ligne : requêtes concurrentes regroupées, persistées via l'écrivain
+read_pool = None  # Lectures de l'API : pool borné de connexions longue durée en lecture seule
 
 
 # ------------------------ 4️⃣ 🚀 API Valeurs auto ------------------------
@@ -260,17 +51,22 @@ def temps_reel():
     """
     Génère un fichier texte contenant des données factices toutes les 5 secondes.
     Le fichier est au format CSV (séparé par des virgules) et sans en-têtes.
+    Avec GENERATOR_ROWS_PER_SECOND, dépose à la place des fichiers au débit cible (cf. `stream_files`).
     """
-    while True:
-        raw = generate()  # Génération des données factices
+    if GENERATOR_ROWS_PER_SECOND > 0:
+        stream_files(WATCHED_FOLDER, GENERATOR_ROWS_PER_SECOND, GENERATOR_FILE_ROWS,
+                     seed=GENERATOR_SEED, attack_ratio=GENERATOR_ATTACK_RATIO)
+        return
 
-        file_name = f"generated_data_{int(time.time())}.txt"
-        file_path = os.path.join(WATCHED_FOLDER, file_name)
+    rng = np.random.default_rng(GENERATOR_SEED)
+    while True:
+        raw = generate(rng=rng, attack_ratio=GENERATOR_ATTACK_RATIO)  # Génération des données factices
 
         # Sauvegarde au format TXT (CSV avec virgules, sans index, sans en-têtes)
-        raw.to_csv(file_path, index=False, header=False, sep=",")
+        # Écriture dans un fichier temporaire puis renommage atomique : jamais de fichier à moitié écrit
+        file_path = write_file(raw, WATCHED_FOLDER, f"generated_data_{int(time.time())}")
 
-        print(f"📄 Nouveau fichier TXT généré : {file_name} ({len(raw)} lignes)")
+        log_sampled("file_generated", file=os.path.basename(file_path), rows=len(raw))
 
         time.sleep(2) # ✅ Attendre 5 secondes avant de générer un nouveau fichier
 
@@ -289,61 +85,181 @@ app.add_middleware(
 )
 
 
+async def _read(endpoint, fn, *args):
+    """
+    Exécute une lecture sur le pool ; surcharge -> 503 (à réessayer), délai dépassé -> 504.
+    """
+    try:
+        return await read_pool.run(fn, *args)
+    except ReadOverloaded as e:
+        READ_REJECTED.inc(endpoint=endpoint, reason="overload")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ReadTimeout as e:
+        READ_REJECTED.inc(endpoint=endpoint, reason="timeout")
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+def _connections_page(conn, fmt, args, points=None):
+    if points is not None:
+        protocol, start, end, min_score = args[:4]
+        df = timeseries_query(conn, protocol, start, end, min_score, points, partitions=list_partitions(conn))
+    else:
+        query, params = connections_query(*args, partitions=list_partitions(conn))
+        df = pd.read_sql_query(query, conn, params=params)
+    if df.empty:
+        return {"message": "Aucune donnée disponible"}
+    return encode_frame(df, fmt)
+
+
 @app.get("/get_data")
-def get_data(protocol: str = "all"):
+async def get_data(request: Request, protocol: str = "all", start: Optional[str] = None, end: Optional[str] = None,
+             min_score: Optional[float] = None, before_id: Optional[int] = None, limit: int = 300,
+             since_id: Optional[int] = None, format: Optional[str] = None, points: Optional[int] = None):
+    """
+    Dernières connexions, de la plus récente à la plus ancienne.
+    Filtres optionnels (appliqués en SQL) : protocole, plage de temps [start, end[ (ISO 8601),
+    score d'anomalie minimal. Page suivante : `before_id` = plus petit `id` de la page courante.
+    Mode delta : `since_id` = plus grand `id` déjà reçu, seules les lignes plus récentes sont retournées.
+    Format (`format` ou en-tête `Accept`) : "records" (défaut), "columns" (un tableau par colonne),
+    "ndjson" ou "arrow" (flux IPC) ; ces deux derniers sont envoyés en flux, jusqu'à MAX_EXPORT_SIZE lignes.
+    Série temporelle : `points` = budget de points du graphique ; la plage [start, end[ est sous-échantillonnée
+    côté serveur (lignes de score min. et max. par intervalle de temps, cf. `timeseries_query`), formats JSON uniquement.
+    Réponses JSON mises en cache jusqu'au prochain commit d'ingestion, avec ETag (304 si inchangée).
+    Requêtes exécutées sur le pool de lecture (cf. `ReadPool`) : 503 si surchargé, 504 si trop longues.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=10)
-
-        df = pd.read_sql_query("""
-            SELECT timestamp, src_bytes, dst_bytes, protocol_type_tcp, protocol_type_udp, protocol_type_icmp, Predicted_Class, Prediction_Probability 
-            FROM connections 
-            ORDER BY timestamp DESC LIMIT 300
-        """, conn)
-        conn.close()
-
-        # Convertir les colonnes binaires en une colonne "protocol"
-        def get_protocol(row):
-            if row["protocol_type_tcp"] == 1:
-                return "TCP"
-            elif row["protocol_type_udp"] == 1:
-                return "UDP"
-            elif row["protocol_type_icmp"] == 1:
-                return "ICMP"
-            return "Unknown"
-
-        df["protocol"] = df.apply(get_protocol, axis=1)
-
-        # Renommer les colonnes pour correspondre à Dash
-        df.rename(columns={
-            "src_bytes": "source_ip",  
-            "dst_bytes": "destination_ip",
-            "Predicted_Class": "port",
-            "Prediction_Probability": "anomaly_score"
-        }, inplace=True)
-
-        # Appliquer le filtre protocole
-        if protocol != "all":
-            df = df[df["protocol"] == protocol]
-
-        return df.to_dict(orient="records") if not df.empty else {"message": "Aucune donnée disponible"}
+        fmt = negotiate_format(format, request.headers.get("accept"))
+        if points is not None and fmt in STREAM_FORMATS:
+            raise ValueError("Série temporelle (`points`) disponible en JSON uniquement (records, columns)")
     except Exception as e:
         return {"error": str(e)}
 
+    args = (protocol, start, end, min_score, before_id, limit, since_id)
+    # Latence hors envoi du corps pour les flux (mesurée jusqu'à la préparation de la requête)
+    with HTTP_SECONDS.time(endpoint="/get_data", format=fmt):
+        try:
+            if fmt in STREAM_FORMATS:
+                # Export en flux : connexion dédiée (en lecture seule) pour la durée de l'envoi,
+                # pour ne pas immobiliser une connexion du pool
+                partitions = await _read("/get_data", list_partitions) if PARTITION_BY != "none" else None
+                query, params = connections_query(*args, max_limit=MAX_EXPORT_SIZE, partitions=partitions)
+                return StreamingResponse(
+                    stream_query(lambda: connect_readonly(DB_PATH, check_same_thread=False), query, params, fmt),
+                    media_type=MEDIA_TYPES[fmt])
+
+            return await response_cache.respond_async(
+                request, lambda: _read("/get_data", _connections_page, fmt, args, points), variant=fmt)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return {"error": str(e)}
+
+
+@app.get("/stats")
+async def get_stats(request: Request, start: Optional[str] = None, end: Optional[str] = None, protocol: str = "all"):
+    """
+    Statistiques du tableau de bord (protocoles, classes, histogramme des scores, volume par minute)
+    sur [start, end[, calculées à partir des agrégats par minute maintenus à l'ingestion.
+    """
+    try:
+        with HTTP_SECONDS.time(endpoint="/stats", format="json"):
+            return await response_cache.respond_async(
+                request, lambda: _read("/stats", stats_query, start, end, protocol))
+    except HTTPException:
+        raise
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.get("/events")
+async def events(min_score: Optional[float] = None):
+    """
+    Flux Server-Sent Events des lignes commitées, poussées par l'écrivain après chaque commit
+    (événement "rows" : mêmes champs que `/get_data`, du plus récent au plus ancien ; l'id SSE est le plus grand id).
+    `min_score` ne transmet que les lignes dont le score d'anomalie atteint ce seuil.
+    Un client trop lent perd ses plus anciens messages (événement "gap") : il se resynchronise avec `/get_data?since_id=`.
+    """
+    try:
+        subscription = event_broker.subscribe(min_score)
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return StreamingResponse(event_broker.stream(subscription), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/predict")
+async def predict(request: Request, persist: bool = PREDICT_PERSIST):
+    """
+    Score immédiatement un ou plusieurs enregistrements bruts (42 champs, liste ou objet), sans passer par le dossier surveillé.
+    Type d'attaque (cascade multi-classe) pour les enregistrements suspects, `null` sinon.
+    Les requêtes concurrentes sont regroupées en un seul appel au modèle (cf. `PredictionBatcher`).
+    `persist=true` enregistre aussi les lignes scorées en base.
+    """
+    try:
+        df_raw = parse_records(await request.json())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        scored = await prediction_batcher.predict(df_raw, persist)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return {
+        "model_version": scored.attrs["model_version"],  # Version qui a scoré le lot (aucun rechargement ici)
+        "predictions": [
+            {"predicted_class": int(c), "probability": float(p), "attack_type": t,
+             "attack_probability": float(q) if q is not None else None}
+            for c, p, t, q in zip(scored["Predicted_Class"], scored["Prediction_Probability"],
+                                  scored["Attack_Type"], scored["Attack_Probability"])
+        ],
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métriques d'exploitation au format texte Prometheus : durée de chaque étape d'ingestion,
+    lignes/fichiers/commits, fichiers en attente et âge du plus ancien, taille de la base, latence des lectures.
+    """
+    backlog, oldest_age = folder_backlog(WATCHED_FOLDER)
+    WATCH_BACKLOG.set(backlog)
+    WATCH_OLDEST_AGE.set(oldest_age)
+    DB_SIZE.set(database_size(DB_PATH))
+    READ_PENDING.set(read_pool.pending)
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 # ------------------------ 6 🚀 THREADS ------------------------
 
+# Démarrage au lancement du serveur (et non à l'import : les processus du pool réimportent ce module)
+@app.on_event("startup")
+def start_background_threads():
+    global ingestion_engine, prediction_batcher, read_pool
+    ingestion_engine = IngestionEngine(WATCHED_FOLDER, DB_PATH)
+    prediction_batcher = PredictionBatcher(persist=ingestion_engine.submit_scored)
+    read_pool = ReadPool(DB_PATH)
+
+    # Charger le modèle ML une seule fois (rechargé à chaud par le registre si model.pkl change)
+    artifacts = registry.get()
+
+    # Lancer l'initialisation de la base (schéma large ou compact selon STORAGE_MODE)
+    init_db(DB_PATH, artifacts.reference_columns_post_processing)
+
+    # Délai avant lancement pour s'assurer que la BDD est prête
+    time.sleep(4)
 
-# Lancer le thread de surveillance
-thread = threading.Thread(target=watch_and_process, daemon=True)
-thread.start()
+    # Lancer l'ingestion (surveillance du dossier, scoring, écriture)
+    ingestion_engine.start()
 
-# Lancer le thread de génération automatique
-thread_generate = threading.Thread(target=temps_reel, daemon=True)
-thread_generate.start()
+    # Lancer le thread de génération automatique
+    thread_generate = threading.Thread(target=temps_reel, daemon=True)
+    thread_generate.start()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Les flux `/events` ne se terminent jamais d'eux-mêmes : arrêt forcé après 5 s
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=5)
 
 
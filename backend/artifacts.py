@@ -0,0 +1,197 @@
+import hashlib
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from cache import PREDICTION_CACHE_SIZE, PredictionCache
+from encoder import FeatureEncoder
+from forest import FOREST_MAX_ROWS, compile_forest
+
+# ------------------------ 1️⃣ 📦 CHEMINS DES ARTEFACTS ------------------------
+
+MODEL_PATH = os.environ.get("MODEL_PATH", "model.pkl")
+# Modèle multi-classe (type d'attaque) de la cascade : optionnel, la cascade est désactivée si le fichier est absent
+MULTICLASS_MODEL_PATH = os.environ.get("MULTICLASS_MODEL_PATH", "model_multiclass.pkl")
+REFERENCE_COLUMNS_PATH = os.environ.get("REFERENCE_COLUMNS_PATH", "reference_columns.pkl")
+REFERENCE_COLUMNS_POST_PROCESSING_PATH = os.environ.get(
+    "REFERENCE_COLUMNS_POST_PROCESSING_PATH", "reference_columns_post_processing.pkl"
+)
+
+# Intervalle minimal (en secondes) entre deux vérifications des fichiers sur disque
+ARTIFACTS_CHECK_INTERVAL = float(os.environ.get("ARTIFACTS_CHECK_INTERVAL", "2"))
+
+
+# ------------------------ 2️⃣ 🗂️ REGISTRE PARTAGÉ ------------------------
+
+class Artifacts:
+    """
+    Instantané immuable des artefacts chargés : le modèle (et sa forme compilée), le modèle multi-classe
+    optionnel, les deux listes de colonnes et l'encodeur précompilé à partir de celles-ci.
+    Tous proviennent toujours du même chargement, ils restent donc cohérents entre eux,
+    de même que le cache des prédictions rattaché à l'instantané.
+    """
+
+    def __init__(self, model, reference_columns, reference_columns_post_processing, version, hashes,
+                 multiclass_model=None):
+        self.model = model
+        self.reference_columns = reference_columns
+        self.reference_columns_post_processing = reference_columns_post_processing
+        self.version = version
+        self.hashes = hashes
+        # Colonnes dans l'ordre exact vu par le modèle à l'entraînement (à défaut, celui des colonnes de référence)
+        model_columns = getattr(model, "feature_names_in_", None)
+        self.encoder = FeatureEncoder(
+            reference_columns,
+            list(model_columns) if model_columns is not None else reference_columns_post_processing,
+        )
+        # Forêt aplatie pour l'inférence par lots (None si le modèle n'est pas une forêt prise en charge)
+        self.forest = compile_forest(model)
+
+        # Second étage de la cascade : mêmes variables, éventuellement dans un autre ordre que le modèle binaire
+        self.multiclass_model = multiclass_model
+        self.multiclass_forest = compile_forest(multiclass_model) if multiclass_model is not None else None
+        self.multiclass_order = None
+        multiclass_columns = getattr(multiclass_model, "feature_names_in_", None)
+        if multiclass_columns is not None and list(multiclass_columns) != self.encoder.columns:
+            position = {name: j for j, name in enumerate(self.encoder.columns)}
+            self.multiclass_order = np.array([position[name] for name in multiclass_columns], dtype=np.intp)
+
+        # Prédictions déjà calculées par ce modèle (None si PREDICTION_CACHE_SIZE = 0)
+        self.prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE) if PREDICTION_CACHE_SIZE > 0 else None
+
+    def predict_proba(self, X):
+        """
+        Probabilités par classe pour la matrice float32 produite par l'encodeur :
+        forêt compilée pour les petits lots, scikit-learn au-delà de FOREST_MAX_ROWS lignes (mêmes résultats).
+        """
+        if self.forest is not None and len(X) <= FOREST_MAX_ROWS:
+            return self.forest.predict_proba(X)
+        return self.model.predict_proba(self.encoder.model_input(X))
+
+    def predict_attack(self, X):
+        """
+        Type d'attaque (étiquette de `classes_`) et sa probabilité pour chaque ligne de X, par le modèle multi-classe.
+        """
+        if self.multiclass_order is not None:
+            X = np.ascontiguousarray(X[:, self.multiclass_order])
+        if self.multiclass_forest is not None and len(X) <= FOREST_MAX_ROWS:
+            proba = self.multiclass_forest.predict_proba(X)
+        else:
+            columns = getattr(self.multiclass_model, "feature_names_in_", self.encoder.columns)
+            proba = self.multiclass_model.predict_proba(pd.DataFrame(X, columns=columns, copy=False))
+        best = proba.argmax(axis=1)
+        return self.multiclass_model.classes_[best], proba[np.arange(len(X)), best]
+
+
+class ArtifactRegistry:
+    """
+    Garde en mémoire le modèle et les colonnes de référence, et les recharge à chaud
+    quand un des fichiers change sur disque.
+
+    - La vérification (mtime + taille) est faite au plus une fois par `check_interval`.
+    - Si la signature change, les fichiers sont hachés (SHA-256) : un simple `touch` ne recharge rien.
+    - Le nouvel instantané est construit entièrement avant d'être publié (remplacement atomique).
+    - Si le chargement échoue (fichier en cours d'écriture...), l'ancien instantané est conservé.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, reference_columns_path=REFERENCE_COLUMNS_PATH,
+                 reference_columns_post_processing_path=REFERENCE_COLUMNS_POST_PROCESSING_PATH,
+                 check_interval=ARTIFACTS_CHECK_INTERVAL, multiclass_model_path=MULTICLASS_MODEL_PATH):
+        self.paths = {
+            "model": model_path,
+            "reference_columns": reference_columns_path,
+            "reference_columns_post_processing": reference_columns_post_processing_path,
+        }
+        # Fichiers facultatifs : leur apparition, modification ou suppression recharge aussi les artefacts
+        self.optional_paths = {"multiclass_model": multiclass_model_path}
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._signature = None
+        self._last_check = 0.0
+
+    def _stat_signature(self):
+        signature = []
+        for path in self.paths.values():
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        for path in self.optional_paths.values():
+            st = os.stat(path) if os.path.exists(path) else None
+            signature.append((st.st_mtime_ns, st.st_size) if st is not None else None)
+        return tuple(signature)
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _load(self, signature):
+        hashes = {name: self._hash_file(path) for name, path in self.paths.items()}
+        optional = {name: path for name, path in self.optional_paths.items() if os.path.exists(path)}
+        hashes.update({name: self._hash_file(path) for name, path in optional.items()})
+
+        if self._current is not None and hashes == self._current.hashes:
+            # Contenu identique (touch, copie à l'identique) : rien à recharger
+            self._signature = signature
+            return
+
+        artifacts = Artifacts(
+            model=joblib.load(self.paths["model"]),
+            reference_columns=list(joblib.load(self.paths["reference_columns"])),
+            reference_columns_post_processing=list(joblib.load(self.paths["reference_columns_post_processing"])),
+            version=(self._current.version + 1) if self._current is not None else 1,
+            hashes=hashes,
+            multiclass_model=joblib.load(optional["multiclass_model"]) if "multiclass_model" in optional else None,
+        )
+
+        # Publication atomique : les lecteurs voient soit l'ancien, soit le nouvel instantané
+        self._current = artifacts
+        self._signature = signature
+        cascade = ", cascade multi-classe active" if artifacts.multiclass_model is not None else ""
+        print(f"📦 Artefacts chargés (version {artifacts.version}{cascade})", flush=True)
+
+    @property
+    def current(self):
+        """
+        Dernier instantané publié, sans examiner les fichiers : à utiliser sur la boucle asyncio, que la lecture
+        et le hachage d'un nouvel artefact ne doivent jamais bloquer. Le rechargement est détecté par `get`,
+        appelé par le thread d'inférence de `/predict` et les processus de scoring.
+        """
+        current = self._current
+        return current if current is not None else self.get()
+
+    def get(self):
+        """
+        Retourne l'instantané courant, en le rechargeant si les fichiers ont changé.
+        """
+        now = time.monotonic()
+        current = self._current
+        if current is not None and now - self._last_check < self.check_interval:
+            return current
+
+        with self._lock:
+            if self._current is not None and now - self._last_check < self.check_interval:
+                return self._current
+            self._last_check = now
+
+            try:
+                signature = self._stat_signature()
+                if signature != self._signature:
+                    self._load(signature)
+            except Exception as e:
+                if self._current is None:
+                    raise
+                print(f"⚠️ Rechargement des artefacts impossible, version {self._current.version} conservée : {e}", flush=True)
+
+            return self._current
+
+
+# Registre partagé par `app.py` et `process.py`
+registry = ArtifactRegistry()
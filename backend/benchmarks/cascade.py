@@ -0,0 +1,82 @@
+"""
+Benchmark de la cascade : modèle binaire sur tout le lot, modèle multi-classe sur les seules lignes suspectes.
+
+    cd backend && MULTICLASS_MODEL_PATH=model_multiclass.pkl \
+        python -m benchmarks.cascade [--sizes 1000,10000] [--thresholds 0.5,0.6,0.7] [--repeat 5]
+
+Pour chaque taille de lot et chaque seuil (CASCADE_THRESHOLD), mesure le coût de chaque étage de `score_features`
+("predict" binaire, "predict_multiclass" sur les lignes au-dessus du seuil) et le compare au modèle multi-classe
+appliqué à toutes les lignes (sans cascade). La part de lignes suspectes dépend du seuil et du modèle binaire.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import process
+from artifacts import registry
+from generate_fake_data import generate
+
+
+def _median(values):
+    return float(np.median(values)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    artifacts = registry.get()
+    if artifacts.multiclass_model is None:
+        raise SystemExit("❌ Aucun modèle multi-classe chargé (MULTICLASS_MODEL_PATH)")
+    encoder = artifacts.encoder
+    results = []
+
+    print(f"{'lignes':>8} {'seuil':>6} {'suspectes':>10} {'binaire (ms)':>13} {'multi (ms)':>11} {'cascade (ms)':>13} "
+          f"{'multi seul (ms)':>16}  gain")
+    for size in map(int, args.sizes.split(",")):
+        raw = generate(size, rng=args.seed)
+        numeric = encoder.numeric_values(raw)
+        X = encoder.encode(raw, numeric)
+
+        # Référence : type d'attaque calculé pour toutes les lignes
+        full = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            artifacts.predict_attack(X)
+            full.append(time.perf_counter() - start)
+        full_ms = _median(full)
+
+        for threshold in map(float, args.thresholds.split(",")):
+            process.CASCADE_THRESHOLD = threshold
+            binary, multiclass = [], []
+            for _ in range(args.repeat):
+                timings = {}
+                df = process.score_features(artifacts, X, numeric, timings)
+                binary.append(timings["predict"])
+                multiclass.append(timings.get("predict_multiclass", 0.0))
+            flagged = int(df["Attack_Type"].notna().sum())
+
+            row = {
+                "rows": size, "threshold": threshold, "flagged": flagged,
+                "binary_ms": _median(binary), "multiclass_ms": _median(multiclass), "multiclass_all_ms": full_ms,
+            }
+            row["cascade_ms"] = row["binary_ms"] + row["multiclass_ms"]
+            results.append(row)
+            gain = f"x{full_ms / row['multiclass_ms']:.1f}" if row["multiclass_ms"] else ""
+            print(f"{size:>8} {threshold:>6.2f} {flagged / size:>10.1%} {row['binary_ms']:>13.2f} "
+                  f"{row['multiclass_ms']:>11.2f} {row['cascade_ms']:>13.2f} {full_ms:>16.2f}  {gain}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark de l'inférence : `predict_proba` de scikit-learn contre la forêt compilée (forest.py), par taille de lot.
+
+    cd backend && python -m benchmarks.forest [--sizes 1,10,100,1000] [--threads 1,4] [--repeat 20]
+
+Les lignes sont produites par `generate_fake_data.generate` et encodées par l'encodeur des artefacts ;
+chaque mesure vérifie au passage que les deux moteurs donnent des probabilités identiques bit à bit.
+La même vérification est faite au préalable sur une forêt multi-classe : le modèle multi-classe des artefacts
+s'il est chargé, sinon une petite forêt entraînée sur les étiquettes d'attaque du lot généré.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from artifacts import registry
+from forest import CompiledForest
+from generate_fake_data import generate
+
+
+def _best(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), float(np.median(timings))
+
+
+def _check_multiclass(artifacts, raw, X_all, sizes):
+    """
+    Forêt multi-classe : probabilités identiques bit à bit à scikit-learn pour chaque taille de lot.
+    """
+    model = artifacts.multiclass_model
+    if model is None:
+        model = RandomForestClassifier(n_estimators=20, max_depth=12, random_state=0)
+        model.fit(artifacts.encoder.model_input(X_all), raw["label"].astype(str))
+    X_model = X_all if artifacts.multiclass_order is None else np.ascontiguousarray(X_all[:, artifacts.multiclass_order])
+    columns = getattr(model, "feature_names_in_", artifacts.encoder.columns)
+    forest = CompiledForest(model)
+    for size in sizes:
+        reference = model.predict_proba(pd.DataFrame(X_model[:size], columns=columns, copy=False))
+        if not np.array_equal(forest.predict_proba(X_model[:size]), reference):
+            raise SystemExit(f"❌ Probabilités multi-classes différentes de scikit-learn ({size} lignes)")
+    print(f"✅ Forêt multi-classe ({len(model.classes_)} classes) identique à scikit-learn", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100,500,1000,2000,5000,10000")
+    parser.add_argument("--threads", default="1,4")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    artifacts = registry.get()
+    model, encoder = artifacts.model, artifacts.encoder
+    forests = {threads: CompiledForest(model, threads=threads) for threads in map(int, args.threads.split(","))}
+    sizes = [int(size) for size in args.sizes.split(",")]
+    raw = generate(max(sizes), rng=0)
+    X_all = encoder.encode(raw)
+    _check_multiclass(artifacts, raw, X_all, sizes)
+
+    print(f"{'lignes':>8} {'sklearn (ms)':>13} " + " ".join(f"{f'compilé x{t} (ms)':>17}" for t in forests) + "  accélération")
+    results = []
+    for size in sizes:
+        X = X_all[:size]
+        reference = model.predict_proba(encoder.model_input(X))
+        sklearn_best, sklearn_median = _best(lambda: model.predict_proba(encoder.model_input(X)), args.repeat)
+
+        row = {"rows": size, "sklearn_ms": sklearn_best * 1000, "sklearn_median_ms": sklearn_median * 1000}
+        for threads, forest in forests.items():
+            if not np.array_equal(forest.predict_proba(X), reference):
+                raise SystemExit(f"❌ Probabilités différentes de scikit-learn ({size} lignes, {threads} thread(s))")
+            best, median = _best(lambda: forest.predict_proba(X), args.repeat)
+            row[f"compiled_{threads}_ms"] = best * 1000
+            row[f"compiled_{threads}_median_ms"] = median * 1000
+        results.append(row)
+
+        fastest = min(row[f"compiled_{t}_ms"] for t in forests)
+        print(f"{size:>8} {row['sklearn_ms']:>13.3f} "
+              + " ".join(f"{row[f'compiled_{t}_ms']:>17.3f}" for t in forests)
+              + f"  x{row['sklearn_ms'] / fastest:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"n_estimators": len(model.estimators_), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark des formats du dossier surveillé : CSV (texte) contre Arrow IPC, Parquet et .npy, par taille de fichier.
+
+    cd backend && python -m benchmarks.formats [--sizes 1000,10000,100000] [--repeat 5] [--json formats.json]
+
+Pour chaque format, le même lot (`generate_fake_data.generate`) est écrit une fois puis relu par `load_file` :
+"parse" (lecture / projection mémoire), "encode" (matrice du modèle), et "score" (`score_files` complet :
+lecture, encodage, prédiction et conversion en lignes pour l'écrivain).
+Le .npy contient la matrice déjà encodée (float32, colonnes du modèle), telle qu'un collecteur la produirait.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from artifacts import registry
+from generate_fake_data import generate, write_file
+from process import load_file, score_files
+
+FORMATS = ("csv", "arrow", "parquet", "npy")
+
+
+def _write(raw, folder, name, fmt, artifacts):
+    if fmt == "npy":
+        # Matrice déjà encodée, dans l'ordre des colonnes du modèle
+        path = os.path.join(folder, name + ".npy")
+        X, _ = load_file(write_file(raw, folder, name + "_src", "arrow"), artifacts, {})
+        np.save(path, X)
+        return path
+    return write_file(raw, folder, name, fmt)
+
+
+def _median(values):
+    return float(np.median(values)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    artifacts = registry.get()
+    formats = args.formats.split(",")
+    results = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'lignes':>8} {'format':>8} {'Mo':>7} {'parse (ms)':>11} {'encode (ms)':>12} {'score (ms)':>11} "
+              f"{'lignes/s':>11}  vs CSV")
+        for size in map(int, args.sizes.split(",")):
+            raw = generate(size, rng=args.seed)
+            baseline = None
+            for fmt in formats:
+                path = _write(raw, folder, f"batch_{size}", fmt, artifacts)
+                parse, encode, score = [], [], []
+                for _ in range(args.repeat):
+                    timings = {}
+                    load_file(path, artifacts, timings)
+                    parse.append(timings["parse"])
+                    encode.append(timings["encode"])
+
+                    start = time.perf_counter()
+                    result = score_files([(path, "2026-01-01T00:00:00")])
+                    score.append(time.perf_counter() - start)
+                    if result["rejected"] or len(result["rows"]) != size:
+                        raise SystemExit(f"❌ {fmt} : {result['rejected'] or len(result['rows'])}")
+
+                row = {
+                    "rows": size, "format": fmt, "bytes": os.path.getsize(path),
+                    "parse_ms": _median(parse), "encode_ms": _median(encode), "score_ms": _median(score),
+                }
+                row["load_rows_per_s"] = size / ((row["parse_ms"] + row["encode_ms"]) / 1000)
+                results.append(row)
+
+                load_ms = row["parse_ms"] + row["encode_ms"]
+                if fmt == "csv":
+                    baseline = load_ms
+                speedup = f"x{baseline / load_ms:.1f}" if baseline else ""
+                print(f"{size:>8} {fmt:>8} {row['bytes'] / 1e6:>7.2f} {row['parse_ms']:>11.2f} {row['encode_ms']:>12.2f} "
+                      f"{row['score_ms']:>11.2f} {row['load_rows_per_s']:>11,.0f}  {speedup}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
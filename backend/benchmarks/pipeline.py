@@ -0,0 +1,363 @@
+"""
+Benchmark de bout en bout du backend, sur une base et un dossier surveillé temporaires :
+
+- stages    : temps par étape d'un lot (read_csv, encodage, predict_proba, preprocess_data complet,
+              conversion en lignes, insertion SQLite) ;
+- ingestion : trafic synthétique déposé à débit fixe (`generate_fake_data.stream_files`) et ingéré par
+              `IngestionEngine` : débit obtenu (lignes/s) et délai fichier -> ligne commitée (p50/p95/p99) ;
+- queries   : latence p50/p99 de `/get_data` (et `/stats`) sur des bases de 10k, 1M et 10M lignes.
+
+    cd backend && python -m benchmarks.pipeline --output baseline.json
+    cd backend && python -m benchmarks.pipeline --only queries --sizes 10000,1000000 --compare baseline.json
+
+Le mode de stockage suit STORAGE_MODE, comme l'application. Les résultats sont écrits en JSON
+(`--output`) ; `--compare` affiche l'écart de chaque mesure avec une exécution précédente.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from artifacts import registry
+from db import SQLiteWriter, connect, init_db
+from generate_fake_data import generate, stream_files, write_file
+from ingestion import IngestionEngine
+from process import preprocess_data, read_file, scored_rows
+
+
+def _percentiles(values, points=(50, 95, 99)):
+    if not len(values):
+        return {f"p{p}": None for p in points}
+    return {f"p{p}": float(np.percentile(values, p)) for p in points}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ------------------------ 1️⃣ ⏱️ TEMPS PAR ÉTAPE ------------------------
+
+def bench_stages(workdir, rows, repeat, seed):
+    """
+    Temps médian de chaque étape du traitement d'un fichier de `rows` lignes.
+    """
+    artifacts = registry.get()
+    encoder = artifacts.encoder
+    file_path = write_file(generate(rows, rng=seed), workdir, "stages")
+    db_path = os.path.join(workdir, "stages.db")
+    init_db(db_path, artifacts.reference_columns_post_processing)
+    writer = SQLiteWriter(db_path)
+
+    timings = {name: [] for name in ("read_csv", "encode", "predict_proba", "preprocess_data", "to_rows", "insert")}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df_raw = read_file(file_path)
+        timings["read_csv"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        X = encoder.encode(df_raw)
+        timings["encode"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        artifacts.predict_proba(X)
+        timings["predict_proba"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        df_processed = preprocess_data(df_raw, artifacts=artifacts)
+        timings["preprocess_data"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        df_processed.insert(0, "timestamp", datetime.utcnow().isoformat())
+        columns, batch_rows, rollups = scored_rows(artifacts, df_processed)
+        timings["to_rows"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        writer.insert_rows(batch_rows, columns, rollups)
+        timings["insert"].append(time.perf_counter() - start)
+
+    writer.close()
+    result = {"rows": rows}
+    for name, values in timings.items():
+        median = float(np.median(values))
+        result[name] = {"ms": median * 1000, "rows_per_s": rows / median if median else None}
+    return result
+
+
+# ------------------------ 2️⃣ 🏭 INGESTION À DÉBIT FIXE ------------------------
+
+def _ingestion_run(workdir, rate, duration, file_rows, workers, seed, results):
+    """
+    Exécuté dans un processus dédié (les threads du moteur d'ingestion vivent le temps de la mesure).
+    """
+    folder = os.path.join(workdir, "watched")
+    db_path = os.path.join(workdir, "ingestion.db")
+    init_db(db_path, registry.get().reference_columns_post_processing)
+
+    engine = IngestionEngine(folder, db_path, workers=workers)
+    commits = []
+    commit = engine._commit
+
+    def timed_commit(batch):
+        commit(batch)
+        commits.append((time.time_ns(), list(batch.files), len(batch.rows)))
+
+    engine._commit = timed_commit
+    engine.start()
+    time.sleep(1)  # Démarrage des processus de scoring
+
+    context = multiprocessing.get_context("spawn")
+    generator = context.Process(target=stream_files, args=(folder, rate, file_rows),
+                                kwargs={"seed": seed, "duration": duration, "verbose": False})
+    started = time.time_ns()
+    generator.start()
+    generator.join()
+
+    # Attente de la fin de l'ingestion (dossier vide), bornée
+    deadline = time.monotonic() + max(60.0, 4 * duration)
+    while time.monotonic() < deadline and any(not name.startswith(".") for name in os.listdir(folder)):
+        time.sleep(0.05)
+    time.sleep(0.5)
+
+    lags, total_rows = [], 0
+    for committed_at, files, rows in commits:
+        total_rows += rows
+        for file_path in files:
+            # Nom : generated_data_<time_ns à l'écriture>_<n>.<ext>
+            written_at = int(os.path.basename(file_path).split("_")[2])
+            lags.append((committed_at - written_at) / 1e6)
+
+    elapsed = ((commits[-1][0] if commits else time.time_ns()) - started) / 1e9
+    results.put({
+        "target_rows_per_s": rate,
+        "rows": total_rows,
+        "files": len(lags),
+        "commits": len(commits),
+        "rows_per_s": total_rows / elapsed if elapsed > 0 else None,
+        "lag_ms": _percentiles(lags),
+        "backlog_files": sum(1 for name in os.listdir(folder) if not name.startswith(".")),
+    })
+
+
+def bench_ingestion(workdir, rates, duration, file_rows, workers, seed):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for rate in rates:
+        run_dir = tempfile.mkdtemp(prefix=f"ingestion_{int(rate)}_", dir=workdir)
+        channel = context.Queue()
+        process = context.Process(target=_ingestion_run,
+                                  args=(run_dir, rate, duration, file_rows, workers, seed, channel))
+        process.start()
+        try:
+            result = channel.get(timeout=max(120.0, 6 * duration))
+        except queue.Empty:
+            result = {"target_rows_per_s": rate, "error": "délai dépassé"}
+        process.terminate()
+        process.join()
+        print(f"🏭 {rate:,.0f} lignes/s visées : {json.dumps(result)}", flush=True)
+        results.append(result)
+    return results
+
+
+# ------------------------ 3️⃣ 🔎 LECTURES ------------------------
+
+# Intervalle entre deux lignes de remplissage : même la plus petite base couvre plusieurs minutes d'agrégats
+FILL_INTERVAL_MS = 100
+
+
+def _fill(writer, artifacts, template, start_count, target, end_time, total):
+    """
+    Ajoute des lignes (copies d'un lot scoré, horodatées à FILL_INTERVAL_MS d'intervalle jusqu'à `end_time`)
+    jusqu'à atteindre `target` lignes. L'écrivain garde ces timestamps (`stamp=False`) : sans cela,
+    tout un lot recevrait l'instant de son commit.
+    """
+    count = start_count
+    while count < target:
+        n = min(len(template), target - count)
+        chunk = template.iloc[:n].copy()
+        first = end_time - timedelta(milliseconds=FILL_INTERVAL_MS * (total - count))
+        chunk.insert(0, "timestamp", pd.date_range(first, periods=n, freq=f"{FILL_INTERVAL_MS}ms")
+                     .strftime("%Y-%m-%dT%H:%M:%S.%f"))
+        columns, rows, rollups = scored_rows(artifacts, chunk)
+        writer.insert_rows(rows, columns, rollups, stamp=False)
+        count += n
+        if count % 1_000_000 < n:
+            print(f"   … {count:,} lignes", flush=True)
+    return count
+
+
+def _time_window(db_path, fraction=0.1):
+    """
+    Dernière fraction [début, fin[ de la période réellement couverte par la base (MIN/MAX du timestamp).
+    """
+    conn = connect(db_path)
+    try:
+        first, last = (datetime.fromisoformat(ts) for ts in
+                       conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM connections").fetchone())
+    finally:
+        conn.close()
+    return (last - (last - first) * fraction).isoformat(), last.isoformat()
+
+
+def _returned_rows(payload):
+    """
+    Nombre de lignes d'une réponse JSON : enregistrements de `/get_data`, total de `/stats`.
+    """
+    if isinstance(payload, dict):
+        return payload.get("total", 0)
+    return len(payload)
+
+
+def bench_queries(workdir, sizes, repeat, seed):
+    """
+    Latence de `/get_data` et `/stats` (pile HTTP comprise, via le client de test FastAPI) à chaque taille de base.
+    Le cache de réponses est invalidé avant chaque requête, sauf pour la mesure "latest_cached".
+    Chaque requête doit retourner des lignes : une requête vide ne mesurerait pas le même travail.
+    """
+    db_path = os.path.join(workdir, "queries.db")
+    os.environ["DB_PATH"] = db_path
+    os.environ["WATCHED_FOLDER"] = os.path.join(workdir, "queries_watched")
+
+    from fastapi.testclient import TestClient
+    import app
+    from cache import ingest_generation
+    from readpool import ReadPool
+
+    artifacts = registry.get()
+    init_db(db_path, artifacts.reference_columns_post_processing)
+    writer = SQLiteWriter(db_path)
+    template = preprocess_data(generate(50_000, rng=seed), artifacts=artifacts)
+    # Sans l'événement de démarrage (moteur d'ingestion, générateur) : seul le pool de lecture est nécessaire
+    app.read_pool = ReadPool(db_path)
+    client = TestClient(app.app)
+    # Seuil de score atteint par ~10 % des lignes (copies du lot modèle), quel que soit le modèle chargé
+    min_score = float(np.quantile(template["Prediction_Probability"], 0.9))
+
+    total = max(sizes)
+    end_time = datetime.utcnow()
+    count, results = 0, {}
+    for size in sorted(sizes):
+        count = _fill(writer, artifacts, template, count, size, end_time, total)
+        start, end = _time_window(db_path)
+        queries = {
+            "latest": "/get_data?limit=300",
+            "latest_cached": "/get_data?limit=300",
+            "protocol": "/get_data?protocol=tcp&limit=300",
+            "min_score": f"/get_data?min_score={min_score!r}&limit=300",
+            "time_range": f"/get_data?start={start}&end={end}&limit=300",
+            "deep_page": f"/get_data?before_id={count // 2}&limit=300",
+            "delta": f"/get_data?since_id={max(0, count - 50)}",
+            "stats": "/stats",
+            "stats_window": f"/stats?start={start}&end={end}",
+        }
+
+        results[str(size)] = {}
+        for name, url in queries.items():
+            timings = []
+            for _ in range(repeat):
+                if name != "latest_cached":
+                    ingest_generation.bump()
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise SystemExit(f"❌ {url} : HTTP {response.status_code}")
+                if not _returned_rows(response.json()):
+                    raise SystemExit(f"❌ {url} : aucune ligne retournée")
+            results[str(size)][name] = _percentiles(timings, (50, 99))
+        print(f"🔎 {size:,} lignes : {json.dumps(results[str(size)])}", flush=True)
+
+    writer.close()
+    return results
+
+
+# ------------------------ 4️⃣ 📏 COMPARAISON ------------------------
+
+def _flatten(data, prefix=""):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            yield from _flatten(value, f"{prefix}[{i}]")
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, data
+
+
+def compare(baseline, current):
+    """
+    Affiche chaque mesure commune aux deux exécutions et son rapport nouveau / ancien
+    (pour les débits, plus grand est meilleur ; pour les temps en ms, plus petit est meilleur).
+    """
+    old = dict(_flatten(baseline.get("results", {})))
+    print(f"📏 Comparaison avec {baseline.get('revision') or 'la référence'}")
+    for key, value in _flatten(current.get("results", {})):
+        if key in old and old[key]:
+            print(f"   {key:<60} {old[key]:>14.3f} -> {value:>14.3f}  x{value / old[key]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="stages,ingestion,queries")
+    parser.add_argument("--stage-rows", type=int, default=10000)
+    parser.add_argument("--rates", default="10000,50000,100000", help="Débits visés (lignes/s)")
+    parser.add_argument("--duration", type=float, default=20, help="Durée de chaque palier de débit (s)")
+    parser.add_argument("--file-rows", type=int, default=10000)
+    parser.add_argument("--workers", default="auto", help="INGEST_WORKERS pour le moteur d'ingestion")
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="Tailles de base pour les lectures")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="Dossier de travail (défaut : dossier temporaire supprimé à la fin)")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Fichier JSON d'une exécution précédente")
+    args = parser.parse_args()
+
+    only = set(args.only.split(","))
+    workdir = args.workdir or tempfile.mkdtemp(prefix="hackathon_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        "revision": _git_revision(),
+        "date": datetime.utcnow().isoformat(),
+        "config": {**vars(args), "storage_mode": os.environ.get("STORAGE_MODE", "wide"), "cpu_count": os.cpu_count()},
+        "results": {},
+    }
+
+    try:
+        if "stages" in only:
+            report["results"]["stages"] = bench_stages(workdir, args.stage_rows, args.repeat, args.seed)
+            print(f"⏱️ Étapes : {json.dumps(report['results']['stages'])}", flush=True)
+        if "ingestion" in only:
+            rates = [float(rate) for rate in args.rates.split(",")]
+            report["results"]["ingestion"] = bench_ingestion(workdir, rates, args.duration, args.file_rows,
+                                                             args.workers, args.seed)
+        if "queries" in only:
+            sizes = [int(size) for size in args.sizes.split(",")]
+            report["results"]["queries"] = bench_queries(workdir, sizes, args.repeat, args.seed)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Résultats écrits dans {args.output}", flush=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark du cache des prédictions (cache.py) : trafic répétitif (inondation smurf / neptune) contre trafic varié.
+
+    cd backend && python -m benchmarks.prediction_cache [--rows 100000] [--distinct 1.0,0.1,0.01,0.001] [--repeat 5]
+
+Pour chaque proportion de vecteurs distincts, le même lot (`generate_fake_data.generate`, lignes recopiées)
+est scoré par `score_features` sans cache, avec un cache vide (doublons du lot seulement) et avec un cache déjà
+rempli par le lot précédent. Chaque mesure vérifie que les prédictions sont identiques à celles sans cache.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from artifacts import registry
+from cache import PredictionCache
+from generate_fake_data import generate
+from process import score_features
+
+RESULT_COLUMNS = ("Predicted_Class", "Prediction_Probability", "Attack_Type", "Attack_Probability")
+
+
+def _median(values):
+    return float(np.median(values)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--distinct", default="1.0,0.1,0.01,0.001")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats")
+    args = parser.parse_args()
+
+    artifacts = registry.get()
+    encoder = artifacts.encoder
+    raw = generate(args.rows, rng=args.seed)
+    numeric_all = encoder.numeric_values(raw)
+    X_all = encoder.encode(raw, numeric_all)
+    rng = np.random.default_rng(args.seed)
+    results = []
+
+    print(f"{'lignes':>8} {'distinctes':>11} {'sans cache (ms)':>16} {'cache vide (ms)':>16} "
+          f"{'cache rempli (ms)':>18}  gain")
+    for fraction in map(float, args.distinct.split(",")):
+        distinct = max(1, int(args.rows * fraction))
+        picks = np.arange(args.rows) if distinct == args.rows else rng.integers(0, distinct, args.rows)
+        X, numeric = np.ascontiguousarray(X_all[picks]), numeric_all[picks]
+
+        timings = {"none": [], "cold": [], "warm": []}
+        for _ in range(args.repeat):
+            for mode in timings:
+                artifacts.prediction_cache = PredictionCache() if mode != "none" else None
+                if mode == "warm":
+                    score_features(artifacts, X, numeric)
+                start = time.perf_counter()
+                df = score_features(artifacts, X, numeric)
+                timings[mode].append(time.perf_counter() - start)
+                if mode == "none":
+                    reference = df
+                elif not all(df[column].equals(reference[column]) for column in RESULT_COLUMNS):
+                    raise SystemExit(f"❌ Prédictions différentes avec le cache ({mode}, {distinct} vecteurs distincts)")
+
+        row = {"rows": args.rows, "distinct": int(len(np.unique(picks))),
+               **{f"{mode}_ms": _median(values) for mode, values in timings.items()}}
+        results.append(row)
+        print(f"{args.rows:>8} {row['distinct']:>11} {row['none_ms']:>16.1f} {row['cold_ms']:>16.1f} "
+              f"{row['warm_ms']:>18.1f}  x{row['none_ms'] / row['cold_ms']:.1f} / x{row['none_ms'] / row['warm_ms']:.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
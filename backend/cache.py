@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from itertools import compress
+
+import numpy as np
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Nombre maximal de réponses gardées en cache (éviction LRU)
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+# Nombre maximal de lignes encodées distinctes dont la prédiction est gardée, par processus (0 = désactivé).
+# Une entrée occupe environ 0,7 Ko (octets de la ligne + prédiction)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "20000"))
+
+
+# ------------------------ 2️⃣ 🔢 GÉNÉRATION D'INGESTION ------------------------
+
+class IngestGeneration:
+    """
+    Compteur incrémenté par l'écrivain après chaque commit : tant qu'il ne bouge pas,
+    aucune lecture ne peut retourner un résultat différent.
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self):
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+# ------------------------ 3️⃣ 🗃️ CACHE DES RÉPONSES ------------------------
+
+class ResponseCache:
+    """
+    Cache LRU borné des réponses JSON de l'API, indexé par chemin + paramètres de requête.
+    Une entrée n'est valable que pour la génération d'ingestion à laquelle elle a été calculée.
+    """
+
+    def __init__(self, generation, max_entries=RESPONSE_CACHE_SIZE):
+        self.generation = generation
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != self.generation.value:
+                del self._entries[key]  # Nouvelles lignes commitées depuis : entrée périmée
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, generation, etag, body):
+        with self._lock:
+            self._entries[key] = (generation, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def respond(self, request, compute, variant=None):
+        """
+        Retourne la réponse JSON de `compute()` pour cette requête, depuis le cache si possible.
+        `compute` retourne un objet JSON-sérialisable ou directement le corps JSON en octets ;
+        `variant` distingue des représentations négociées hors paramètres (en-tête `Accept`...).
+        L'ETag est un condensat du contenu : un client dont `If-None-Match` correspond reçoit un 304 sans corps.
+        Les exceptions de `compute` ne sont pas mises en cache.
+        """
+        key = self._key(request, variant)
+        cached = self.get(key)
+
+        if cached is None:
+            # Génération lue avant le calcul : un commit pendant le calcul rend l'entrée périmée
+            generation = self.generation.value
+            cached = self._store(key, generation, compute())
+        return self._response(request, *cached)
+
+    async def respond_async(self, request, compute, variant=None):
+        """
+        Variante de `respond` pour les handlers asynchrones : `compute` est une fonction coroutine,
+        attendue seulement si la réponse n'est pas en cache.
+        """
+        key = self._key(request, variant)
+        cached = self.get(key)
+
+        if cached is None:
+            generation = self.generation.value
+            cached = self._store(key, generation, await compute())
+        return self._response(request, *cached)
+
+    @staticmethod
+    def _key(request, variant):
+        return request.url.path, tuple(sorted(request.query_params.multi_items())), variant
+
+    def _store(self, key, generation, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(jsonable_encoder(body), ensure_ascii=False, allow_nan=False,
+                              separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.put(key, generation, etag, body)
+        return etag, body
+
+    @staticmethod
+    def _response(request, etag, body):
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+
+# ------------------------ 4️⃣ 🎯 CACHE DES PRÉDICTIONS ------------------------
+
+# Deux projections aléatoires fixes d'une ligne float32 : leurs 2 x 32 bits forment l'empreinte 64 bits de la ligne
+_ROW_PROJECTIONS = {}
+
+
+def unique_rows(X):
+    """
+    Lignes distinctes d'une matrice encodée : retourne (indices de la première occurrence, index inverse),
+    tels que `X[first][inverse]` redonne X ; si toutes les lignes sont distinctes, `first` est l'identité.
+    L'égalité est exacte (bit à bit) : les lignes sont regroupées par une empreinte vectorisée,
+    puis le regroupement est vérifié ; une collision d'empreinte (très rare) bascule sur un tri exact des octets.
+    """
+    X = np.ascontiguousarray(X)
+    n, width = X.shape
+    weights = _ROW_PROJECTIONS.get((width, X.dtype))
+    if weights is None:
+        weights = _ROW_PROJECTIONS[(width, X.dtype)] = np.random.default_rng(0).random((width, 2)).astype(X.dtype)
+
+    digest = np.ascontiguousarray(X @ weights).view(np.uint64).ravel()
+    _, first, inverse = np.unique(digest, return_index=True, return_inverse=True)
+    if len(first) == n:
+        return np.arange(n), np.arange(n)
+
+    inverse = inverse.ravel()
+    representative = first[inverse]
+    duplicates = np.flatnonzero(representative != np.arange(n))
+    bits = X.view(np.uint32 if X.itemsize == 4 else np.uint64)
+    if np.array_equal(bits[duplicates], bits[representative[duplicates]]):
+        return first, inverse
+    _, first, inverse = np.unique(X.view(np.dtype((np.void, width * X.itemsize))).ravel(),
+                                  return_index=True, return_inverse=True)
+    return first, inverse.ravel()
+
+
+def row_keys(X):
+    """
+    Clé de cache de chaque ligne : ses octets (égalité exacte, aucune collision possible).
+    """
+    X = np.ascontiguousarray(X)
+    return X.view(np.dtype((np.void, X.shape[1] * X.itemsize))).ravel().tolist()
+
+
+class PredictionCache:
+    """
+    Cache LRU borné des prédictions par ligne encodée (cf. `row_keys`), partagé par tous les lots d'un processus.
+    Chaque instantané d'artefacts a le sien : un modèle rechargé repart d'un cache vide, sans invalidation explicite.
+    Compte l'origine des prédictions servies ("model", "batch" : doublon dans le lot, "cache") jusqu'à `drain_counts`.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"model": 0, "batch": 0, "cache": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """
+        Valeur en cache de chaque clé (None si absente) ; les clés trouvées deviennent les plus récentes.
+        """
+        with self._lock:
+            values = list(map(self._entries.get, keys))
+            for key in compress(keys, values):
+                self._entries.move_to_end(key)
+        return values
+
+    def put_many(self, keys, values):
+        # Seules les max_entries dernières entrées survivraient à l'éviction
+        keys, values = keys[-self.max_entries:], values[-self.max_entries:]
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count(self, model, batch, cache):
+        with self._lock:
+            self._counts["model"] += model
+            self._counts["batch"] += batch
+            self._counts["cache"] += cache
+
+    def drain_counts(self):
+        """
+        Lignes servies par origine depuis le dernier appel (remises à zéro).
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            self._counts = dict.fromkeys(counts, 0)
+        return counts
+
+
+# Instances partagées par l'API (lecture) et le moteur d'ingestion (incrément après commit)
+ingest_generation = IngestGeneration()
+response_cache = ResponseCache(ingest_generation)
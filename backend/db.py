@@ -0,0 +1,1205 @@
+import itertools
+import math
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+# ------------------------ 1️⃣ ⚙️ RÉGLAGES SQLITE ------------------------
+
+# Délai d'attente sur un verrou avant l'erreur "database is locked" (millisecondes)
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+# Cache de pages par connexion (Kio) et taille de la projection mémoire du fichier (octets)
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Mode de stockage : "wide" (une colonne INTEGER par variable one-hot) ou "compact" (codes + tables de correspondance)
+STORAGE_MODE = os.environ.get("STORAGE_MODE", "wide")
+COMPACT_TABLE = "connections_compact"
+# Partitionnement : "none" (table unique), "day" ou "hour" (une table par période derrière une vue UNION ALL)
+PARTITION_BY = os.environ.get("PARTITION_BY", "none")
+# Résultat du second étage de la cascade (type d'attaque et sa probabilité), NULL pour les lignes non suspectes
+CASCADE_COLUMNS = (("Attack_Type", "TEXT"), ("Attack_Probability", "REAL"))
+# Variables catégorielles encodées en one-hot pour le modèle : (colonne compacte, préfixe one-hot, table de correspondance)
+CATEGORICAL_GROUPS = [
+    ("protocol_type", "protocol_type_", "protocol_types"),
+    ("service", "service_", "services"),
+    ("flag", "flag_", "flags"),
+]
+
+
+def connect(db_path, **kwargs):
+    """
+    Ouvre une connexion SQLite avec les réglages communs aux lecteurs et à l'écrivain.
+    """
+    conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, **kwargs)
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    return conn
+
+
+def connect_readonly(db_path, **kwargs):
+    """
+    Connexion de lecture pour l'API : fichier ouvert en `mode=ro` et `query_only`, aucune écriture possible.
+    La projection mémoire (`mmap_size`) partage les pages du fichier entre toutes les connexions du processus.
+    """
+    conn = connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True, **kwargs)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def _data_table(storage_mode=STORAGE_MODE):
+    # Table (ou, en mode partitionné, vue) qui reçoit les lignes scorées
+    return COMPACT_TABLE if storage_mode == "compact" else "connections"
+
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def database_size(db_path):
+    """
+    Taille sur disque de la base en octets : fichier principal et journal WAL.
+    """
+    size = 0
+    for path in (db_path, db_path + "-wal"):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+
+# ------------------------ 2️⃣ 🗄️ INITIALISATION BDD ------------------------
+
+def init_db(db_path, feature_columns=None, storage_mode=STORAGE_MODE, partition_by=PARTITION_BY):
+    """
+    Initialise la base de données SQLite en créant la table `connections` si elle n’existe pas,
+    et la passe en journal WAL (persistant dans le fichier) pour que les lecteurs ne bloquent pas l'écriture.
+    En mode "compact", crée (ou migre vers) le schéma compact décrit plus bas ;
+    `feature_columns` (les 117 colonnes attendues par le modèle) est alors obligatoire.
+    Avec `partition_by` ("day" ou "hour"), la table devient une vue sur des partitions par période (cf. section 7).
+    """
+    conn = None
+    try:
+        conn = connect(db_path)
+        if partition_by != "none":
+            enable_incremental_vacuum(conn)  # Avant toute création de table
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        if storage_mode == "compact":
+            init_compact(conn, feature_columns)
+            init_cascade_columns(conn, storage_mode, feature_columns)
+            create_indexes(conn, storage_mode)
+            init_rollups(conn)
+            init_progress(conn)
+            if partition_by != "none":
+                init_partitions(conn, storage_mode)
+            print(f"✅ Schéma compact '{COMPACT_TABLE}' initialisé avec succès.", flush=True)
+            return
+
+        cursor = conn.cursor()
+
+        # Création de la table avec 117 colonnes + timestamp
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS connections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                duration REAL,
+                src_bytes INTEGER,
+                dst_bytes INTEGER,
+                land INTEGER,
+                wrong_fragment INTEGER,
+                urgent INTEGER,
+                hot INTEGER,
+                num_failed_logins INTEGER,
+                logged_in INTEGER,
+                num_compromised INTEGER,
+                root_shell INTEGER,
+                su_attempted INTEGER,
+                num_root INTEGER,
+                num_file_creations INTEGER,
+                num_shells INTEGER,
+                num_access_files INTEGER,
+                num_outbound_cmds INTEGER,
+                is_host_login INTEGER,
+                is_guest_login INTEGER,
+                count INTEGER,
+                srv_count INTEGER,
+                serror_rate REAL,
+                srv_serror_rate REAL,
+                rerror_rate REAL,
+                srv_rerror_rate REAL,
+                same_srv_rate REAL,
+                diff_srv_rate REAL,
+                srv_diff_host_rate REAL,
+                dst_host_count INTEGER,
+                dst_host_srv_count INTEGER,
+                dst_host_same_srv_rate REAL,
+                dst_host_diff_srv_rate REAL,
+                dst_host_same_src_port_rate REAL,
+                dst_host_srv_diff_host_rate REAL,
+                dst_host_serror_rate REAL,
+                dst_host_srv_serror_rate REAL,
+                dst_host_rerror_rate REAL,
+                dst_host_srv_rerror_rate REAL,
+                protocol_type_icmp INTEGER,
+                protocol_type_tcp INTEGER,
+                protocol_type_udp INTEGER,
+                service_IRC INTEGER,
+                service_X11 INTEGER,
+                service_Z39_50 INTEGER,
+                service_auth INTEGER,
+                service_bgp INTEGER,
+                service_courier INTEGER,
+                service_csnet_ns INTEGER,
+                service_ctf INTEGER,
+                service_daytime INTEGER,
+                service_discard INTEGER,
+                service_domain INTEGER,
+                service_domain_u INTEGER,
+                service_echo INTEGER,
+                service_eco_i INTEGER,
+                service_ecr_i INTEGER,
+                service_efs INTEGER,
+                service_exec INTEGER,
+                service_finger INTEGER,
+                service_ftp INTEGER,
+                service_ftp_data INTEGER,
+                service_gopher INTEGER,
+                service_hostnames INTEGER,
+                service_http INTEGER,
+                service_http_443 INTEGER,
+                service_icmp INTEGER,
+                service_imap4 INTEGER,
+                service_iso_tsap INTEGER,
+                service_klogin INTEGER,
+                service_kshell INTEGER,
+                service_ldap INTEGER,
+                service_link INTEGER,
+                service_login INTEGER,
+                service_mtp INTEGER,
+                service_name INTEGER,
+                service_netbios_dgm INTEGER,
+                service_netbios_ns INTEGER,
+                service_netbios_ssn INTEGER,
+                service_netstat INTEGER,
+                service_nnsp INTEGER,
+                service_nntp INTEGER,
+                service_ntp_u INTEGER,
+                service_other INTEGER,
+                service_pm_dump INTEGER,
+                service_pop_2 INTEGER,
+                service_pop_3 INTEGER,
+                service_printer INTEGER,
+                service_private INTEGER,
+                service_remote_job INTEGER,
+                service_rje INTEGER,
+                service_shell INTEGER,
+                service_smtp INTEGER,
+                service_sql_net INTEGER,
+                service_ssh INTEGER,
+                service_sunrpc INTEGER,
+                service_supdup INTEGER,
+                service_systat INTEGER,
+                service_telnet INTEGER,
+                service_tftp_u INTEGER,
+                service_tim_i INTEGER,
+                service_time INTEGER,
+                service_urp_i INTEGER,
+                service_uucp INTEGER,
+                service_uucp_path INTEGER,
+                service_vmnet INTEGER,
+                service_whois INTEGER,
+                flag_OTH INTEGER,
+                flag_REJ INTEGER,
+                flag_RSTO INTEGER,
+                flag_RSTOS0 INTEGER,
+                flag_RSTR INTEGER,
+                flag_S0 INTEGER,
+                flag_S1 INTEGER,
+                flag_S2 INTEGER,
+                flag_S3 INTEGER,
+                flag_SF INTEGER,
+                flag_SH INTEGER,
+                Predicted_Class INTEGER,
+                Prediction_Probability REAL,
+                Attack_Type TEXT,
+                Attack_Probability REAL
+            )
+        """)
+        conn.commit()
+        init_cascade_columns(conn, storage_mode)
+        create_indexes(conn, storage_mode)
+        init_rollups(conn)
+        init_progress(conn)
+        if partition_by != "none":
+            init_partitions(conn, storage_mode)
+        print("✅ Table 'connections' initialisée avec succès.", flush=True)
+    except Exception as e:
+        print(f"❌ Erreur lors de l'initialisation de la base de données : {e}",flush=True)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+# ------------------------ 3️⃣ 🗜️ STOCKAGE COMPACT ------------------------
+#
+# Une ligne large porte ~120 colonnes dont 84 indicatrices one-hot, alors qu'une seule par groupe vaut 1.
+# Le mode compact stocke `protocol_type`, `service` et `flag` sous forme de petits codes entiers
+# (tables `protocol_types`, `services`, `flags`) à côté des variables numériques.
+# La vue `connections` redonne les 117 colonnes du modèle : les lectures existantes fonctionnent à l'identique.
+
+def _split_features(feature_columns):
+    """
+    Sépare les 117 colonnes du modèle en variables numériques et en groupes one-hot.
+    Retourne (numériques, {colonne compacte: [colonnes one-hot dans l'ordre du modèle]}).
+    """
+    groups = {name: [] for name, _, _ in CATEGORICAL_GROUPS}
+    numeric = []
+    for column in feature_columns:
+        for name, prefix, _ in CATEGORICAL_GROUPS:
+            if column.startswith(prefix):
+                groups[name].append(column)
+                break
+        else:
+            numeric.append(column)
+    return numeric, groups
+
+
+def _sql_type(column):
+    # Mêmes types que le schéma large : durée et taux en REAL, compteurs en INTEGER
+    return "REAL" if column == "duration" or column.endswith("_rate") else "INTEGER"
+
+
+def compact_frame(df_processed, feature_columns):
+    """
+    Convertit un DataFrame large (timestamp, 117 variables, classe, probabilité) en colonnes compactes :
+    chaque groupe one-hot devient le code (position dans le groupe) de la colonne à 1, ou NULL si aucune.
+    """
+    numeric, groups = _split_features(feature_columns)
+    df_compact = df_processed[["timestamp"] + numeric].copy()
+
+    for name, _, _ in CATEGORICAL_GROUPS:
+        block = df_processed[groups[name]].to_numpy(dtype=np.float32)
+        codes = block.argmax(axis=1)
+        df_compact[name] = np.where(block.max(axis=1) > 0, codes, None)
+
+    df_compact["Predicted_Class"] = df_processed["Predicted_Class"]
+    df_compact["Prediction_Probability"] = df_processed["Prediction_Probability"]
+    for name, _ in CASCADE_COLUMNS:
+        df_compact[name] = df_processed[name]
+    return df_compact
+
+
+def _expansion_sql(feature_columns):
+    """
+    Expressions SQL qui redonnent les 117 colonnes du modèle à partir de la table compacte.
+    """
+    _, groups = _split_features(feature_columns)
+    codes = {
+        column: (name, position)
+        for name, columns in groups.items()
+        for position, column in enumerate(columns)
+    }
+    expressions = []
+    for column in feature_columns:
+        if column in codes:
+            name, position = codes[column]
+            expressions.append(f"({name} IS {position}) AS {column}")
+        else:
+            expressions.append(column)
+    return expressions
+
+
+def init_compact(conn, feature_columns):
+    """
+    Crée les tables de correspondance, la table compacte et la vue `connections`.
+    Si une ancienne table large `connections` existe, ses lignes sont migrées dans la même transaction.
+    """
+    if not feature_columns:
+        raise ValueError("Le mode compact nécessite la liste des colonnes de référence")
+
+    numeric, groups = _split_features(feature_columns)
+    definitions = ", ".join(f"{column} {_sql_type(column)}" for column in numeric)
+
+    with conn:
+        for name, prefix, lookup in CATEGORICAL_GROUPS:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {lookup} (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {lookup} (id, name) VALUES (?, ?)",
+                [(position, column[len(prefix):]) for position, column in enumerate(groups[name])],
+            )
+
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {COMPACT_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                {definitions},
+                protocol_type INTEGER REFERENCES protocol_types(id),
+                service INTEGER REFERENCES services(id),
+                flag INTEGER REFERENCES flags(id),
+                Predicted_Class INTEGER,
+                Prediction_Probability REAL,
+                Attack_Type TEXT,
+                Attack_Probability REAL
+            )
+        """)
+
+        legacy = conn.execute("SELECT type FROM sqlite_master WHERE name = 'connections'").fetchone()
+        if legacy is not None and legacy[0] == "table":
+            migrate_to_compact(conn, feature_columns)
+
+        _create_expansion_view(conn, feature_columns)
+
+
+def _create_expansion_view(conn, feature_columns):
+    conn.execute(f"""
+        CREATE VIEW IF NOT EXISTS connections AS
+        SELECT id, timestamp, {", ".join(_expansion_sql(feature_columns))}, Predicted_Class, Prediction_Probability,
+               {", ".join(name for name, _ in CASCADE_COLUMNS)}
+        FROM {COMPACT_TABLE}
+    """)
+
+
+def migrate_to_compact(conn, feature_columns):
+    """
+    Copie les lignes d'une table large `connections` dans la table compacte (ids conservés),
+    puis supprime la table large. À appeler dans une transaction ; un `VACUUM` ensuite rend la place libérée.
+    """
+    numeric, groups = _split_features(feature_columns)
+    code_expressions = []
+    for name, _, _ in CATEGORICAL_GROUPS:
+        cases = " ".join(f"WHEN {column} = 1 THEN {position}" for position, column in enumerate(groups[name]))
+        code_expressions.append(f"CASE {cases} END")
+
+    # Colonnes de la cascade : copiées si la table large les a déjà
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(connections)")}
+    cascade = "".join(f", {name}" for name, _ in CASCADE_COLUMNS if name in existing)
+
+    count = conn.execute("SELECT COUNT(*) FROM connections").fetchone()[0]
+    conn.execute(f"""
+        INSERT INTO {COMPACT_TABLE} (id, timestamp, {", ".join(numeric)}, protocol_type, service, flag,
+                                     Predicted_Class, Prediction_Probability{cascade})
+        SELECT id, timestamp, {", ".join(numeric)}, {", ".join(code_expressions)},
+               Predicted_Class, Prediction_Probability{cascade}
+        FROM connections
+    """)
+    conn.execute("DROP TABLE connections")
+    print(f"🗜️ {count} lignes migrées vers le schéma compact", flush=True)
+
+
+def init_cascade_columns(conn, storage_mode=STORAGE_MODE, feature_columns=None):
+    """
+    Ajoute les colonnes de la cascade (`CASCADE_COLUMNS`) aux tables de données créées avant elle
+    (table unique, ou table modèle et partitions), puis recrée la vue d'expansion du mode compact pour les exposer.
+    Les lignes existantes gardent un type d'attaque NULL.
+    """
+    table = _data_table(storage_mode)
+    names = [table, f"{table}_template"]
+    if _object_type(conn, PARTITION_TABLE) == "table":
+        names += [name for name, in conn.execute(f"SELECT name FROM {PARTITION_TABLE}")]
+
+    with conn:
+        altered = False
+        for name in names:
+            if _object_type(conn, name) != "table":
+                continue
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({name})")}
+            for column, sql_type in CASCADE_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {name} ADD COLUMN {column} {sql_type}")
+                    altered = True
+
+        if storage_mode == "compact" and altered:
+            conn.execute("DROP VIEW IF EXISTS connections")
+            _create_expansion_view(conn, feature_columns)
+    if altered:
+        print("🧬 Colonnes de la cascade multi-classe ajoutées", flush=True)
+
+
+# ------------------------ 4️⃣ 🔎 INDEX ET LECTURES ------------------------
+
+PROTOCOLS = ("tcp", "udp", "icmp")
+
+# Taille de page maximale de /get_data (réponses JSON en mémoire) et des exports en flux (NDJSON / Arrow)
+MAX_PAGE_SIZE = 5000
+MAX_EXPORT_SIZE = int(os.environ.get("MAX_EXPORT_SIZE", "1000000"))
+# Colonnes retournées par `/get_data` (noms attendus par Dash)
+RECORD_COLUMNS = ("id", "timestamp", "source_ip", "destination_ip", *(f"protocol_type_{p}" for p in PROTOCOLS),
+                  "port", "anomaly_score", "protocol", "attack_type")
+
+
+def _index_statements(table, storage_mode=STORAGE_MODE):
+    if storage_mode == "compact":
+        protocol_indexes = [("protocol", "protocol_type")]
+    else:
+        protocol_indexes = [(f"protocol_{p}", f"protocol_type_{p}") for p in PROTOCOLS]
+
+    statements = [
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp, id)",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_class ON {table} (Predicted_Class, id)",
+    ]
+    for suffix, column in protocol_indexes:
+        statements.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table} ({column}, id)")
+    return statements
+
+
+def create_indexes(conn, storage_mode=STORAGE_MODE):
+    """
+    Index utilisés par `/get_data` : plage de temps, protocole et classe prédite,
+    chacun suffixé par `id` pour servir directement le tri `ORDER BY id DESC` de la pagination.
+    En mode partitionné, la table est une vue : chaque partition porte ses propres index.
+    """
+    table = _data_table(storage_mode)
+    if _object_type(conn, table) != "table":
+        return
+
+    with conn:
+        for statement in _index_statements(table, storage_mode):
+            conn.execute(statement)
+
+
+def connections_query(protocol="all", start=None, end=None, min_score=None, before_id=None,
+                      limit=300, since_id=None, max_limit=MAX_PAGE_SIZE, storage_mode=STORAGE_MODE, partitions=None):
+    """
+    Construit la requête de `/get_data` : tous les filtres sont appliqués en SQL, avant le LIMIT,
+    et la pagination se fait par clé (`id < before_id`) plutôt que par OFFSET.
+    `since_id` (mode delta) ne retourne que les lignes insérées après cet id.
+    Les colonnes portent directement les noms attendus par Dash, et `protocol` est dérivé en SQL.
+    En mode partitionné (`partitions`, cf. `list_partitions`), seules les partitions qui recoupent
+    les bornes de temps et d'id sont interrogées, les plus récentes d'abord.
+    Retourne (requête, paramètres).
+    """
+    query, params = _connections_rows(protocol, start, end, min_score, before_id, since_id, storage_mode, partitions)
+    query += "\n        ORDER BY id DESC LIMIT ?\n    "
+    params.append(max(1, min(int(limit), max_limit)))
+    return query, params
+
+
+def _connections_rows(protocol, start, end, min_score, before_id, since_id, storage_mode, partitions):
+    """
+    Lignes filtrées de `/get_data` (colonnes `RECORD_COLUMNS`), sans tri ni limite. Retourne (requête, paramètres).
+    """
+    table = _data_table(storage_mode)
+    if storage_mode == "compact":
+        protocol_columns = [
+            f"(protocol_type IS (SELECT id FROM protocol_types WHERE name = '{p}')) AS protocol_type_{p}"
+            for p in PROTOCOLS
+        ]
+        protocol_name = "COALESCE((SELECT upper(name) FROM protocol_types WHERE id = protocol_type), 'Unknown')"
+    else:
+        protocol_columns = [f"protocol_type_{p}" for p in PROTOCOLS]
+        protocol_name = "CASE " + " ".join(f"WHEN protocol_type_{p} = 1 THEN '{p.upper()}'" for p in PROTOCOLS) + " ELSE 'Unknown' END"
+
+    conditions, params = [], []
+    bounds = []  # Conditions dont la sous-requête porte sur la table interrogée : (modèle, paramètres)
+
+    if protocol != "all":
+        name = protocol.lower()
+        if name not in PROTOCOLS:
+            conditions.append("0")  # Protocole inconnu : aucune ligne
+        elif storage_mode == "compact":
+            conditions.append("protocol_type = (SELECT id FROM protocol_types WHERE name = ?)")
+            params.append(name)
+        else:
+            conditions.append(f"protocol_type_{name} = 1")
+
+    # Les ids sont attribués dans l'ordre des timestamps (écrivain unique qui horodate au commit, cf. `SQLiteWriter`) :
+    # chaque borne de temps est aussi traduite en borne d'id (recherche O(log n) dans l'index), ce qui limite
+    # le parcours par clé primaire ; le filtre sur le timestamp reste la condition de référence
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start)
+        bounds.append(("id >= (SELECT id FROM {table} WHERE timestamp >= ? ORDER BY timestamp, id LIMIT 1)", start))
+    if end is not None:
+        conditions.append("timestamp < ?")
+        params.append(end)
+        bounds.append(("id <= (SELECT id FROM {table} WHERE timestamp < ? ORDER BY timestamp DESC, id DESC LIMIT 1)", end))
+
+    if min_score is not None:
+        conditions.append("Prediction_Probability >= ?")
+        params.append(min_score)
+        if min_score >= 0.5:
+            # Predicted_Class vaut 1 exactement quand la probabilité atteint 0.5 : permet l'index sur la classe
+            conditions.append("Predicted_Class = 1")
+
+    if before_id is not None:
+        conditions.append("id < ?")
+        params.append(before_id)
+    if since_id is not None:
+        conditions.append("id > ?")
+        params.append(since_id)
+
+    def select(source):
+        where = conditions + [bound.format(table=source) for bound, _ in bounds]
+        where = f"WHERE {' AND '.join(where)}" if where else ""
+        return f"""
+        SELECT id, timestamp, src_bytes AS source_ip, dst_bytes AS destination_ip, {", ".join(protocol_columns)},
+               Predicted_Class AS port, Prediction_Probability AS anomaly_score, {protocol_name} AS protocol,
+               Attack_Type AS attack_type
+        FROM {source}
+        {where}""", params + [value for _, value in bounds]
+
+    sources = [table]
+    if partitions is not None:
+        sources = select_partitions(partitions, start, end, before_id, since_id) or [f"{table}_template"]
+        if len(sources) > UNION_GROUP_SIZE:
+            sources = [table]  # Trop de partitions pour une requête composée : lecture par la vue
+
+    # Partitions : une branche par partition, fusionnées par SQLite dans l'ordre des id (parcours arrêté au LIMIT)
+    query, query_params = "", []
+    for source in sources:
+        sql, source_params = select(source)
+        query += ("\n        UNION ALL" if query else "") + sql
+        query_params.extend(source_params)
+    return query, query_params
+
+
+def timeseries_query(conn, protocol="all", start=None, end=None, min_score=None, points=1000,
+                     storage_mode=STORAGE_MODE, partitions=None):
+    """
+    Série temporelle sous-échantillonnée pour un budget de `points` points (≈ pixels de la largeur du graphique),
+    mêmes filtres et mêmes colonnes que `/get_data`. La plage [start, end[ (à défaut, celle des données) est découpée
+    en `points / 2` intervalles de temps égaux ; pour chacun, seules les lignes de score maximal et minimal sont gardées.
+    Un pic d'anomalie isolé reste donc toujours visible, quel que soit le nombre de lignes de la plage.
+    Chaque intervalle est lu par sa plage d'id (bornes de temps traduites par l'index, cf. `connections_query`) :
+    les lignes ne sont parcourues qu'une fois, sans tri, et seules ~`points` lignes sortent de SQLite.
+    Retourne un DataFrame (colonnes `RECORD_COLUMNS`), de la ligne la plus récente à la plus ancienne.
+    """
+    def rows(lower, upper):
+        return _connections_rows(protocol, lower, upper, min_score, None, None, storage_mode, partitions)
+
+    # Borne manquante : timestamp de la première / dernière ligne filtrée (ids dans l'ordre des timestamps)
+    bounds = []
+    for value, order in ((start, "ASC"), (end, "DESC")):
+        if value is None:
+            query, params = rows(start, end)
+            row = conn.execute(f"SELECT timestamp FROM ({query}\n        ) ORDER BY id {order} LIMIT 1", params).fetchone()
+            if row is None:
+                return pd.DataFrame(columns=RECORD_COLUMNS)
+            value = row[0]
+        bounds.append(pd.Timestamp(value).tz_localize(None) if pd.Timestamp(value).tzinfo else pd.Timestamp(value))
+
+    buckets = max(1, min(int(points), MAX_PAGE_SIZE) // 2)
+    step = (bounds[1] - bounds[0]) / buckets
+    # Premier et dernier intervalles : bornes demandées telles quelles (ou aucune borne)
+    edges = [start] + [(bounds[0] + step * k).isoformat() for k in range(1, buckets)] + [end]
+
+    columns = ", ".join(RECORD_COLUMNS)
+    selected = []
+    for lower, upper in zip(edges, edges[1:]):
+        query, params = rows(lower, upper)
+        # Colonnes "nues" d'un agrégat MAX()/MIN() : SQLite les prend sur la ligne qui atteint l'extremum
+        selected.extend(conn.execute(f"""
+            SELECT {columns} FROM (SELECT *, MAX(anomaly_score) FROM ({query}))
+            UNION
+            SELECT {columns} FROM (SELECT *, MIN(anomaly_score) FROM ({query}))
+        """, params + params))
+
+    df = pd.DataFrame([row for row in selected if row[0] is not None], columns=RECORD_COLUMNS)
+    return df.sort_values("id", ascending=False, ignore_index=True)
+
+
+def dashboard_records(columns, rows, last_id, feature_columns=None, storage_mode=STORAGE_MODE):
+    """
+    Lignes telles qu'insérées par l'écrivain -> enregistrements au format de `/get_data` (colonnes `RECORD_COLUMNS`,
+    mêmes alias et mêmes valeurs que `connections_query`), du plus récent au plus ancien.
+    `last_id` : id de la dernière ligne (cf. `insert_rows`). Les flottants non finis deviennent None, comme dans
+    `/get_data` (NULL en base pour NaN, null dans le JSON de pandas).
+    En mode compact, `feature_columns` donne l'ordre des colonnes one-hot (et donc le nom de chaque code de protocole).
+    """
+    position = {name: i for i, name in enumerate(columns)}
+    if storage_mode == "compact":
+        _, groups = _split_features(feature_columns)
+        names = [column[len("protocol_type_"):] for column in groups["protocol_type"]]
+
+        def protocol_flags(row):
+            code = row[position["protocol_type"]]
+            name = names[int(code)] if code is not None else None
+            return [int(name == p) for p in PROTOCOLS]
+    else:
+        flags = [position.get(f"protocol_type_{p}") for p in PROTOCOLS]
+
+        def protocol_flags(row):
+            return [_finite(row[i]) if i is not None else None for i in flags]
+
+    def protocol(values):
+        return next((p.upper() for p, value in zip(PROTOCOLS, values) if value == 1), "Unknown")
+
+    timestamp, source, destination = position["timestamp"], position["src_bytes"], position["dst_bytes"]
+    predicted, probability = position["Predicted_Class"], position["Prediction_Probability"]
+    attack = position.get("Attack_Type")
+    first_id = last_id - len(rows) + 1
+    records = []
+    for i, row in reversed(list(enumerate(rows))):
+        flags_values = protocol_flags(row)
+        values = (first_id + i, row[timestamp], row[source], row[destination], *flags_values,
+                  row[predicted], row[probability], protocol(flags_values), row[attack] if attack is not None else None)
+        records.append({name: _finite(value) for name, value in zip(RECORD_COLUMNS, values)})
+    return records
+
+
+def _finite(value):
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+# ------------------------ 5️⃣ 📊 AGRÉGATS PAR MINUTE ------------------------
+#
+# Le tableau de bord affiche des distributions (scores, protocoles, volume) : plutôt que de les recalculer
+# à partir des lignes brutes, l'écrivain tient à jour des compteurs par minute dans la même transaction
+# que les insertions. `/stats` répond ensuite sur n'importe quelle plage en ne lisant que ces agrégats.
+
+ROLLUP_TABLE = "rollup_minute"
+SCORE_BUCKETS = 20  # Nombre de classes de l'histogramme des scores d'anomalie
+
+ROLLUP_UPSERT_SQL = f"""
+    INSERT INTO {ROLLUP_TABLE} (minute, protocol, predicted_class, score_bucket, count, src_bytes_sum, dst_bytes_sum)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (minute, protocol, predicted_class, score_bucket) DO UPDATE SET
+        count = count + excluded.count,
+        src_bytes_sum = src_bytes_sum + excluded.src_bytes_sum,
+        dst_bytes_sum = dst_bytes_sum + excluded.dst_bytes_sum
+"""
+
+
+def init_rollups(conn):
+    """
+    Crée la table d'agrégats par minute ; à la création, la remplit à partir des lignes déjà stockées.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (ROLLUP_TABLE,)).fetchone()
+    if exists:
+        return
+
+    protocol_case = " ".join(f"WHEN protocol_type_{p} = 1 THEN '{p}'" for p in PROTOCOLS)
+    with conn:
+        conn.execute(f"""
+            CREATE TABLE {ROLLUP_TABLE} (
+                minute TEXT,
+                protocol TEXT,
+                predicted_class INTEGER,
+                score_bucket INTEGER,
+                count INTEGER,
+                src_bytes_sum REAL,
+                dst_bytes_sum REAL,
+                PRIMARY KEY (minute, protocol, predicted_class, score_bucket)
+            ) WITHOUT ROWID
+        """)
+        # `connections` est une table (mode large) ou la vue d'expansion (mode compact) : même requête
+        conn.execute(f"""
+            INSERT INTO {ROLLUP_TABLE}
+            SELECT substr(timestamp, 1, 16), CASE {protocol_case} ELSE 'unknown' END, Predicted_Class,
+                   MIN(CAST(Prediction_Probability * {SCORE_BUCKETS} AS INTEGER), {SCORE_BUCKETS - 1}),
+                   COUNT(*), SUM(src_bytes), SUM(dst_bytes)
+            FROM connections
+            GROUP BY 1, 2, 3, 4
+        """)
+
+
+def rollup_rows(df_processed):
+    """
+    Agrège un lot large (timestamp, 117 variables, classe, probabilité) par
+    (minute, protocole, classe prédite, classe de score). Retourne des tuples pour `ROLLUP_UPSERT_SQL`.
+    """
+    protocol_block = df_processed[[f"protocol_type_{p}" for p in PROTOCOLS]].to_numpy(dtype=np.float32)
+    protocols = np.array(PROTOCOLS + ("unknown",), dtype=object)[
+        np.where(protocol_block.max(axis=1) > 0, protocol_block.argmax(axis=1), len(PROTOCOLS))
+    ]
+    probabilities = df_processed["Prediction_Probability"].to_numpy(dtype=np.float64)
+    buckets = np.minimum((probabilities * SCORE_BUCKETS).astype(np.int64), SCORE_BUCKETS - 1)
+
+    keys = pd.DataFrame({
+        "minute": df_processed["timestamp"].str.slice(0, 16),
+        "protocol": protocols,
+        "predicted_class": df_processed["Predicted_Class"].astype(int).to_numpy(),
+        "score_bucket": buckets,
+        "src_bytes": df_processed["src_bytes"].to_numpy(dtype=np.float64),
+        "dst_bytes": df_processed["dst_bytes"].to_numpy(dtype=np.float64),
+    })
+    grouped = keys.groupby(["minute", "protocol", "predicted_class", "score_bucket"], sort=False).agg(
+        count=("src_bytes", "size"), src_bytes_sum=("src_bytes", "sum"), dst_bytes_sum=("dst_bytes", "sum")
+    ).reset_index()
+    return list(grouped.itertuples(index=False, name=None))
+
+
+def stats_query(conn, start=None, end=None, protocol="all"):
+    """
+    Statistiques du tableau de bord sur [start, end[ calculées uniquement à partir des agrégats par minute.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("minute >= substr(?, 1, 16)")
+        params.append(start)
+    if end is not None:
+        conditions.append("minute < substr(?, 1, 16)")
+        params.append(end)
+    if protocol != "all":
+        conditions.append("protocol = ?")
+        params.append(protocol.lower())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    def grouped(columns):
+        return conn.execute(f"""
+            SELECT {columns}, SUM(count), SUM(src_bytes_sum), SUM(dst_bytes_sum)
+            FROM {ROLLUP_TABLE} {where}
+            GROUP BY {columns} ORDER BY {columns}
+        """, params).fetchall()
+
+    histogram = [0] * SCORE_BUCKETS
+    for bucket, count, _, _ in grouped("score_bucket"):
+        histogram[bucket] = count
+
+    return {
+        "total": sum(histogram),
+        "by_protocol": {p.upper(): count for p, count, _, _ in grouped("protocol")},
+        "by_class": {str(c): count for c, count, _, _ in grouped("predicted_class")},
+        "score_histogram": {
+            "bucket_width": 1 / SCORE_BUCKETS,
+            "counts": histogram,
+        },
+        "timeline": [
+            {"minute": minute, "predicted_class": c, "count": count, "src_bytes": src, "dst_bytes": dst}
+            for minute, c, count, src, dst in grouped("minute, predicted_class")
+        ],
+    }
+
+
+# ------------------------ 6️⃣ ⏯️ REPRISE DES FICHIERS VOLUMINEUX ------------------------
+
+# Les fichiers volumineux sont ingérés par morceaux : l'octet atteint après chaque morceau (la ligne atteinte
+# pour un fichier Arrow, Parquet ou .npy) est commité dans la même transaction que ses lignes, un redémarrage reprend donc exactement là où l'écriture s'est arrêtée.
+# L'octet final est conservé jusqu'à la suppression du fichier : un fichier terminé mais pas encore supprimé
+# est repris à sa fin, sans réinsertion.
+PROGRESS_TABLE = "ingest_progress"
+
+PROGRESS_UPSERT_SQL = f"""
+    INSERT INTO {PROGRESS_TABLE} (file, size, mtime_ns, offset) VALUES (?, ?, ?, ?)
+    ON CONFLICT (file) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, offset = excluded.offset
+"""
+
+
+def init_progress(conn):
+    with conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+                file TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                offset INTEGER
+            )
+        """)
+
+
+def load_progress(conn, name, size, mtime_ns):
+    """
+    Retourne l'octet (ou la ligne) à partir duquel reprendre le fichier `name` (0 si inconnu,
+    ou si taille / date de modification ne correspondent plus : c'est un autre fichier).
+    """
+    row = conn.execute(f"SELECT size, mtime_ns, offset FROM {PROGRESS_TABLE} WHERE file = ?", (name,)).fetchone()
+    if row is None or (row[0], row[1]) != (size, mtime_ns):
+        return 0
+    return row[2]
+
+
+# ------------------------ 7️⃣ 🗓️ PARTITIONNEMENT PAR PÉRIODE ------------------------
+#
+# Avec PARTITION_BY="day" (ou "hour"), les lignes sont écrites dans une table par période
+# (`connections_20261018`, ou `connections_compact_...` en mode compact), créées à la volée par l'écrivain
+# à partir d'une table modèle vide. `connections` (resp. `connections_compact`) devient une vue UNION ALL :
+# les lectures existantes fonctionnent à l'identique, et `/get_data` n'interroge que les partitions utiles.
+# Les id restent uniques et croissants d'une partition à l'autre (séquence AUTOINCREMENT amorcée à la création),
+# ce qui permet d'écarter une partition d'après l'id de la suivante.
+# La rétention supprime des partitions entières (DROP TABLE, sans DELETE ligne à ligne),
+# et la place libérée est rendue au système par `incremental_vacuum`, par petites étapes en tâche de fond.
+
+PARTITION_TABLE = "connection_partitions"
+# Rétention en heures (0 = illimitée) : les partitions entièrement plus anciennes sont supprimées
+RETENTION_HOURS = float(os.environ.get("RETENTION_HOURS", "0"))
+# Maintenance de fond (rétention puis vacuum incrémental) : intervalle en secondes, et pages libérées par étape
+MAINTENANCE_INTERVAL_SECONDS = float(os.environ.get("MAINTENANCE_INTERVAL_SECONDS", "60"))
+VACUUM_STEP_PAGES = int(os.environ.get("VACUUM_STEP_PAGES", "1024"))
+# Période -> (longueur du préfixe de timestamp, format de ce préfixe, format du suffixe de table, durée)
+PARTITION_PERIODS = {
+    "day": (10, "%Y-%m-%d", "%Y%m%d", timedelta(days=1)),
+    "hour": (13, "%Y-%m-%dT%H", "%Y%m%d%H", timedelta(hours=1)),
+}
+# Nombre maximal de SELECT par requête composée (SQLite en accepte 500)
+UNION_GROUP_SIZE = 200
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Passe la base en `auto_vacuum=INCREMENTAL` : les pages libérées par la suppression d'une partition
+    peuvent ensuite être rendues au système par petites étapes, sans VACUUM bloquant.
+    Sur une base existante, le changement nécessite un VACUUM unique.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is not None:
+        print("🧹 Passage en auto_vacuum incrémental (VACUUM unique)...", flush=True)
+        conn.execute("VACUUM")
+
+
+def partition_bounds(prefix, partition_by=PARTITION_BY, storage_mode=STORAGE_MODE):
+    """
+    Nom de la partition et bornes [début, fin[ (ISO 8601) de la période d'un préfixe de timestamp.
+    """
+    _, prefix_format, suffix_format, width = PARTITION_PERIODS[partition_by]
+    start = datetime.strptime(prefix, prefix_format)
+    name = f"{_data_table(storage_mode)}_{start.strftime(suffix_format)}"
+    return name, start.isoformat(), (start + width).isoformat()
+
+
+def _copy_schema(conn, source, target):
+    # Même définition de table (colonnes, clé AUTOINCREMENT) sous un autre nom
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (source,)).fetchone()[0]
+    conn.execute(re.sub(r'^CREATE TABLE\s+("[^"]+"|[^\s(]+)', f"CREATE TABLE {target}", sql, count=1))
+
+
+def _union_all(names):
+    groups = [names[i:i + UNION_GROUP_SIZE] for i in range(0, len(names), UNION_GROUP_SIZE)]
+    selects = [" UNION ALL ".join(f"SELECT * FROM {name}" for name in group) for group in groups]
+    if len(selects) == 1:
+        return selects[0]
+    return " UNION ALL ".join(f"SELECT * FROM ({select})" for select in selects)
+
+
+def refresh_partition_view(conn, storage_mode=STORAGE_MODE):
+    """
+    Recrée la vue UNION ALL sur les partitions enregistrées (dans l'ordre des id). À appeler dans une transaction.
+    """
+    table = _data_table(storage_mode)
+    names = [name for name, in conn.execute(f"SELECT name FROM {PARTITION_TABLE} ORDER BY first_id")]
+    conn.execute(f"DROP VIEW IF EXISTS {table}")
+    conn.execute(f"CREATE VIEW {table} AS {_union_all(names or [f'{table}_template'])}")
+
+
+def init_partitions(conn, storage_mode=STORAGE_MODE):
+    """
+    Passe la table de données en mode partitionné. Une table unique existante devient la table modèle
+    si elle est vide, sinon la partition `..._legacy` (sans bornes de temps), supprimée par la rétention
+    quand sa ligne la plus récente a expiré.
+    """
+    table = _data_table(storage_mode)
+    template = f"{table}_template"
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PARTITION_TABLE} (
+                name TEXT PRIMARY KEY,
+                start TEXT,
+                end TEXT,
+                first_id INTEGER
+            )
+        """)
+        if _object_type(conn, table) == "table":
+            # Renommage sans réécrire les vues qui la référencent : elles liront la vue UNION ALL du même nom
+            conn.execute("PRAGMA legacy_alter_table=ON")
+            try:
+                if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+                    conn.execute(f"ALTER TABLE {table} RENAME TO {template}")
+                else:
+                    legacy = f"{table}_legacy"
+                    conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+                    first_id = conn.execute(f"SELECT MIN(id) FROM {legacy}").fetchone()[0]
+                    conn.execute(f"INSERT INTO {PARTITION_TABLE} VALUES (?, NULL, NULL, ?)", (legacy, first_id))
+                    _copy_schema(conn, legacy, template)
+                    print(f"🗓️ Table '{table}' conservée comme partition '{legacy}'", flush=True)
+            finally:
+                conn.execute("PRAGMA legacy_alter_table=OFF")
+        refresh_partition_view(conn, storage_mode)
+
+
+def list_partitions(conn, partition_by=PARTITION_BY):
+    """
+    Partitions (nom, début, fin, premier id) dans l'ordre des id, ou None hors mode partitionné.
+    """
+    if partition_by == "none":
+        return None
+    return conn.execute(f"SELECT name, start, end, first_id FROM {PARTITION_TABLE} ORDER BY first_id").fetchall()
+
+
+def select_partitions(partitions, start=None, end=None, before_id=None, since_id=None):
+    """
+    Noms des partitions qui peuvent contenir des lignes dans [start, end[ et ]since_id, before_id[,
+    de la plus récente à la plus ancienne. Une partition sans bornes (legacy) n'est écartée que par les id.
+    """
+    selected = []
+    for i, (name, p_start, p_end, first_id) in enumerate(partitions):
+        next_id = partitions[i + 1][3] if i + 1 < len(partitions) else None
+        if start is not None and p_end is not None and p_end <= start:
+            continue
+        if end is not None and p_start is not None and p_start >= end:
+            continue
+        if before_id is not None and first_id >= before_id:
+            continue
+        if since_id is not None and next_id is not None and next_id <= since_id + 1:
+            continue
+        selected.append(name)
+    return selected[::-1]
+
+
+def create_partition(conn, name, start, end, storage_mode=STORAGE_MODE):
+    """
+    Crée une partition (schéma de la table modèle, index) dont la séquence d'id reprend après le plus grand id
+    existant, l'enregistre et recrée la vue. À appeler dans la transaction de l'écrivain.
+    """
+    table = _data_table(storage_mode)
+    _copy_schema(conn, f"{table}_template", name)
+    for statement in _index_statements(name, storage_mode):
+        conn.execute(statement)
+
+    last_id = conn.execute(f"""
+        SELECT MAX(COALESCE((SELECT MAX(seq) FROM sqlite_sequence WHERE name IN (SELECT name FROM {PARTITION_TABLE})), 0),
+                   COALESCE((SELECT MAX(first_id) FROM {PARTITION_TABLE}), 1) - 1)
+    """).fetchone()[0]
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, last_id))
+    conn.execute(f"INSERT INTO {PARTITION_TABLE} (name, start, end, first_id) VALUES (?, ?, ?, ?)",
+                 (name, start, end, last_id + 1))
+    refresh_partition_view(conn, storage_mode)
+
+
+def drop_expired_partitions(conn, retention_hours=RETENTION_HOURS, storage_mode=STORAGE_MODE):
+    """
+    Supprime d'un bloc (DROP TABLE) les partitions entièrement antérieures à la fenêtre de rétention,
+    ainsi que les agrégats par minute antérieurs à la plus ancienne partition conservée. La partition la plus récente est toujours conservée
+    (elle porte la séquence d'id). Retourne les noms des partitions supprimées.
+    """
+    if retention_hours <= 0:
+        return []
+    cutoff = (datetime.utcnow() - timedelta(hours=retention_hours)).isoformat()
+
+    expired = []
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        partitions = conn.execute(f"SELECT name, start, end, first_id FROM {PARTITION_TABLE} ORDER BY first_id").fetchall()
+        for name, _, end, _ in partitions[:-1]:
+            if end is None:
+                # Partition legacy : expirée quand sa ligne la plus récente l'est (index sur timestamp)
+                latest = conn.execute(f"SELECT MAX(timestamp) FROM {name}").fetchone()[0]
+                if latest is not None and latest >= cutoff:
+                    continue
+            elif end > cutoff:
+                continue
+            expired.append(name)
+
+        if not expired:
+            return []
+        for name in expired:
+            conn.execute(f"DROP TABLE {name}")
+            conn.execute(f"DELETE FROM {PARTITION_TABLE} WHERE name = ?", (name,))
+        refresh_partition_view(conn, storage_mode)
+
+        # Début de la plus ancienne partition conservée (partition legacy : sa ligne la plus ancienne) ;
+        # les partitions expirées ne sont pas forcément les premières (partition legacy encore récente)
+        starts = []
+        for name, start, _, _ in partitions:
+            if name in expired:
+                continue
+            if start is None:
+                start = conn.execute(f"SELECT MIN(timestamp) FROM {name}").fetchone()[0]
+            if start is not None:
+                starts.append(start)
+        if starts:
+            conn.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE minute < ?", (min(starts)[:16],))
+    return expired
+
+
+def incremental_vacuum(conn, step_pages=VACUUM_STEP_PAGES, pause=0.05):
+    """
+    Rend au système les pages libres, `step_pages` par transaction (l'écrivain n'attend jamais longtemps le verrou).
+    Retourne le nombre de pages libérées.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        conn.execute(f"PRAGMA incremental_vacuum({min(step_pages, free)})").fetchall()
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        freed += free - remaining
+        free = remaining
+        time.sleep(pause)
+    return freed
+
+
+# ------------------------ 8️⃣ ✍️ ÉCRIVAIN UNIQUE ------------------------
+
+class SQLiteWriter:
+    """
+    Écrivain SQLite longue durée : une seule connexion, ouverte une fois et réutilisée pour chaque lot.
+
+    - Journal WAL + `synchronous=NORMAL` : un commit ne coûte plus un fsync complet,
+      et les lecteurs de `/get_data` lisent pendant l'écriture sans "database is locked".
+    - La requête INSERT est construite à partir de la liste de colonnes produite par le prétraitement
+      (issue des colonnes de référence) et réutilisée telle quelle (requête préparée gardée en cache).
+    - Les lignes sont horodatées à l'instant de leur commit (cf. `_stamp`) : timestamps et id croissent ensemble,
+      ce sur quoi reposent les bornes d'id des requêtes par période (`connections_query`, `timeseries_query`).
+      Un chargement d'historique (benchmarks, import) peut garder ses propres timestamps (`stamp=False`).
+    - En mode partitionné, les lignes sont réparties par période de leur timestamp ; la partition
+      de la période est créée dans la même transaction que ses premières lignes. Une ligne en retard sur
+      la partition la plus récente (base antérieure à l'horodatage au commit, horloge reculée) y est écrite
+      (sa borne basse est abaissée) : les id restent croissants.
+    """
+
+    def __init__(self, db_path, storage_mode=STORAGE_MODE, partition_by=PARTITION_BY):
+        self.db_path = db_path
+        self.storage_mode = storage_mode
+        self.partition_by = partition_by
+        self.table = _data_table(storage_mode)
+        self._conn = None
+        self._columns = None
+        self._insert_sql = {}
+        self._newest = None  # Partition la plus récente : (nom, début)
+        self._last_stamp = ""
+
+    def _connection(self):
+        if self._conn is None:
+            conn = connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn = conn
+        return self._conn
+
+    def _prepare(self, columns, table=None):
+        columns = list(columns)
+        if columns != self._columns:
+            self._insert_sql = {}
+            self._columns = columns
+        table = table or self.table
+        if table not in self._insert_sql:
+            placeholders = ", ".join("?" for _ in columns)
+            self._insert_sql[table] = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        return self._insert_sql[table]
+
+    def _partition(self, conn, prefix):
+        """
+        Partition qui reçoit les lignes dont le timestamp commence par `prefix` (créée au besoin).
+        """
+        if self._newest is None:
+            row = conn.execute(f"SELECT name, start FROM {PARTITION_TABLE} ORDER BY first_id DESC LIMIT 1").fetchone()
+            self._newest = tuple(row) if row else (None, None)
+
+        name, start, end = partition_bounds(prefix, self.partition_by, self.storage_mode)
+        newest, newest_start = self._newest
+        if name == newest:
+            return name
+        if newest_start is not None and start < newest_start:
+            conn.execute(f"UPDATE {PARTITION_TABLE} SET start = ? WHERE name = ?", (start, newest))
+            self._newest = (newest, start)
+            return newest
+
+        create_partition(conn, name, start, end, self.storage_mode)
+        self._newest = (name, start)
+        print(f"🗓️ Nouvelle partition '{name}'", flush=True)
+        return name
+
+    def _insert_partitioned(self, conn, rows, columns):
+        position = list(columns).index("timestamp")
+        length = PARTITION_PERIODS[self.partition_by][0]
+        for prefix, group in itertools.groupby(rows, key=lambda row: row[position][:length]):
+            conn.executemany(self._prepare(columns, self._partition(conn, prefix)), group)
+
+    def _stamp(self, rows, columns, rollups):
+        """
+        Remplace le timestamp des lignes (listes modifiées sur place) et la minute de leurs agrégats
+        par l'instant du commit. Les timestamps posés en amont (arrivée d'un fichier, découpage d'un fichier
+        volumineux, requête `/predict`) ne suivent pas l'ordre des commits ; celui-ci est croissant,
+        même si l'horloge système recule.
+        """
+        stamp = max(datetime.utcnow().isoformat(timespec="microseconds"), self._last_stamp)
+        self._last_stamp = stamp
+        position = list(columns).index("timestamp")
+        for row in rows:
+            row[position] = stamp
+        return [(stamp[:16], *rollup[1:]) for rollup in rollups]
+
+    def insert_rows(self, rows, columns, rollups=(), progress=None, stamp=True):
+        """
+        Insère des lignes en une seule transaction. `columns` donne le nom des colonnes de chaque ligne
+        (timestamp, 117 variables, classe, probabilité ; ou colonnes compactes en mode "compact").
+        Les agrégats par minute (`rollups`, cf. `rollup_rows`) sont mis à jour dans la même transaction,
+        ainsi que l'avancement des fichiers volumineux (`progress` : nom -> (taille, mtime_ns, octet),
+        ou None pour un fichier rejeté).
+        Retourne l'id de la dernière ligne insérée (None sans ligne) : écrivain unique, les lignes d'un lot
+        reçoivent des id consécutifs, dans l'ordre de `rows`, partitions comprises.
+        Toutes les lignes du lot reçoivent le timestamp du commit (cf. `_stamp`), sauf avec `stamp=False` :
+        les timestamps fournis sont gardés et doivent alors être croissants, et postérieurs aux lignes déjà écrites.
+        """
+        if rows and stamp:
+            rollups = self._stamp(rows, columns, rollups)
+        elif rows:
+            # Les commits suivants restent horodatés après ces lignes
+            position = list(columns).index("timestamp")
+            self._last_stamp = max(self._last_stamp, max(row[position] for row in rows))
+        conn = self._connection()
+        last_id = None
+        try:
+            with conn:
+                if rows and self.partition_by != "none":
+                    conn.execute("BEGIN IMMEDIATE")  # Création éventuelle de partition (DDL) dans la transaction
+                    self._insert_partitioned(conn, rows, columns)
+                elif rows:
+                    conn.executemany(self._prepare(columns), rows)
+                if rows:
+                    # Lu avant les agrégats : un upsert modifie aussi last_insert_rowid()
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                conn.executemany(ROLLUP_UPSERT_SQL, rollups)
+                if progress:
+                    conn.executemany(PROGRESS_UPSERT_SQL, [
+                        (name, *state) for name, state in progress.items() if state is not None])
+                    conn.executemany(f"DELETE FROM {PROGRESS_TABLE} WHERE file = ?", [
+                        (name,) for name, state in progress.items() if state is None])
+        except sqlite3.DatabaseError:
+            # Connexion potentiellement inutilisable : elle sera rouverte au prochain lot
+            self.close()
+            raise
+        except Exception:
+            self._newest = None  # Transaction annulée : une partition créée a pu disparaître
+            raise
+        return last_id
+
+    def clear_progress(self, names):
+        """
+        Supprime l'avancement des fichiers volumineux `names` (fichiers terminés et supprimés).
+        """
+        conn = self._connection()
+        try:
+            with conn:
+                conn.executemany(f"DELETE FROM {PROGRESS_TABLE} WHERE file = ?", [(name,) for name in names])
+        except sqlite3.DatabaseError:
+            self.close()
+            raise
+
+    def close(self):
+        self._newest = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ------------------------ 9️⃣ 🛠️ MIGRATION EN LIGNE DE COMMANDE ------------------------
+
+if __name__ == "__main__":
+    # Migration d'un fichier network_traffic.db existant vers le schéma compact :
+    #   python db.py /app/data/network_traffic.db
+    import sys
+    from artifacts import registry
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("DB_PATH", "/app/network_traffic.db")
+    init_db(path, registry.get().reference_columns_post_processing, storage_mode="compact")
+    conn = connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+    print(f"🗜️ {path} compacté", flush=True)
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # Formats Arrow / Parquet indisponibles, CSV et .npy restent lisibles
+    pa = None
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Colonnes brutes encodées en One-Hot (préfixe des colonnes `<colonne>_<catégorie>` attendues par le modèle)
+CATEGORICAL_COLUMNS = ("protocol_type", "service", "flag")
+# Booléens textuels rencontrés dans certains exports
+BOOLEAN_VALUES = {"VRAI": 1, "FAUX": 0}
+
+
+# ------------------------ 2️⃣ 🧬 ENCODEUR PRÉCOMPILÉ ------------------------
+
+class FeatureEncoder:
+    """
+    Encodeur construit une seule fois à partir des colonnes de référence (un par instantané d'artefacts).
+
+    - Les variables numériques brutes sont copiées directement à leur position dans la matrice du modèle.
+    - Pour `protocol_type`, `service` et `flag`, une table catégorie -> indice de colonne est précalculée :
+      l'encodage One-Hot se réduit à une recherche vectorisée et une affectation par indices.
+    - Une catégorie inconnue du modèle laisse simplement toutes ses colonnes à 0.
+    """
+
+    def __init__(self, reference_columns, model_columns, categorical_columns=CATEGORICAL_COLUMNS):
+        self.raw_columns = list(reference_columns)
+        self.columns = list(model_columns)
+        position = {name: j for j, name in enumerate(self.columns)}
+
+        # Variables numériques : indice dans le fichier brut -> indice dans la matrice du modèle
+        self.numeric_src = [i for i, name in enumerate(self.raw_columns) if name in position]
+        self.numeric_dst = np.array([position[self.raw_columns[i]] for i in self.numeric_src], dtype=np.intp)
+
+        # Variables catégorielles : (indice brut, catégories connues, indices des colonnes One-Hot correspondantes)
+        self.categorical = []
+        for column in categorical_columns:
+            if column not in self.raw_columns:
+                continue
+            prefix = column + "_"
+            targets = {name[len(prefix):]: j for name, j in position.items() if name.startswith(prefix)}
+            self.categorical.append((
+                self.raw_columns.index(column),
+                pd.Index(list(targets)),
+                np.array(list(targets.values()), dtype=np.intp),
+            ))
+        self.onehot_dst = np.concatenate([dst for _, _, dst in self.categorical] or [np.empty(0, dtype=np.intp)])
+        # Colonnes du modèle sans équivalent dans le fichier brut : toujours à 0
+        covered = set(self.numeric_dst.tolist()) | set(self.onehot_dst.tolist())
+        self.missing = [name for j, name in enumerate(self.columns) if j not in covered]
+        # Champs bruts réellement lus par l'encodeur (les autres, comme "label", sont ignorés)
+        used = set(self.numeric_src) | {src for src, _, _ in self.categorical}
+        self.used_raw_columns = [name for i, name in enumerate(self.raw_columns) if i in used]
+        # Catégories connues sous forme de tableaux Arrow (recherche vectorisée dans les colonnes Arrow)
+        self.arrow_categories = [
+            pa.array(list(categories), type=pa.string()) for _, categories, _ in self.categorical
+        ] if pa is not None else None
+
+    def numeric_values(self, df_raw):
+        """
+        Extrait les variables numériques brutes en float64 ("VRAI"/"FAUX" convertis en 1/0).
+        """
+        numeric = df_raw.iloc[:, self.numeric_src]
+        text_columns = [name for name, dtype in numeric.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)]
+        if text_columns:
+            # Cas rare (booléens textuels) : seules les colonnes concernées sont converties
+            numeric = numeric.copy()
+            for name in text_columns:
+                numeric[name] = pd.to_numeric(numeric[name].replace(BOOLEAN_VALUES))
+        return numeric.to_numpy(dtype=np.float64)
+
+    def encode(self, df_raw, numeric=None):
+        """
+        Retourne la matrice float32 (lignes, colonnes du modèle) prête pour `predict_proba`.
+        `numeric` permet de réutiliser le résultat de `numeric_values`.
+        """
+        if numeric is None:
+            numeric = self.numeric_values(df_raw)
+
+        X = np.zeros((len(df_raw), len(self.columns)), dtype=np.float32)
+        X[:, self.numeric_dst] = numeric
+
+        rows = np.arange(len(df_raw))
+        for src, categories, dst in self.categorical:
+            codes = categories.get_indexer(df_raw.iloc[:, src])
+            known = codes >= 0
+            X[rows[known], dst[codes[known]]] = 1.0
+        return X
+
+    def encode_arrow(self, table):
+        """
+        Encode une table Arrow (colonnes brutes dans l'ordre du fichier CSV) sans passer par pandas ni par du texte :
+        variables numériques lues dans les tampons Arrow, catégories résolues par `index_in`.
+        Retourne (X, variables numériques en float64), comme `encode` et `numeric_values`.
+        """
+        if table.num_columns != len(self.raw_columns):
+            raise ValueError(f"{table.num_columns} colonnes trouvées, {len(self.raw_columns)} attendues")
+
+        n = table.num_rows
+        numeric = np.empty((n, len(self.numeric_src)), dtype=np.float64)
+        for k, src in enumerate(self.numeric_src):
+            numeric[:, k] = _arrow_numeric(table.column(src))
+
+        X = np.zeros((n, len(self.columns)), dtype=np.float32)
+        X[:, self.numeric_dst] = numeric
+
+        rows = np.arange(n)
+        for (src, _, dst), categories in zip(self.categorical, self.arrow_categories):
+            codes = pc.index_in(table.column(src).cast(pa.string()), value_set=categories)
+            codes = pc.fill_null(codes, -1).to_numpy()
+            known = codes >= 0
+            X[rows[known], dst[codes[known]]] = 1.0
+        return X, numeric
+
+    def from_matrix(self, matrix):
+        """
+        Reprend une matrice déjà encodée (lignes, colonnes du modèle dans l'ordre de `columns`),
+        par exemple un .npy projeté en mémoire : en float32 contigu, elle est passée au modèle sans copie.
+        Retourne (X, variables numériques en float64).
+        """
+        if matrix.ndim != 2 or matrix.shape[1] != len(self.columns):
+            raise ValueError(f"Matrice de forme {matrix.shape}, {len(self.columns)} colonnes (celles du modèle) attendues")
+        if not (np.issubdtype(matrix.dtype, np.number) or matrix.dtype == np.bool_):
+            raise ValueError(f"Matrice de type {matrix.dtype}, numérique attendu")
+
+        X = np.ascontiguousarray(matrix, dtype=np.float32)
+        numeric = np.asarray(matrix[:, self.numeric_dst], dtype=np.float64)
+        return X, numeric
+
+    def model_input(self, X):
+        """
+        Enveloppe la matrice dans un DataFrame (sans copie) pour conserver la vérification des noms de colonnes de scikit-learn.
+        """
+        return pd.DataFrame(X, columns=self.columns, copy=False)
+
+    def frame(self, X, numeric):
+        """
+        DataFrame à stocker : variables numériques en pleine précision (float64), colonnes One-Hot en entiers 0/1.
+        """
+        onehot = X[:, self.onehot_dst].astype(np.int8)
+        data = {self.columns[j]: numeric[:, k] for k, j in enumerate(self.numeric_dst)}
+        data.update({self.columns[j]: onehot[:, k] for k, j in enumerate(self.onehot_dst)})
+        data.update({name: np.zeros(len(X), dtype=np.int8) for name in self.missing})
+        return pd.DataFrame(data, columns=self.columns)
+
+
+def _arrow_numeric(column):
+    """
+    Colonne Arrow -> tableau float64 (valeurs nulles en NaN, booléens textuels "VRAI"/"FAUX" en 1/0).
+    """
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        values = pd.Series(column.to_numpy(zero_copy_only=False)).replace(BOOLEAN_VALUES)
+        return pd.to_numeric(values).to_numpy(dtype=np.float64)
+    return pc.cast(column, pa.float64()).to_numpy()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+
+from metrics import EVENTS_DROPPED, EVENTS_PUBLISHED, EVENTS_SUBSCRIBERS
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Messages gardés en attente par abonné : au-delà, les plus anciens sont écartés (abonné lent)
+EVENTS_BUFFER_SIZE = int(os.environ.get("EVENTS_BUFFER_SIZE", "64"))
+# Nombre maximal de lignes par message (les plus récentes du commit ; le total est indiqué dans "count")
+EVENTS_MAX_ROWS = int(os.environ.get("EVENTS_MAX_ROWS", "2000"))
+# Nombre maximal d'abonnés simultanés (au-delà : 503)
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "100"))
+# Commentaire envoyé sur un flux inactif : garde la connexion ouverte et détecte les clients partis
+EVENTS_KEEPALIVE_SECONDS = float(os.environ.get("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+
+class TooManySubscribers(Exception):
+    """EVENTS_MAX_SUBSCRIBERS abonnés sont déjà connectés."""
+
+
+# ------------------------ 2️⃣ 📬 ABONNEMENTS ------------------------
+
+class Subscription:
+    """
+    Abonné au flux : tampon borné de messages déjà sérialisés, alimenté par le thread de l'écrivain
+    et vidé par la boucle asyncio de la connexion. Quand le tampon est plein, le plus ancien message est écarté
+    et compté (`dropped`) : le client est prévenu par un événement "gap" et peut se resynchroniser via `/get_data`.
+    """
+
+    def __init__(self, loop, min_score=None, size=EVENTS_BUFFER_SIZE):
+        self.loop = loop
+        self.min_score = min_score
+        self.dropped = 0
+        self._messages = deque(maxlen=size)
+        self._ready = asyncio.Event()
+
+    def push(self, message):
+        # Appelé sous le verrou du diffuseur (thread de l'écrivain)
+        if len(self._messages) == self._messages.maxlen:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+        self._messages.append(message)
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # Boucle fermée : la connexion est en cours de fermeture
+
+    async def next(self, lock, timeout):
+        """
+        Attend au plus `timeout` secondes puis retourne (messages en attente, messages écartés depuis le dernier appel).
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with lock:
+            self._ready.clear()
+            messages, dropped = list(self._messages), self.dropped
+            self._messages.clear()
+            self.dropped = 0
+        return messages, dropped
+
+
+# ------------------------ 3️⃣ 📡 DIFFUSION ------------------------
+
+class EventBroker:
+    """
+    Diffuse les lignes commitées par l'écrivain à tous les abonnés du flux `/events` (Server-Sent Events).
+    Chaque commit est sérialisé une seule fois par filtre (`min_score`) quel que soit le nombre d'abonnés :
+    N tableaux de bord coûtent une diffusion, pas N requêtes SQL.
+    """
+
+    def __init__(self, max_subscribers=EVENTS_MAX_SUBSCRIBERS, max_rows=EVENTS_MAX_ROWS):
+        self.max_subscribers = max_subscribers
+        self.max_rows = max_rows
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, min_score=None):
+        """
+        Nouvel abonnement, à appeler depuis la boucle asyncio qui le consommera.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), min_score)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(f"{self.max_subscribers} abonnés déjà connectés")
+            self._subscribers.add(subscription)
+            EVENTS_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            EVENTS_SUBSCRIBERS.set(len(self._subscribers))
+
+    def publish(self, records, count=None):
+        """
+        Publie un commit : `records` au format de `/get_data` (du plus récent au plus ancien, cf. `dashboard_records`),
+        `count` = nombre total de lignes commitées si seules les plus récentes sont transmises.
+        Ne bloque jamais l'écrivain : un abonné lent perd ses plus anciens messages.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers or not records:
+            return
+
+        messages = {}
+        for subscription in subscribers:
+            if subscription.min_score not in messages:
+                messages[subscription.min_score] = _message(records, count, subscription.min_score)
+
+        with self._lock:
+            for subscription in subscribers:
+                if messages[subscription.min_score] is not None:
+                    subscription.push(messages[subscription.min_score])
+        EVENTS_PUBLISHED.inc()
+
+    async def stream(self, subscription, keepalive=EVENTS_KEEPALIVE_SECONDS):
+        """
+        Flux SSE d'un abonné : événements "rows" (un par commit) et "gap" (messages écartés),
+        commentaire périodique si rien n'est publié. L'abonnement est retiré à la déconnexion du client.
+        """
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                messages, dropped = await subscription.next(self._lock, keepalive)
+                if dropped:
+                    yield f"event: gap\ndata: {json.dumps({'dropped': dropped})}\n\n".encode("utf-8")
+                if messages:
+                    yield b"".join(messages)
+                elif not dropped:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+def _message(records, count, min_score):
+    """
+    Événement SSE "rows" déjà encodé (None si aucune ligne ne passe le filtre).
+    L'id de l'événement est le plus grand id transmis (à réutiliser comme `since_id`) ;
+    "truncated" signale que des lignes plus anciennes du commit n'ont pas été transmises (EVENTS_MAX_ROWS).
+    """
+    count = count or len(records)
+    truncated = count > len(records)
+    if min_score is not None:
+        records = [record for record in records if record["anomaly_score"] >= min_score]
+        if not records:
+            return None
+    payload = json.dumps({"count": count, "truncated": truncated, "rows": records}, ensure_ascii=False,
+                         allow_nan=False, separators=(",", ":"))
+    return f"id: {records[0]['id']}\nevent: rows\ndata: {payload}\n\n".encode("utf-8")
+
+
+# Instance partagée par l'API (abonnements) et le moteur d'ingestion (publication après commit)
+event_broker = EventBroker()
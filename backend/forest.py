@@ -0,0 +1,151 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# "compiled" : évaluation vectorisée de la forêt compilée ; "sklearn" : `predict_proba` de scikit-learn
+FOREST_ENGINE = os.environ.get("FOREST_ENGINE", "compiled")
+# Nombre de threads d'évaluation (les lignes sont réparties par blocs ; NumPy relâche le GIL)
+FOREST_THREADS = int(os.environ.get("FOREST_THREADS", "1"))
+# Taille minimale d'un bloc de lignes par thread
+FOREST_BLOCK_ROWS = int(os.environ.get("FOREST_BLOCK_ROWS", "2048"))
+# Au-delà de ce nombre de lignes, le coût fixe d'un appel scikit-learn est amorti et son parcours compilé (Cython)
+# redevient plus rapide : les gros lots lui sont confiés (résultat identique, cf. `python -m benchmarks.forest`)
+FOREST_MAX_ROWS = int(os.environ.get("FOREST_MAX_ROWS", "1000"))
+# Nombre de niveaux parcourus entre deux retraits des paires arrivées à une feuille
+COMPACT_EVERY = 4
+
+
+# ------------------------ 2️⃣ 🌲 FORÊT COMPILÉE ------------------------
+
+class CompiledForest:
+    """
+    Forêt d'arbres de décision aplatie en tableaux NumPy contigus, évaluée par lots sans appel à scikit-learn.
+
+    - Tous les nœuds de tous les arbres sont concaténés : variable, seuil, enfants gauche/droit (indices globaux),
+      sens des valeurs manquantes, et probabilités des feuilles.
+    - Le parcours avance en parallèle toutes les paires (arbre, ligne) d'un niveau par itération ;
+      les feuilles bouclent sur elles-mêmes, et les paires qui en ont atteint une sont retirées
+      du lot actif tous les `COMPACT_EVERY` niveaux.
+    - Résultat identique bit à bit à `predict_proba` : X en float32, test `x <= seuil` en float64,
+      NaN envoyé du côté `missing_go_to_left`, probabilités des feuilles reprises telles quelles de `tree_.value`,
+      puis sommées dans l'ordre des estimateurs et divisées par leur nombre.
+    """
+
+    def __init__(self, model, threads=FOREST_THREADS, block_rows=FOREST_BLOCK_ROWS):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Forêt multi-sorties non prise en charge")
+
+        self.classes_ = model.classes_
+        self.n_features = model.n_features_in_
+        self.n_trees = len(trees)
+        self.threads = max(1, threads)
+        self.block_rows = block_rows
+        n_classes = len(self.classes_)
+
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.roots = offsets.astype(np.intp)
+
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        features, thresholds, children, leaves, missing, values = [], [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            nodes = tree.__getstate__()["nodes"]
+            is_leaf = nodes["left_child"] < 0
+            own = np.arange(tree.node_count) + offset
+            # Feuilles : variable 0 (lecture sans effet), enfants bouclant sur elles-mêmes
+            features.append(np.where(is_leaf, 0, nodes["feature"]))
+            thresholds.append(nodes["threshold"])
+            # Enfants entrelacés : children[2 * nœud + (x <= seuil)] = droit, gauche
+            children.append(np.stack([
+                np.where(is_leaf, own, nodes["right_child"] + offset),
+                np.where(is_leaf, own, nodes["left_child"] + offset),
+            ], axis=1).ravel())
+            leaves.append(is_leaf)
+            missing.append(nodes["missing_go_to_left"].astype(bool))
+
+            # Valeurs des feuilles telles que les retourne DecisionTreeClassifier.predict_proba (déjà des fractions,
+            # sans renormalisation : la diviser par sa somme changerait le dernier bit sur les forêts multi-classes)
+            values.append(tree.value[:, 0, :n_classes].copy())
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.children = np.concatenate(children).astype(np.intp)
+        self.is_leaf = np.concatenate(leaves)
+        self.missing_go_to_left = np.concatenate(missing)
+        self.leaf_proba = np.ascontiguousarray(np.concatenate(values))
+        self._executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+
+    def apply(self, X):
+        """
+        Indices globaux des feuilles atteintes, de forme (arbres, lignes).
+        """
+        n = X.shape[0]
+        flat = X.ravel()
+        has_nan = bool(np.isnan(flat).any())
+        leaves = np.empty(self.n_trees * n, dtype=np.intp)
+
+        # Paires actives (arbre, ligne), rangées arbre par arbre
+        position = np.arange(self.n_trees * n)
+        nodes = np.repeat(self.roots, n)
+        row_offset = np.tile(np.arange(n) * self.n_features, self.n_trees)
+
+        for depth in range(1, self.max_depth + 1):
+            x = flat[row_offset + self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]  # float32 promu en float64, comme scikit-learn
+            if has_nan:
+                nan = np.isnan(x)
+                go_left[nan] = self.missing_go_to_left[nodes[nan]]
+            nodes = self.children[2 * nodes + go_left]
+
+            if depth % COMPACT_EVERY == 0:
+                done = self.is_leaf[nodes]
+                leaves[position[done]] = nodes[done]
+                keep = ~done
+                position, nodes, row_offset = position[keep], nodes[keep], row_offset[keep]
+                if not position.size:
+                    break
+
+        leaves[position] = nodes  # Profondeur maximale atteinte : toutes les paires restantes sont sur une feuille
+        return leaves.reshape(self.n_trees, n)
+
+    def _predict_block(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        # Accumulation dans l'ordre des estimateurs, comme RandomForestClassifier.predict_proba
+        for tree_leaves in leaves:
+            proba += self.leaf_proba[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba(self, X):
+        """
+        Probabilités par classe (ordre de `classes_`) pour une matrice (lignes, variables).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = X.shape[0]
+        if self._executor is None or n < 2 * self.block_rows:
+            return self._predict_block(X)
+
+        size = max(self.block_rows, -(-n // self.threads))
+        blocks = [X[start:start + size] for start in range(0, n, size)]
+        return np.concatenate(list(self._executor.map(self._predict_block, blocks)))
+
+
+def compile_forest(model, engine=FOREST_ENGINE):
+    """
+    Compile le modèle si c'est une forêt d'arbres de classification prise en charge, sinon retourne None
+    (le `predict_proba` du modèle est alors utilisé tel quel).
+    """
+    if engine != "compiled" or not isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        return None
+    try:
+        return CompiledForest(model)
+    except (AttributeError, ValueError, KeyError) as e:
+        print(f"⚠️ Forêt non compilable ({e}), évaluation par scikit-learn", flush=True)
+        return None
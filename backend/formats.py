@@ -0,0 +1,139 @@
+import io
+import json
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # Format Arrow optionnel
+    pa = None
+
+# ------------------------ 1️⃣ 🧾 FORMATS DE RÉPONSE ------------------------
+
+# format -> type MIME
+MEDIA_TYPES = {
+    "records": "application/json",
+    "columns": "application/json",
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Formats envoyés en flux, morceau par morceau (mémoire constante quel que soit le nombre de lignes)
+STREAM_FORMATS = ("ndjson", "arrow")
+# Nombre de lignes lues par morceau pour les formats en flux
+STREAM_CHUNK_ROWS = 5000
+
+
+def negotiate_format(requested, accept):
+    """
+    Choisit le format de réponse : paramètre `format` explicite, sinon en-tête `Accept`, sinon "records".
+    """
+    if requested:
+        if requested not in MEDIA_TYPES:
+            raise ValueError(f"Format inconnu : {requested} (attendu : {', '.join(MEDIA_TYPES)})")
+        if requested == "arrow" and pa is None:
+            raise ValueError("Format Arrow indisponible : pyarrow n'est pas installé")
+        return requested
+    for fmt in STREAM_FORMATS:
+        if MEDIA_TYPES[fmt] in (accept or "") and (fmt != "arrow" or pa is not None):
+            return fmt
+    return "records"
+
+
+# ------------------------ 2️⃣ 📦 RÉPONSES EN MÉMOIRE ------------------------
+
+def _json_values(series):
+    """
+    Valeurs d'une colonne en texte JSON, dans l'ordre des lignes. Les flottants sont écrits au plus court
+    qui se relit à l'identique (comme `json.dumps`, et donc `/events`) : `to_json` de pandas les arrondit
+    à 15 chiffres au plus. NaN, infinis et None deviennent null.
+    """
+    if not len(series):
+        return []
+    if series.dtype.kind in "biuf":
+        # Encodeur C de `json` sur toute la colonne, puis découpage (aucune virgule dans un nombre)
+        text = json.dumps(series.tolist(), separators=(",", ":"))
+        if series.dtype.kind == "f":
+            text = text.replace("-Infinity", "null").replace("Infinity", "null").replace("NaN", "null")
+        return text[1:-1].split(",")
+    return ["null" if value is None or value != value else json.dumps(value) for value in series.tolist()]
+
+
+def _json_records(df):
+    """
+    Un objet JSON (texte) par ligne, clés dans l'ordre des colonnes.
+    """
+    template = "{" + ",".join(json.dumps(str(name)).replace("%", "%%") + ":%s" for name in df.columns) + "}"
+    return [template % row for row in zip(*(_json_values(df[name]) for name in df.columns))]
+
+
+def encode_frame(df, fmt):
+    """
+    Sérialise un DataFrame en JSON (octets) sans passer par une liste de dicts Python :
+    - "records" : liste d'objets (format historique attendu par Dash) ;
+    - "columns" : un tableau par colonne, {"colonne": [valeurs...]}.
+    """
+    if fmt == "columns":
+        parts = [json.dumps(str(name)) + ":[" + ",".join(_json_values(df[name])) + "]" for name in df.columns]
+        return ("{" + ",".join(parts) + "}").encode("utf-8")
+    return ("[" + ",".join(_json_records(df)) + "]").encode("utf-8")
+
+
+# ------------------------ 3️⃣ 🌊 RÉPONSES EN FLUX ------------------------
+
+# Types Arrow des colonnes de /get_data (fixés pour que tous les morceaux d'un flux aient le même schéma)
+ARROW_TYPES = {
+    "id": "int64",
+    "timestamp": "string",
+    "source_ip": "float64",
+    "destination_ip": "float64",
+    "protocol_type_tcp": "int8",
+    "protocol_type_udp": "int8",
+    "protocol_type_icmp": "int8",
+    "port": "int8",
+    "anomaly_score": "float64",
+    "protocol": "string",
+    "attack_type": "string",  # Type d'attaque (cascade), null hors cascade
+}
+
+
+def stream_query(connect, query, params, fmt):
+    """
+    Générateur d'octets : exécute la requête et sérialise le résultat par morceaux de `STREAM_CHUNK_ROWS` lignes
+    (NDJSON : une ligne JSON par enregistrement ; Arrow : un flux IPC, un RecordBatch par morceau).
+    La connexion est ouverte et fermée dans le générateur (durée de vie = celle du flux).
+    """
+    conn = connect()
+    try:
+        cursor = conn.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+
+        if fmt == "ndjson":
+            while True:
+                chunk = cursor.fetchmany(STREAM_CHUNK_ROWS)
+                if not chunk:
+                    return
+                df = pd.DataFrame.from_records(chunk, columns=columns)
+                yield ("\n".join(_json_records(df)) + "\n").encode("utf-8")
+
+        schema = pa.schema([(name, pa.type_for_alias(ARROW_TYPES.get(name, "string"))) for name in columns])
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema)
+        yield _take(sink)  # Schéma envoyé tout de suite, même si le résultat est vide
+        while True:
+            chunk = cursor.fetchmany(STREAM_CHUNK_ROWS)
+            if not chunk:
+                break
+            df = pd.DataFrame.from_records(chunk, columns=columns)
+            writer.write_batch(pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False))
+            yield _take(sink)
+        writer.close()
+        yield _take(sink)
+    finally:
+        conn.close()
+
+
+def _take(sink):
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -1,6 +1,17 @@
+import argparse
+import io
+import os
+import time
+
 import numpy as np
 import pandas as pd
-import random
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Écriture CSV par pandas, formats Arrow/Parquet indisponibles
+    pa = None
 
 possible_values = {'duration': (np.int64(0), np.int64(57715)),
  'protocol_type': ['udp', 'tcp', 'icmp'],
@@ -200,25 +211,172 @@ continuous_features = ['duration',
  'dst_host_rerror_rate',
  'dst_host_srv_rerror_rate']
 
-def generate_continuous_value(value_range):
-    """Génère une valeur continue aléatoire entre min et max."""
-    min_val, max_val = value_range
-    return random.uniform(min_val, max_val)  # Flottant aléatoire
+# ------------------------ 🎲 GÉNÉRATION VECTORISÉE ------------------------
+
+NORMAL_LABEL = "normal."
+# Formats de sortie : extension des fichiers produits
+OUTPUT_FORMATS = {"csv": ".txt", "arrow": ".arrow", "parquet": ".parquet"}
+
+
+def generate_labels(rng, n, attack_ratio=None, attacks=None):
+    """
+    Tire `n` étiquettes.
+    - `attack_ratio=None` : tirage uniforme parmi toutes les étiquettes (comportement historique) ;
+    - sinon une proportion `attack_ratio` d'attaques, le reste "normal." ;
+      `attacks` ({étiquette: poids}) restreint et pondère les attaques tirées (toutes, uniformément, par défaut).
+    """
+    labels = np.array(possible_values["label"], dtype=object)
+    if attack_ratio is None:
+        return rng.choice(labels, size=n)
+
+    if attacks:
+        names = np.array(list(attacks), dtype=object)
+        weights = np.array(list(attacks.values()), dtype=np.float64)
+        weights /= weights.sum()
+    else:
+        names = labels[labels != NORMAL_LABEL]
+        weights = None
+
+    result = np.full(n, NORMAL_LABEL, dtype=object)
+    is_attack = rng.random(n) < attack_ratio
+    result[is_attack] = rng.choice(names, size=int(is_attack.sum()), p=weights)
+    return result
 
-def generate_fake_row(possible_values, continuous_features):
-    """Génère une ligne factice en respectant les types de données."""
-    fake_row = {}
+
+def generate_fake_data(possible_values, continuous_features, n, rng=None, attack_ratio=None, attacks=None):
+    """
+    Génère `n` lignes factices colonne par colonne (un tirage NumPy par colonne, aucune boucle par ligne).
+    - Variables continues : uniforme entre min et max ;
+    - Variables catégorielles : tirage uniforme parmi les valeurs possibles ;
+    - Étiquette : cf. `generate_labels`.
+    `rng` : `numpy.random.Generator` (ou graine entière) pour des données reproductibles.
+    """
+    rng = np.random.default_rng(rng)
+    columns = {}
     for col, values in possible_values.items():
-        if col in continuous_features:
-            fake_row[col] = generate_continuous_value(values)  # Génération réaliste entre min et max
+        if col == "label":
+            columns[col] = generate_labels(rng, n, attack_ratio, attacks)
+        elif col in continuous_features:
+            low, high = values
+            columns[col] = rng.uniform(float(low), float(high), size=n)
         else:
-            fake_row[col] = np.random.choice(values)  # Valeurs catégoriques aléatoires
-    return fake_row
+            choices = np.array(values, dtype=object if isinstance(values[0], str) else None)
+            columns[col] = rng.choice(choices, size=n)
+    return pd.DataFrame(columns)
+
+
+def generate(n=None, rng=None, attack_ratio=None, attacks=None):
+    """
+    Génère un petit lot de lignes factices (1 à 10 par défaut, comme le flux de démonstration).
+    """
+    rng = np.random.default_rng(rng)
+    if n is None:
+        n = int(rng.integers(1, 11))
+    return generate_fake_data(possible_values, continuous_features, n, rng, attack_ratio, attacks)
+
+
+# ------------------------ 💾 ÉCRITURE DES FICHIERS ------------------------
+
+def encode_file(df, fmt="csv"):
+    """
+    Sérialise un lot au format d'un fichier déposé dans le dossier surveillé (CSV sans en-tête par défaut).
+    """
+    if fmt == "csv":
+        if pa is None:
+            return df.to_csv(index=False, header=False, sep=",").encode("utf-8")
+        # Écrivain CSV d'Arrow : plus d'un ordre de grandeur plus rapide que `to_csv`
+        sink = io.BytesIO()
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink,
+                         pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+        return sink.getvalue()
+
+    if pa is None:
+        raise ValueError(f"Format {fmt} indisponible : pyarrow n'est pas installé")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    if fmt == "arrow":
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == "parquet":
+        pa_parquet.write_table(table, sink)
+    else:
+        raise ValueError(f"Format inconnu : {fmt} (attendu : {', '.join(OUTPUT_FORMATS)})")
+    return sink.getvalue()
+
+
+def write_file(df, folder, name, fmt="csv"):
+    """
+    Écrit un lot dans `folder` : fichier temporaire puis renommage atomique (jamais de fichier à moitié écrit).
+    Retourne le chemin du fichier final.
+    """
+    file_path = os.path.join(folder, name + OUTPUT_FORMATS[fmt])
+    tmp_path = os.path.join(folder, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(encode_file(df, fmt))
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def stream_files(folder, rows_per_second, file_rows=10000, seed=None, attack_ratio=None, attacks=None,
+                 fmt="csv", duration=None, verbose=True):
+    """
+    Dépose des fichiers de `file_rows` lignes dans `folder` au débit cible de `rows_per_second` lignes par seconde
+    (cadence fixe : un fichier toutes les `file_rows / rows_per_second` secondes, sans dérive).
+    S'arrête après `duration` secondes si précisé. Affiche un avertissement si le débit n'est pas tenu.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    period = file_rows / rows_per_second
+    start = time.monotonic()
+    sent = 0
+
+    while duration is None or time.monotonic() - start < duration:
+        df = generate_fake_data(possible_values, continuous_features, file_rows, rng, attack_ratio, attacks)
+        write_file(df, folder, f"generated_data_{time.time_ns()}_{sent}", fmt)
+        sent += 1
+
+        delay = start + sent * period - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elif verbose and sent % 10 == 0:
+            achieved = sent * file_rows / (time.monotonic() - start)
+            print(f"⚠️ Débit cible non tenu : {achieved:,.0f} lignes/s (cible {rows_per_second:,.0f})", flush=True)
+
+    if verbose:
+        elapsed = time.monotonic() - start
+        print(f"📄 {sent} fichiers, {sent * file_rows} lignes en {elapsed:.1f} s "
+              f"({sent * file_rows / elapsed:,.0f} lignes/s)", flush=True)
+
+
+# ------------------------ 🖥️ LIGNE DE COMMANDE ------------------------
+
+def _parse_attacks(value):
+    """
+    "smurf.=3,neptune.=1" -> {"smurf.": 3.0, "neptune.": 1.0}
+    """
+    if not value:
+        return None
+    attacks = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        attacks[name] = float(weight or 1)
+    return attacks
+
 
-def generate_fake_data(possible_values, continuous_features, n):
-    """Génère plusieurs lignes factices."""
-    return pd.DataFrame([generate_fake_row(possible_values, continuous_features) for _ in range(n)])
+if __name__ == "__main__":
+    # Exemple : 100 000 lignes/s en fichiers de 20 000 lignes, 20 % d'attaques, pendant 60 s
+    #   python generate_fake_data.py /app/watched_folder --rows-per-second 100000 --file-rows 20000 \
+    #       --attack-ratio 0.2 --seed 42 --duration 60
+    parser = argparse.ArgumentParser(description="Générateur de trafic factice pour le dossier surveillé")
+    parser.add_argument("folder", nargs="?", default=os.environ.get("WATCHED_FOLDER", "/app/watched_folder"))
+    parser.add_argument("--rows-per-second", type=float, default=1000)
+    parser.add_argument("--file-rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--attack-ratio", type=float, help="Proportion d'attaques (défaut : étiquettes uniformes)")
+    parser.add_argument("--attacks", type=_parse_attacks, help="Attaques pondérées, ex. smurf.=3,neptune.=1")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default="csv")
+    parser.add_argument("--duration", type=float, help="Durée en secondes (défaut : illimitée)")
+    args = parser.parse_args()
 
-def generate():
-    n = random.randint(1, 10)
-    return generate_fake_data(possible_values, continuous_features, n)
+    stream_files(args.folder, args.rows_per_second, args.file_rows, args.seed, args.attack_ratio, args.attacks,
+                 args.format, args.duration)
@@ -0,0 +1,506 @@
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from artifacts import registry
+from cache import ingest_generation
+from db import (MAINTENANCE_INTERVAL_SECONDS, PARTITION_BY, SQLiteWriter, connect, dashboard_records,
+                drop_expired_partitions, incremental_vacuum, load_progress)
+from events import event_broker
+from metrics import (EVENTS_ERRORS, INGEST_COMMITS, INGEST_FILES, INGEST_ROWS, INGEST_STAGE_SECONDS, log_sampled,
+                     observe_prediction_cache, observe_timings)
+from process import file_format, init_worker, row_chunks, score_chunk, score_files, score_rows  # Tâches des processus du pool
+from watcher import FolderWatcher
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Nombre de processus de scoring ("auto" = nombre de cœurs - 1, "0" = scoring dans un thread du processus API)
+INGEST_WORKERS = os.environ.get("INGEST_WORKERS", "auto")
+# Nombre maximal de fichiers confiés à un processus en une tâche
+INGEST_TASK_MAX_FILES = int(os.environ.get("INGEST_TASK_MAX_FILES", "64"))
+
+# Micro-batching des commits : un lot est écrit dès qu'il atteint BATCH_MAX_ROWS lignes ou BATCH_MAX_DELAY_MS millisecondes
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", "5000"))
+BATCH_MAX_DELAY_MS = float(os.environ.get("BATCH_MAX_DELAY_MS", "200"))
+
+# Fichiers volumineux : au-delà de INGEST_STREAM_MIN_BYTES, un fichier est lu, scoré et inséré par morceaux
+# d'environ INGEST_STREAM_CHUNK_BYTES (lignes complètes), mémoire bornée par la taille d'un morceau
+INGEST_STREAM_MIN_BYTES = int(os.environ.get("INGEST_STREAM_MIN_BYTES", str(64 * 1024 * 1024)))
+INGEST_STREAM_CHUNK_BYTES = int(os.environ.get("INGEST_STREAM_CHUNK_BYTES", str(4 * 1024 * 1024)))
+
+
+def resolve_workers(value):
+    """
+    Convertit la valeur de `INGEST_WORKERS` en nombre de processus.
+    """
+    if str(value) == "auto":
+        return max(1, (os.cpu_count() or 2) - 1)
+    return max(0, int(value))
+
+
+def _remove(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+# ------------------------ 2️⃣ 🏭 MOTEUR D'INGESTION ------------------------
+
+class IngestionEngine:
+    """
+    Ingestion multi-cœurs du dossier surveillé :
+
+    - un thread de distribution répartit les fichiers prêts en tâches sur un pool de processus
+      (lecture CSV, `preprocess_data` et `predict_proba` hors du GIL de l'API) ;
+    - un unique thread d'écriture récupère les résultats dans l'ordre d'arrivée des fichiers,
+      les regroupe en lots (`BATCH_MAX_ROWS` / `BATCH_MAX_DELAY_MS`) et les commite en une transaction,
+      puis supprime les fichiers sources ;
+    - les fichiers volumineux (`INGEST_STREAM_MIN_BYTES`) sont découpés par un thread de lecture dédié
+      en morceaux de lignes complètes, scorés et commités un par un avec l'octet atteint (CSV)
+      ou la ligne atteinte (Arrow, Parquet, .npy), et le fichier n'est supprimé qu'après son dernier morceau ;
+    - après chaque commit, les nouvelles lignes sont poussées aux abonnés du flux `/events` (cf. events.py) ;
+    - en mode partitionné, un thread de maintenance supprime les partitions expirées
+      et rend la place libérée au système (vacuum incrémental).
+    """
+
+    def __init__(self, folder, db_path, workers=INGEST_WORKERS, task_max_files=INGEST_TASK_MAX_FILES,
+                 batch_max_rows=BATCH_MAX_ROWS, batch_max_delay_ms=BATCH_MAX_DELAY_MS,
+                 stream_min_bytes=INGEST_STREAM_MIN_BYTES, stream_chunk_bytes=INGEST_STREAM_CHUNK_BYTES):
+        self.folder = folder
+        self.db_path = db_path
+        self.workers = resolve_workers(workers)
+        self.task_max_files = task_max_files
+        self.batch_max_rows = batch_max_rows
+        self.batch_max_delay = batch_max_delay_ms / 1000
+        self.stream_min_bytes = stream_min_bytes
+        self.stream_chunk_bytes = stream_chunk_bytes
+        # File bornée des tâches en cours, dans l'ordre de soumission (contre-pression sur la distribution).
+        # Éléments : (future, chemins, étape) ; `étape` vaut None pour un groupe de petits fichiers,
+        # (chemin, taille, mtime_ns, octet ou ligne atteint) pour un morceau de fichier volumineux,
+        # et (chemin, taille, mtime_ns, None) avec future=None pour marquer la fin d'un fichier volumineux.
+        self._tasks = queue.Queue(maxsize=2 * max(1, self.workers))
+        self._streams = queue.Queue()
+        self._in_flight = set()
+        self._aborted = set()  # Fichiers volumineux dont les morceaux restants doivent être ignorés
+        self._lock = threading.Lock()
+        self._executor = None
+        self._writer = SQLiteWriter(db_path)
+
+    def _new_executor(self):
+        if self.workers == 0:
+            return ThreadPoolExecutor(max_workers=1)
+        # "spawn" : pas de fork d'un processus multi-threadé
+        context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=init_worker)
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        self._executor = self._new_executor()
+        print(f"🏭 Ingestion démarrée ({self.workers or 'aucun'} processus de scoring)", flush=True)
+        threading.Thread(target=self._dispatch_loop, name="ingestion-dispatch", daemon=True).start()
+        threading.Thread(target=self._writer_loop, name="ingestion-writer", daemon=True).start()
+        threading.Thread(target=self._stream_loop, name="ingestion-stream", daemon=True).start()
+        if PARTITION_BY != "none":
+            threading.Thread(target=self._maintenance_loop, name="ingestion-maintenance", daemon=True).start()
+
+    # --- Distribution ---
+
+    def _split(self, files):
+        per_task = math.ceil(len(files) / max(1, self.workers))
+        per_task = max(1, min(self.task_max_files, per_task))
+        return [files[i:i + per_task] for i in range(0, len(files), per_task)]
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            executor = self._executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart_executor(executor)
+            with self._lock:
+                return self._executor.submit(fn, *args)
+
+    def _dispatch_loop(self):
+        watcher = FolderWatcher(self.folder)
+
+        while True:
+            # Fichiers marqués en cours mais pas encore confiés à un thread : libérés en cas d'erreur
+            pending = set()
+            try:
+                ready = watcher.drain()
+                with self._lock:
+                    files = [path for path in ready if path not in self._in_flight]
+                    self._in_flight.update(files)
+                pending.update(files)
+
+                if files:
+                    timestamp = datetime.utcnow().isoformat()
+                    small = []
+                    for path in files:
+                        try:
+                            size = os.path.getsize(path)
+                        except FileNotFoundError:
+                            self._release([path])
+                            pending.discard(path)
+                            continue
+                        if size >= self.stream_min_bytes:
+                            self._streams.put((path, timestamp))
+                            pending.discard(path)
+                        else:
+                            small.append(path)
+
+                    for chunk in self._split(small):
+                        # Bloque si les processus ont trop de retard : les fichiers attendent sur disque
+                        future = self._submit(score_files, [(path, timestamp) for path in chunk])
+                        self._tasks.put((future, chunk, None))
+                        pending.difference_update(chunk)
+
+                watcher.wait()
+
+            except Exception as e:
+                # Sans libération, ces fichiers resteraient ignorés par tous les scans suivants
+                self._release(pending)
+                print(f"⚠️ Erreur de distribution : {e}", flush=True)
+                time.sleep(3)
+
+    def _restart_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                print("⚠️ Pool de processus interrompu, redémarrage", flush=True)
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+
+    def _release(self, paths):
+        with self._lock:
+            self._in_flight.difference_update(paths)
+
+    # --- Lignes scorées hors du dossier surveillé ---
+
+    def submit_scored(self, columns, rows, rollups):
+        """
+        Confie à l'écrivain des lignes déjà scorées (ex. `/predict` avec persistance) :
+        elles sont commitées dans l'ordre, avec les fichiers, par la même connexion.
+        Bloque si l'écrivain a trop de retard (file bornée).
+        """
+        future = Future()
+        future.set_result({"columns": columns, "rows": rows, "rollups": rollups, "files": [], "rejected": []})
+        self._tasks.put((future, [], None))
+
+    # --- Fichiers volumineux ---
+
+    def _abort(self, file_path):
+        with self._lock:
+            self._aborted.add(file_path)
+
+    def _is_aborted(self, file_path):
+        with self._lock:
+            return file_path in self._aborted
+
+    def _resume_offset(self, name, st):
+        conn = connect(self.db_path)
+        try:
+            return load_progress(conn, name, st.st_size, st.st_mtime_ns)
+        finally:
+            conn.close()
+
+    def _stream_loop(self):
+        while True:
+            file_path, timestamp = self._streams.get()
+            try:
+                st = os.stat(file_path)
+                self._stream_file(file_path, st, timestamp)
+            except Exception as e:
+                print(f"⚠️ Erreur de lecture de {os.path.basename(file_path)} : {e}", flush=True)
+                self._abort(file_path)
+                st = None
+            # Marqueur de fin, placé dans la file après tous les morceaux du fichier
+            self._tasks.put((None, [file_path], (file_path, st and st.st_size, st and st.st_mtime_ns, None)))
+
+    def _stream_file(self, file_path, st, timestamp):
+        """
+        Découpe un fichier volumineux en morceaux de lignes complètes à partir du dernier point commité :
+        octet atteint pour un CSV, ligne atteinte pour un fichier binaire (cf. `_stream_rows`).
+        La file des tâches étant bornée, au plus quelques morceaux sont en mémoire à la fois.
+        """
+        offset = self._resume_offset(os.path.basename(file_path), st)
+        if file_format(file_path) != "csv":
+            self._stream_rows(file_path, st, timestamp, offset)
+            return
+        if offset:
+            print(f"⏯️ Reprise de {os.path.basename(file_path)} à l'octet {offset}/{st.st_size}", flush=True)
+
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            carry = b""
+            while not self._is_aborted(file_path):
+                block = f.read(self.stream_chunk_bytes)
+                data = carry + block
+                if block:
+                    # Coupure après le dernier saut de ligne : la ligne incomplète passe au morceau suivant
+                    cut = data.rfind(b"\n") + 1
+                    data, carry = data[:cut], data[cut:]
+                else:
+                    carry = b""
+
+                offset += len(data)
+                if data.strip():
+                    future = self._submit(score_chunk, data, timestamp)
+                    self._tasks.put((future, [file_path], (file_path, st.st_size, st.st_mtime_ns, offset)))
+                if not block:
+                    return
+
+    def _stream_rows(self, file_path, st, timestamp, offset):
+        """
+        Fichier Arrow IPC, Parquet ou .npy : plages de lignes alignées sur ses RecordBatch / groupes de lignes
+        (tranches de la matrice pour .npy), lues dans le fichier par les processus du pool (cf. `row_chunks`).
+        L'avancement commité est la ligne atteinte. Un fichier illisible est rejeté comme un morceau invalide.
+        """
+        try:
+            chunks = row_chunks(file_path, self.stream_chunk_bytes, offset)
+        except ValueError as e:
+            future = Future()
+            future.set_result({"columns": None, "rows": [], "rollups": [], "files": [], "rejected": [(None, str(e))]})
+            self._tasks.put((future, [file_path], (file_path, st.st_size, st.st_mtime_ns, offset)))
+            return
+        if offset:
+            print(f"⏯️ Reprise de {os.path.basename(file_path)} à la ligne {offset}", flush=True)
+
+        for start, stop in chunks:
+            if self._is_aborted(file_path):
+                return
+            future = self._submit(score_rows, file_path, start, stop, timestamp)
+            self._tasks.put((future, [file_path], (file_path, st.st_size, st.st_mtime_ns, stop)))
+
+    # --- Écriture ---
+
+    def _writer_loop(self):
+        batch = _PendingBatch()
+
+        while True:
+            try:
+                timeout = max(0.0, batch.deadline - time.monotonic()) if batch.pending else None
+                try:
+                    future, chunk, step = self._tasks.get(timeout=timeout)
+                except queue.Empty:
+                    self._commit(batch)
+                    batch = _PendingBatch()
+                    continue
+
+                if step is not None:
+                    result = self._stream_result(future, step)
+                    if result is None:
+                        continue
+                else:
+                    # Résultats consommés dans l'ordre de soumission : commits dans l'ordre d'arrivée
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        self._restart_executor(self._executor)
+                        self._release(chunk)  # Les fichiers seront repris au prochain scan
+                        continue
+                    except Exception as e:
+                        print(f"❌ Erreur de scoring sur {len(chunk)} fichier(s) : {e}", flush=True)
+                        self._release(chunk)
+                        continue
+
+                    for file_path, reason in result["rejected"]:
+                        log_sampled("file_rejected", file=os.path.basename(file_path), reason=reason)
+                        _remove(file_path)
+                    INGEST_FILES.inc(len(result["rejected"]), status="rejected")
+                    self._release([path for path, _ in result["rejected"]])
+
+                observe_timings(result.get("timings", {}))
+                observe_prediction_cache(result.get("prediction_cache"))
+
+                if result["files"] or result["rows"] or result.get("progress") or result.get("released"):
+                    if batch.rows and result["rows"] and result["columns"] != batch.columns:
+                        # Colonnes modifiées (nouveaux artefacts) : le lot en cours est écrit d'abord
+                        self._commit(batch)
+                        batch = _PendingBatch()
+                    batch.add(result, self.batch_max_delay)
+
+                if batch.pending and (len(batch.rows) >= self.batch_max_rows or time.monotonic() >= batch.deadline):
+                    self._commit(batch)
+                    batch = _PendingBatch()
+
+            except Exception as e:
+                print(f"⚠️ Erreur d'écriture : {e}", flush=True)
+                self._drop(batch)
+                batch = _PendingBatch()
+                time.sleep(3)
+
+    def _stream_result(self, future, step):
+        """
+        Traduit un morceau (ou le marqueur de fin) d'un fichier volumineux en résultat à ajouter au lot.
+        Retourne None si l'élément doit être ignoré (fichier abandonné).
+        """
+        file_path, size, mtime_ns, offset = step
+        name = os.path.basename(file_path)
+
+        if future is None:
+            # Fin du fichier : tous ses morceaux ont été vus par l'écrivain
+            with self._lock:
+                aborted = file_path in self._aborted
+                self._aborted.discard(file_path)
+            if aborted:
+                # Fichier rejeté, ou conservé pour reprise au prochain scan : libéré seulement une fois le lot
+                # en cours commité (ou abandonné), sinon la reprise lirait un octet antérieur à ses morceaux en attente
+                return {"columns": None, "rows": [], "rollups": [], "files": [], "released": [file_path]}
+            # Avancement conservé (octet final) jusqu'à la suppression du fichier : un arrêt entre le commit
+            # et la suppression ne fait pas réinsérer le fichier au redémarrage
+            return {"columns": None, "rows": [], "rollups": [], "files": [file_path], "stream": file_path}
+
+        if self._is_aborted(file_path):
+            return None
+
+        try:
+            result = future.result()
+        except Exception as e:
+            # Processus interrompu ou erreur inattendue : reprise au prochain scan depuis le dernier octet commité
+            if isinstance(e, BrokenProcessPool):
+                self._restart_executor(self._executor)
+            print(f"❌ Erreur de scoring sur un morceau de {name} : {e}", flush=True)
+            self._abort(file_path)
+            return None
+
+        if result["rejected"]:
+            log_sampled("file_rejected", file=name, reason=result["rejected"][0][1])
+            INGEST_FILES.inc(status="rejected")
+            self._abort(file_path)
+            _remove(file_path)
+            return {"columns": None, "rows": [], "rollups": [], "files": [], "progress": {name: None}}
+
+        result["progress"] = {name: (size, mtime_ns, offset)}
+        result["stream"] = file_path
+        return result
+
+    def _drop(self, batch):
+        """
+        Abandonne un lot non commité : ses petits fichiers restent sur disque et seront retraités,
+        les fichiers volumineux concernés seront repris depuis leur dernier octet commité.
+        """
+        self._release(batch.files + batch.released)
+        for file_path in batch.streamed.difference(batch.files):
+            self._abort(file_path)
+
+    def _commit(self, batch):
+        """
+        Insère un lot en une seule transaction (connexion persistante de l'écrivain),
+        puis supprime ses fichiers sources. En cas d'échec, les fichiers restent sur disque et seront retraités.
+        """
+        start = time.perf_counter()
+        try:
+            last_id = self._writer.insert_rows(batch.rows, batch.columns, batch.rollups, batch.progress)
+        except Exception as e:
+            print(f"❌ Erreur lors de l'insertion SQL ({len(batch.files)} fichiers conservés) : {e}", flush=True)
+            INGEST_COMMITS.inc(status="error")
+            self._drop(batch)
+            return
+        inserted = time.perf_counter()
+
+        # Nouvelles lignes visibles : les réponses en cache de l'API sont périmées
+        ingest_generation.bump()
+        self._publish(batch, last_id)
+
+        # Les fichiers ne sont supprimés qu'une fois leurs lignes commitées
+        for file_path in batch.files:
+            _remove(file_path)
+        self._release(batch.files + batch.released)
+        self._clear_progress(batch.streamed.intersection(batch.files))
+        deleted = time.perf_counter()
+
+        INGEST_STAGE_SECONDS.observe(inserted - start, stage="insert")
+        INGEST_STAGE_SECONDS.observe(deleted - inserted, stage="delete")
+        INGEST_COMMITS.inc(status="ok")
+        INGEST_ROWS.inc(len(batch.rows))
+        INGEST_FILES.inc(len(batch.files), status="ingested")
+        log_sampled("ingest_commit", rows=len(batch.rows), files=len(batch.files), large_files=len(batch.streamed),
+                    insert_ms=round((inserted - start) * 1000, 3))
+
+    def _clear_progress(self, file_paths):
+        """
+        Oublie l'avancement des fichiers volumineux supprimés. Sans effet sur l'exactitude en cas d'échec :
+        un fichier homonyme ne reprend à l'octet enregistré que si sa taille et sa date de modification sont identiques.
+        """
+        names = [os.path.basename(path) for path in file_paths if not os.path.exists(path)]
+        if not names:
+            return
+        try:
+            self._writer.clear_progress(names)
+        except Exception as e:
+            print(f"⚠️ Nettoyage de l'avancement impossible : {e}", flush=True)
+
+    def _publish(self, batch, last_id):
+        """
+        Pousse les lignes commitées aux abonnés du flux `/events` (les plus récentes, au plus EVENTS_MAX_ROWS).
+        Rien n'est converti sans abonné ; une erreur de diffusion n'affecte jamais l'ingestion.
+        """
+        if not batch.rows or last_id is None or not event_broker.has_subscribers:
+            return
+        try:
+            rows = batch.rows[-event_broker.max_rows:]
+            records = dashboard_records(batch.columns, rows, last_id, registry.get().reference_columns_post_processing)
+            event_broker.publish(records, count=len(batch.rows))
+        except Exception as e:
+            EVENTS_ERRORS.inc()
+            log_sampled("events_publish_error", error=str(e))
+
+    # --- Maintenance ---
+
+    def _maintenance_loop(self, interval=MAINTENANCE_INTERVAL_SECONDS):
+        """
+        Rétention par partitions entières puis vacuum incrémental, par courtes transactions
+        sur une connexion dédiée : l'écrivain n'est jamais bloqué plus d'une étape.
+        """
+        conn = connect(self.db_path)
+        while True:
+            time.sleep(interval)
+            try:
+                expired = drop_expired_partitions(conn)
+                if expired:
+                    ingest_generation.bump()  # Lignes disparues : les réponses en cache sont périmées
+                    print(f"🗑️ {len(expired)} partition(s) expirée(s) supprimée(s) : {', '.join(expired)}", flush=True)
+                freed = incremental_vacuum(conn)
+                if freed:
+                    log_sampled("incremental_vacuum", pages=freed)
+            except Exception as e:
+                print(f"⚠️ Erreur de maintenance de la base : {e}", flush=True)
+
+
+class _PendingBatch:
+    """
+    Résultats de scoring accumulés par l'écrivain en attendant le prochain commit.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.rows = []
+        self.rollups = []
+        self.files = []
+        self.progress = {}  # Avancement des fichiers volumineux (nom -> état), commité avec les lignes
+        self.streamed = set()  # Chemins des fichiers volumineux ayant des morceaux (ou leur fin) dans ce lot
+        self.released = []  # Fichiers volumineux abandonnés, libérés après ce lot pour reprise au prochain scan
+        self.deadline = None
+
+    @property
+    def pending(self):
+        return self.deadline is not None
+
+    def add(self, result, max_delay):
+        if self.deadline is None:
+            self.deadline = time.monotonic() + max_delay
+        self.columns = result["columns"] or self.columns
+        self.rows.extend(result["rows"])
+        self.rollups.extend(result["rollups"])
+        self.files.extend(result["files"])
+        self.progress.update(result.get("progress") or {})
+        self.released.extend(result.get("released") or [])
+        if result.get("stream"):
+            self.streamed.add(result["stream"])
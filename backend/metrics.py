@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Bornes (en secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Journalisation échantillonnée : au plus une ligne par type d'événement toutes les LOG_SAMPLE_SECONDS secondes
+LOG_SAMPLE_SECONDS = float(os.environ.get("LOG_SAMPLE_SECONDS", "10"))
+
+
+# ------------------------ 2️⃣ 📈 MÉTRIQUES (FORMAT PROMETHEUS) ------------------------
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Métrique nommée, éventuellement étiquetée (une série par combinaison de valeurs d'étiquettes).
+    Mise à jour thread-safe et sans allocation hors création d'une nouvelle série.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_series(self, key, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _labels(self.label_names, key, [("le", _number(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_number(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render():
+    """
+    Toutes les métriques au format texte d'exposition Prometheus (version 0.0.4).
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------ 3️⃣ 📊 MÉTRIQUES DU BACKEND ------------------------
+
+INGEST_STAGE_SECONDS = Histogram("ingest_stage_seconds", "Durée de chaque étape d'ingestion, par lot", ["stage"])
+INGEST_ROWS = Counter("ingest_rows_total", "Lignes commitées en base")
+INGEST_FILES = Counter("ingest_files_total", "Fichiers traités", ["status"])
+INGEST_COMMITS = Counter("ingest_commits_total", "Transactions d'insertion", ["status"])
+WATCH_BACKLOG = Gauge("watch_backlog_files", "Fichiers en attente dans le dossier surveillé")
+WATCH_OLDEST_AGE = Gauge("watch_oldest_file_age_seconds", "Âge du plus ancien fichier en attente")
+DB_SIZE = Gauge("db_size_bytes", "Taille de la base SQLite (fichier principal + journal WAL)")
+HTTP_SECONDS = Histogram("http_request_seconds", "Latence des endpoints de lecture", ["endpoint", "format"])
+READ_REJECTED = Counter("read_rejected_total", "Lectures refusées (surcharge) ou interrompues (délai dépassé)",
+                        ["endpoint", "reason"])
+READ_PENDING = Gauge("read_pending_requests", "Lectures en cours ou en attente d'une connexion")
+EVENTS_SUBSCRIBERS = Gauge("events_subscribers", "Abonnés connectés au flux /events")
+EVENTS_PUBLISHED = Counter("events_published_total", "Messages publiés sur le flux /events (un par commit)")
+EVENTS_ERRORS = Counter("events_publish_errors_total", "Commits non diffusés sur le flux /events (erreur de conversion)")
+EVENTS_DROPPED = Counter("events_dropped_total", "Messages écartés faute de place dans le tampon d'un abonné lent")
+PREDICTION_ROWS = Counter("prediction_rows_total",
+                          "Lignes scorées, par origine de la prédiction (model, batch : doublon du lot, cache)", ["source"])
+
+
+def observe_timings(timings):
+    """
+    Enregistre les durées d'étapes mesurées dans un processus de scoring ({étape: secondes}).
+    """
+    for stage, seconds in timings.items():
+        INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def observe_prediction_cache(counts):
+    """
+    Enregistre l'origine des prédictions servies par un cache de prédictions ({origine: lignes}, cf. `drain_counts`).
+    Taux de succès : 1 - prediction_rows_total{source="model"} / somme des trois origines.
+    """
+    for source, rows in (counts or {}).items():
+        if rows:
+            PREDICTION_ROWS.inc(rows, source=source)
+
+
+# ------------------------ 4️⃣ 📝 JOURNALISATION ÉCHANTILLONNÉE ------------------------
+
+_log_state = {}
+_log_lock = threading.Lock()
+
+
+def log_sampled(event, **fields):
+    """
+    Journal structuré (une ligne JSON) pour les événements fréquents du chemin critique :
+    au plus une ligne par `event` toutes les LOG_SAMPLE_SECONDS secondes,
+    avec le nombre d'occurrences non journalisées depuis la précédente ("suppressed").
+    """
+    now = time.monotonic()
+    with _log_lock:
+        last, suppressed = _log_state.get(event, (None, 0))
+        if last is not None and now - last < LOG_SAMPLE_SECONDS:
+            _log_state[event] = (last, suppressed + 1)
+            return
+        _log_state[event] = (now, 0)
+
+    record = {"ts": datetime.utcnow().isoformat(), "event": event, **fields, "suppressed": suppressed}
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
@@ -0,0 +1,162 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from artifacts import registry
+from metrics import observe_prediction_cache
+from process import EXPECTED_RAW_COLUMNS, preprocess_data, scored_rows
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Regroupement des requêtes concurrentes : un appel au modèle dès PREDICT_MAX_BATCH_ROWS lignes,
+# ou au plus PREDICT_MAX_WAIT_MS millisecondes après la première requête en attente
+PREDICT_MAX_BATCH_ROWS = int(os.environ.get("PREDICT_MAX_BATCH_ROWS", "2048"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "2"))
+# Nombre maximal d'enregistrements par requête
+PREDICT_MAX_RECORDS = int(os.environ.get("PREDICT_MAX_RECORDS", "10000"))
+# Persistance par défaut des lignes scorées (surchargeable par requête avec `?persist=`)
+PREDICT_PERSIST = os.environ.get("PREDICT_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+# ------------------------ 2️⃣ 📥 LECTURE DES ENREGISTREMENTS ------------------------
+
+def parse_records(payload):
+    """
+    Convertit le corps JSON de `/predict` en DataFrame brut (mêmes 42 champs qu'une ligne de fichier) :
+    - un enregistrement : liste de 42 valeurs, ou objet {champ: valeur} ;
+    - plusieurs : liste de ces enregistrements, éventuellement sous la clé "records".
+    Les champs non lus par le modèle (ex. "label") peuvent être omis dans la forme objet.
+    Lève ValueError si le corps est invalide.
+    """
+    if isinstance(payload, dict) and "records" in payload:
+        payload = payload["records"]
+    if isinstance(payload, dict) or (isinstance(payload, list) and payload and not isinstance(payload[0], (list, dict))):
+        payload = [payload]  # Un seul enregistrement
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("Aucun enregistrement fourni")
+    if len(payload) > PREDICT_MAX_RECORDS:
+        raise ValueError(f"{len(payload)} enregistrements reçus, {PREDICT_MAX_RECORDS} au maximum par requête")
+
+    encoder = registry.current.encoder  # Appelé sur la boucle asyncio : aucun rechargement ici
+
+    if all(isinstance(record, dict) for record in payload):
+        df = pd.DataFrame.from_records(payload, columns=encoder.raw_columns)
+        missing = [name for name in encoder.used_raw_columns if df[name].isna().any()]
+        if missing:
+            raise ValueError(f"Champs manquants : {', '.join(missing)}")
+        df.columns = range(df.shape[1])  # Mêmes étiquettes que la forme liste (concaténation dans un lot)
+        return df
+
+    if all(isinstance(record, list) for record in payload):
+        lengths = {len(record) for record in payload}
+        if lengths != {EXPECTED_RAW_COLUMNS}:
+            raise ValueError(f"Chaque enregistrement doit contenir {EXPECTED_RAW_COLUMNS} champs")
+        return pd.DataFrame(payload)
+
+    raise ValueError("Enregistrements mixtes : utiliser uniquement des listes ou uniquement des objets")
+
+
+# ------------------------ 3️⃣ 🧺 REGROUPEMENT DES PRÉDICTIONS ------------------------
+
+class PredictionBatcher:
+    """
+    Regroupe les requêtes `/predict` concurrentes en un seul appel à `predict_proba`.
+
+    - Les requêtes sont mises en file sur la boucle asyncio ; une tâche de fond forme un lot dès la première,
+      complété pendant au plus `max_wait_ms` ou jusqu'à `max_rows` lignes.
+    - L'inférence tourne dans un thread dédié : la boucle d'événements n'est jamais bloquée,
+      et les requêtes arrivées pendant une inférence forment naturellement le lot suivant.
+    - Les lignes des requêtes avec persistance sont confiées à `persist(colonnes, lignes, agrégats)`
+      (l'écrivain de l'ingestion).
+    """
+
+    def __init__(self, persist=None, max_rows=PREDICT_MAX_BATCH_ROWS, max_wait_ms=PREDICT_MAX_WAIT_MS):
+        self.persist = persist
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+
+    async def predict(self, df_raw, persist=False):
+        """
+        Score un DataFrame brut et retourne le DataFrame prétraité (dont Predicted_Class et Prediction_Probability).
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.get_loop() is not loop:
+            # Démarrage paresseux : la tâche de fond vit sur la boucle du serveur
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+        future = loop.create_future()
+        await self._queue.put((df_raw, persist, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+
+            while rows < self.max_rows:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            outcomes = await loop.run_in_executor(self._executor, self._infer, batch)
+            for (_, _, future), (result, error) in zip(batch, outcomes):
+                if future.done():
+                    continue  # Client parti entre-temps
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _infer(self, batch):
+        """
+        Exécuté dans le thread d'inférence : un seul appel au modèle pour tout le lot.
+        Retourne, pour chaque requête, (résultat, None) ou (None, exception).
+        """
+        try:
+            # Rechargement éventuel des artefacts (lecture, hachage) dans ce thread, jamais sur la boucle
+            artifacts = registry.get()
+            df_raw = pd.concat([item[0] for item in batch], ignore_index=True)
+            df_processed = preprocess_data(df_raw, artifacts=artifacts)
+            if df_processed is None:
+                raise ValueError("Prétraitement impossible")
+        except Exception as e:
+            if len(batch) == 1:
+                return [(None, e)]
+            # Échec du lot : nouvel essai requête par requête pour isoler la requête fautive
+            return [self._infer([item])[0] for item in batch]
+
+        cache = artifacts.prediction_cache
+        if cache is not None:
+            observe_prediction_cache(cache.drain_counts())
+
+        outcomes, persisted, start = [], [], 0
+        for df, persist, _ in batch:
+            result = df_processed.iloc[start:start + len(df)].reset_index(drop=True)
+            result.attrs["model_version"] = artifacts.version
+            outcomes.append((result, None))
+            if persist:
+                persisted.append(result)
+            start += len(df)
+
+        if persisted and self.persist is not None:
+            try:
+                df_persisted = pd.concat(persisted, ignore_index=True)
+                df_persisted.insert(0, "timestamp", datetime.utcnow().isoformat())
+                self.persist(*scored_rows(artifacts, df_persisted))
+            except Exception as e:
+                print(f"❌ Persistance des prédictions impossible : {e}", flush=True)
+
+        return outcomes
@@ -1,71 +1,452 @@
+import io
+import os
+import time
+
 import numpy as np
 import pandas as pd
-import joblib
 
-REFERENCE_COLUMNS_PATH = "reference_columns.pkl"
-REFERENCE_COLUMNS_POST_PROCESSING_PATH = "reference_columns_post_processing.pkl"
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+except ImportError:  # Seuls les fichiers CSV et .npy sont alors acceptés
+    pa = None
+
+from artifacts import registry
+from cache import row_keys, unique_rows
+from db import STORAGE_MODE, compact_frame, rollup_rows
+from metrics import log_sampled
+
+# Point d'entrée des processus de scoring ("spawn") : ce module et ses imports ne font rien à l'import
+# (ni thread, ni connexion, ni chargement d'artefacts), chaque processus ne paie que ce dont il a besoin.
+
+# Cascade : seules les lignes dont la probabilité d'anomalie atteint ce seuil passent par le modèle multi-classe
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.5"))
+EXPECTED_RAW_COLUMNS = 42  # Nombre de colonnes d'un fichier brut
 
+# Formats binaires reconnus à l'extension ; tout autre fichier est lu comme un CSV sans en-tête
+INPUT_FORMATS = {".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow", ".parquet": "parquet", ".npy": "npy"}
 
-def preprocess_data(df):
+
+def preprocess_data(df, timings=None, artifacts=None):
     """
-    Prétraite les données brutes pour qu'elles correspondent aux attentes du modèle :
-    - Applique One-Hot Encoding uniquement aux colonnes "protocol_type" et "flag"
-    - Ajoute les colonnes manquantes (remplies avec des 0) via `concat()`
-    - Supprime les colonnes en trop pour correspondre exactement aux 54 colonnes attendues
+    Prétraite les données brutes pour qu'elles correspondent aux attentes du modèle, puis les score :
+    - Encode les variables numériques et le One-Hot de "protocol_type", "service" et "flag"
+      directement dans une matrice float32 préallouée, dans l'ordre exact des colonnes du modèle
+      (cf. `FeatureEncoder`, construit une seule fois avec les artefacts)
     - Convertit les booléens "VRAI"/"FAUX" en 1/0
-    - Ajoute les colonnes absentes après traitement avec des valeurs 0
-    - Retourne un DataFrame final avec les 54 colonnes attendues
+    - Retourne un DataFrame avec les 117 colonnes attendues, la classe prédite et sa probabilité,
+      et le type d'attaque des lignes suspectes (cascade, cf. `score_features`)
+    `timings` (dict optionnel) reçoit la durée des étapes "encode" et "predict" en secondes.
+    `artifacts` : instantané à utiliser, `registry.get()` par défaut.
     """
 
-    # Charger la liste des colonnes attendues pour l'encodage
-    reference_columns = joblib.load(REFERENCE_COLUMNS_PATH)
+    # Instantané cohérent modèle + colonnes + encodeur (chargé une seule fois, rechargé à chaud si modifié)
+    if artifacts is None:
+        artifacts = registry.get()
+    encoder = artifacts.encoder
 
     # Vérifier que le DataFrame a bien le bon nombre de colonnes avant encodage
-    expected_raw_columns = 42  # Modifier si le fichier brut a un autre nombre de colonnes
-    if df.shape[1] != expected_raw_columns:
-        print(f"⚠️ Erreur : {df.shape[1]} colonnes trouvées au lieu de {expected_raw_columns}. Fichier ignoré.")
+    # (journal échantillonné : un flot de lots invalides ne doit pas saturer la sortie)
+    if df.shape[1] != EXPECTED_RAW_COLUMNS:
+        log_sampled("preprocess_rejected", columns=df.shape[1], expected=EXPECTED_RAW_COLUMNS)
         return None  # Retourne `None` pour éviter de traiter un mauvais fichier
 
-    # Assigner les noms de colonnes à partir de reference_columns
-    df.columns = reference_columns[:df.shape[1]]
+    # Encodage vectorisé : quelques opérations NumPy par lot, sans get_dummies / concat / réindexation
+    start = time.perf_counter()
+    numeric = encoder.numeric_values(df)
+    X = encoder.encode(df, numeric)
+    if timings is not None:
+        timings["encode"] = timings.get("encode", 0.0) + time.perf_counter() - start
 
-    # Identifier les colonnes à encoder
-    categorical_columns = ["protocol_type", "flag"]
-    df_encoded = pd.get_dummies(df, columns=categorical_columns)
+    return score_features(artifacts, X, numeric, timings)
 
-    # Convertir "VRAI"/"FAUX" en 1/0
-    df_encoded = df_encoded.replace({"VRAI": 1, "FAUX": 0})
 
-    # Charger les colonnes attendues après traitement
-    reference_columns_post_processing = joblib.load(REFERENCE_COLUMNS_POST_PROCESSING_PATH)
+def score_features(artifacts, X, numeric, timings=None):
+    """
+    Score une matrice déjà encodée (float32, colonnes du modèle) avec l'instantané `artifacts` qui l'a encodée.
+    `numeric` : variables numériques brutes en float64, stockées en pleine précision.
+    Cascade : le modèle binaire score toutes les lignes ; si un modèle multi-classe est chargé, seules les lignes
+    au-dessus de CASCADE_THRESHOLD reçoivent un type d'attaque (les autres restent à NULL).
+    Les lignes identiques ne sont scorées qu'une fois : doublons du lot, puis cache des prédictions (cf. cache.py).
+    Retourne le DataFrame à stocker (117 colonnes, classe prédite, probabilité, type d'attaque et sa probabilité) ;
+    `timings` reçoit les étapes "cache", "predict" et "predict_multiclass".
+    """
+    if artifacts.prediction_cache is not None:
+        proba, attack_type, attack_probability = _predict_cached(artifacts, X, timings)
+    else:
+        proba, attack_type, attack_probability = _predict(artifacts, X, timings)
+    predicted_class = (proba >= 0.5).astype(int)  # Seuil à 0.5 pour classification
 
-    # Ajouter les colonnes manquantes avec des 0
-    missing_cols = list(set(reference_columns_post_processing) - set(df_encoded.columns))
-    if missing_cols:
-        print(f"➕ Ajout de {len(missing_cols)} colonnes manquantes après traitement : {missing_cols}")
-        missing_df = pd.DataFrame(0, index=df_encoded.index, columns=missing_cols)
-        df_encoded = pd.concat([df_encoded, missing_df], axis=1)
-    
+    # Ajouter les résultats au DataFrame stocké (variables numériques en pleine précision)
+    df_encoded = artifacts.encoder.frame(X, numeric)
+    df_encoded['Predicted_Class'] = predicted_class
+    df_encoded['Prediction_Probability'] = proba
+    # Colonnes objet explicites : les lignes non suspectes restent à None (NULL en base, null en JSON)
+    df_encoded['Attack_Type'] = pd.Series(attack_type, dtype=object)
+    df_encoded['Attack_Probability'] = pd.Series(attack_probability, dtype=object)
 
+    return df_encoded
 
-    # Forcer le bon ordre des colonnes
-    df_encoded = df_encoded[reference_columns_post_processing]
 
-    # Vérification finale du nombre de colonnes
-    if df_encoded.shape[1] != len(reference_columns_post_processing):
-        print(f"❌ ERREUR : {df_encoded.shape[1]} colonnes générées, mais {len(reference_columns_post_processing)} attendues !")
-        return None
-    
+def _predict(artifacts, X, timings):
+    """
+    Probabilité d'anomalie, type d'attaque et sa probabilité (None hors cascade) de chaque ligne de X.
+    """
+    # Effectuer les prédictions en une seule fois (forêt compilée si possible, cf. forest.py)
+    start = time.perf_counter()
+    proba = artifacts.predict_proba(X)[:, 1]  # Probabilité d'appartenir à la classe 1
+    if timings is not None:
+        timings["predict"] = timings.get("predict", 0.0) + time.perf_counter() - start
+
+    # Second étage : coût proportionnel au nombre de lignes suspectes, pas au trafic total
+    attack_type = np.full(len(X), None, dtype=object)
+    attack_probability = np.full(len(X), None, dtype=object)
+    flagged = np.flatnonzero(proba >= CASCADE_THRESHOLD) if artifacts.multiclass_model is not None else []
+    if len(flagged):
+        start = time.perf_counter()
+        labels, probabilities = artifacts.predict_attack(X[flagged])
+        if timings is not None:
+            timings["predict_multiclass"] = timings.get("predict_multiclass", 0.0) + time.perf_counter() - start
+        attack_type[flagged] = [str(label) for label in labels]
+        attack_probability[flagged] = probabilities.tolist()
+
+    return proba, attack_type, attack_probability
+
+
+def _predict_cached(artifacts, X, timings):
+    """
+    `_predict` limité aux lignes distinctes absentes du cache : en cas d'inondation (milliers de lignes
+    identiques), le coût d'inférence suit le nombre de vecteurs distincts, pas le nombre de lignes.
+    """
+    cache = artifacts.prediction_cache
+    start = time.perf_counter()
+    first, inverse = unique_rows(X)
+    unique = X if len(first) == len(X) else X[first]
+    keys = row_keys(unique)
+    cached = cache.get_many(keys)
+    hits = [i for i, value in enumerate(cached) if value is not None]
+
+    proba = np.empty(len(unique))
+    attack_type = np.full(len(unique), None, dtype=object)
+    attack_probability = np.full(len(unique), None, dtype=object)
+    if hits:
+        proba[hits], attack_type[hits], attack_probability[hits] = zip(*(cached[i] for i in hits))
+    found = np.zeros(len(unique), dtype=bool)
+    found[hits] = True
+    missing = np.flatnonzero(~found)
+    if timings is not None:
+        timings["cache"] = timings.get("cache", 0.0) + time.perf_counter() - start
+
+    if len(missing):
+        computed = _predict(artifacts, unique[missing], timings)
+        proba[missing], attack_type[missing], attack_probability[missing] = computed
+        cache.put_many([keys[i] for i in missing], list(zip(*(values.tolist() for values in computed))))
+
+    cache.count(model=len(missing), batch=len(X) - len(unique), cache=len(unique) - len(missing))
+    if unique is X:
+        return proba, attack_type, attack_probability
+    return proba[inverse], attack_type[inverse], attack_probability[inverse]
+
+
+# Tâches des processus du pool d'ingestion (cf. `IngestionEngine`)
+
+def init_worker():
+    """
+    Charge le modèle une fois par processus : chaque worker garde sa propre copie en mémoire.
+    """
+    registry.get()
+
+
+def _tick(timings, stage, start):
+    # Cumule la durée d'une étape dans `timings` et retourne l'instant courant
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+
+def file_format(file_path):
+    return INPUT_FORMATS.get(os.path.splitext(file_path)[1].lower(), "csv")
+
+
+def read_file(file_path):
+    """
+    Lit un fichier brut (chemin ou flux d'octets) et vérifie son nombre de colonnes.
+    """
+    df_raw = pd.read_csv(file_path, delimiter=",", header=None)
+
+    if df_raw.shape[1] != EXPECTED_RAW_COLUMNS:
+        raise ValueError(f"{df_raw.shape[1]} colonnes trouvées, {EXPECTED_RAW_COLUMNS} attendues")
+
+    return df_raw
+
+
+def _read_ipc(source):
+    # Format fichier Arrow IPC (Feather v2), ou à défaut format flux
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def _ipc_batches(source):
+    # RecordBatch d'un fichier Arrow IPC un par un (format fichier, ou à défaut format flux)
+    try:
+        reader = pa.ipc.open_file(source)
+        return (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return iter(pa.ipc.open_stream(source))
+
+
+def _read_ipc_rows(source, start, stop):
+    """
+    Lignes [start, stop[ d'un fichier Arrow IPC : seuls les RecordBatch concernés sont lus.
+    """
+    selected, end = [], 0
+    for batch in _ipc_batches(source):
+        begin, end = end, end + batch.num_rows
+        if begin < stop and end > start:
+            selected.append(batch.slice(max(start - begin, 0), min(end, stop) - max(begin, start)))
+        if end >= stop:
+            break
+    return pa.Table.from_batches(selected)
+
+
+def _row_groups(parquet):
+    # Nombre de lignes de chaque groupe de lignes d'un fichier Parquet (métadonnées seules)
+    return [parquet.metadata.row_group(i).num_rows for i in range(parquet.metadata.num_row_groups)]
 
-    model = joblib.load('model.pkl')
-    # Effectuer les prédictions en une seule fois (plus rapide)
-    proba = model.predict_proba(df_encoded)[:, 1]  # Probabilité d'appartenir à la classe 1
-    predicted_class = (proba >= 0.5).astype(int)  # Seuil à 0.5 pour classification
-    # Ajouter les résultats au DataFrame
-    df_encoded['Predicted_Class'] = predicted_class
-    df_encoded['Prediction_Probability'] = proba
 
+def _read_parquet_rows(file_path, start, stop):
+    """
+    Lignes [start, stop[ d'un fichier Parquet : seuls les groupes de lignes concernés sont décodés.
+    """
+    parquet = pa_parquet.ParquetFile(file_path, memory_map=True)
+    groups, first, end = [], None, 0
+    for i, num_rows in enumerate(_row_groups(parquet)):
+        begin, end = end, end + num_rows
+        if begin < stop and end > start:
+            groups.append(i)
+            first = begin if first is None else first
+    return parquet.read_row_groups(groups).slice(start - first, stop - start)
+
+
+def row_chunks(file_path, chunk_bytes, start=0):
+    """
+    Découpe un fichier binaire volumineux (Arrow IPC, Parquet, .npy) en plages de lignes [début, fin[
+    d'environ `chunk_bytes` octets sur disque, à partir de la ligne `start` (reprise) :
+    - Arrow IPC et Parquet : plages alignées sur les RecordBatch / groupes de lignes, jamais coupés ;
+    - .npy : tranches de lignes de la matrice projetée en mémoire.
+    Seules les métadonnées sont lues : les lignes le sont par les processus du pool (cf. `score_rows`).
+    """
+    fmt = file_format(file_path)
+    if fmt == "npy":
+        shape = np.load(file_path, mmap_mode="r").shape
+        if len(shape) != 2:
+            raise ValueError(f"Matrice de forme {shape}, 2 dimensions attendues")
+        sizes = None
+        total = shape[0]
+    elif pa is None:
+        raise ValueError(f"Format {fmt} illisible : pyarrow n'est pas installé")
+    elif fmt == "parquet":
+        sizes = _row_groups(pa_parquet.ParquetFile(file_path, memory_map=True))
+        total = sum(sizes)
+    else:
+        with pa.memory_map(file_path) as source:
+            sizes = [batch.num_rows for batch in _ipc_batches(source)]
+        total = sum(sizes)
+
+    rows_per_chunk = max(1, chunk_bytes * total // max(1, os.path.getsize(file_path)))
+    if sizes is None:
+        return [(begin, min(begin + rows_per_chunk, total)) for begin in range(start, total, rows_per_chunk)]
+
+    chunks, begin, end = [], start, 0
+    for num_rows in sizes:
+        end += num_rows
+        if end > begin and (end - begin >= rows_per_chunk or end == total):
+            chunks.append((begin, end))
+            begin = end
+    return chunks
+
+
+def load_file(file_path, artifacts, timings, rows=None):
+    """
+    Lit et encode un fichier du dossier surveillé selon son extension, avec l'encodeur de `artifacts`.
+    Retourne (X float32, variables numériques float64) ; `timings` cumule les étapes "parse" et "encode".
+    `rows` : plage (début, fin) de lignes à lire d'un fichier binaire découpé (cf. `row_chunks`), tout le fichier sinon.
+
+    - CSV (par défaut) : `pd.read_csv` puis encodeur ;
+    - Arrow IPC (.arrow, .feather, .ipc) : fichier projeté en mémoire, colonnes lues directement
+      dans ses tampons, sans analyse de texte ni DataFrame intermédiaire ;
+    - Parquet : colonnes décodées par pyarrow (pas de texte non plus), puis même encodage qu'Arrow ;
+    - .npy : matrice déjà encodée (colonnes du modèle, cf. `FeatureEncoder.from_matrix`),
+      projetée en mémoire et passée telle quelle au modèle si elle est en float32.
+    """
+    encoder = artifacts.encoder
+    fmt = file_format(file_path)
+    start = time.perf_counter()
+
+    if fmt == "npy":
+        matrix = np.load(file_path, mmap_mode="r")
+        if rows is not None:
+            matrix = matrix[rows[0]:rows[1]]
+        start = _tick(timings, "parse", start)
+        X, numeric = encoder.from_matrix(matrix)
+    elif fmt in ("arrow", "parquet"):
+        if pa is None:
+            raise ValueError(f"Format {fmt} illisible : pyarrow n'est pas installé")
+        if fmt == "parquet":
+            if rows is None:
+                table = pa_parquet.read_table(file_path, memory_map=True)
+            else:
+                table = _read_parquet_rows(file_path, *rows)
+            start = _tick(timings, "parse", start)
+            X, numeric = encoder.encode_arrow(table)
+        else:
+            with pa.memory_map(file_path) as source:
+                table = _read_ipc(source) if rows is None else _read_ipc_rows(source, *rows)
+                start = _tick(timings, "parse", start)
+                X, numeric = encoder.encode_arrow(table)  # Avant la fermeture de la projection
+    else:
+        df_raw = read_file(file_path)
+        start = _tick(timings, "parse", start)
+        numeric = encoder.numeric_values(df_raw)
+        X = encoder.encode(df_raw, numeric)
+
+    _tick(timings, "encode", start)
+    return X, numeric
+
+
+def _score(artifacts, parts, timestamps, timings):
+    """
+    Score plusieurs fichiers encodés (`load_file`) en un seul appel à `predict_proba`.
+    `timings` cumule la durée des étapes "predict" et "serialize".
+    """
+    if len(parts) == 1:
+        X, numeric = parts[0]
+    else:
+        X = np.concatenate([X for X, _ in parts])
+        numeric = np.concatenate([numeric for _, numeric in parts])
+    df_processed = score_features(artifacts, X, numeric, timings)
+
+    if df_processed.shape[1] != 121:
+        raise ValueError(f"{df_processed.shape[1]} colonnes trouvées après preprocessing, 121 attendues")
+
+    # Ajouter le timestamp d'arrivée de chaque fichier en première position
+    # (provisoire : l'écrivain le remplace par l'instant du commit, cf. `SQLiteWriter._stamp`)
+    start = time.perf_counter()
+    df_processed.insert(0, "timestamp", [ts for (X, _), ts in zip(parts, timestamps) for _ in range(len(X))])
+    scored = scored_rows(artifacts, df_processed)
+    _tick(timings, "serialize", start)
+    return scored
+
+
+def scored_rows(artifacts, df_processed):
+    """
+    Convertit un DataFrame scoré (timestamp en première colonne) en (colonnes, lignes, agrégats) pour l'écrivain.
+    Agrégats par minute et repli compact sont calculés ici, côté scoring, pour décharger l'écrivain.
+    `artifacts` : instantané qui a scoré les lignes (colonnes de référence du repli compact).
+    """
+    rollups = rollup_rows(df_processed)
+    if STORAGE_MODE == "compact":
+        df_processed = compact_frame(df_processed, artifacts.reference_columns_post_processing)
 
-    print(f"✅ Colonnes après correction : {df_encoded.shape[1]} colonnes (Attendu : {len(reference_columns_post_processing)})")
+    return list(df_processed.columns), df_processed.values.tolist(), rollups
 
-    return df_encoded
\ No newline at end of file
+
+def score_files(files):
+    """
+    Tâche exécutée dans un processus du pool : lecture, prétraitement et prédiction d'un groupe de fichiers.
+    `files` est une liste de tuples (chemin, timestamp d'arrivée).
+    Retourne les colonnes et les lignes prêtes à insérer, leurs agrégats par minute,
+    les fichiers acceptés, les fichiers rejetés (avec la raison), la durée de chaque étape ("timings")
+    et l'origine des prédictions ("prediction_cache", cf. `PredictionCache.drain_counts`).
+    """
+    # Un seul instantané d'artefacts pour tout le groupe : encodage et modèle toujours cohérents
+    artifacts = registry.get()
+    result = _score_group(artifacts, files)
+    result["prediction_cache"] = _drain_prediction_cache(artifacts)
+    return result
+
+
+def _drain_prediction_cache(artifacts):
+    # Compteurs du cache de ce processus, remontés au processus principal avec le résultat
+    return artifacts.prediction_cache.drain_counts() if artifacts.prediction_cache is not None else {}
+
+
+def _score_group(artifacts, files):
+    parts, accepted, rejected, timings = [], [], [], {}
+    for file_path, timestamp in files:
+        try:
+            parts.append(load_file(file_path, artifacts, timings))
+            accepted.append((file_path, timestamp))
+        except Exception as e:
+            rejected.append((file_path, str(e)))
+
+    if not parts:
+        return {"columns": None, "rows": [], "rollups": [], "files": [], "rejected": rejected, "timings": timings}
+
+    try:
+        columns, rows, rollups = _score(artifacts, parts, [ts for _, ts in accepted], timings)
+        return {"columns": columns, "rows": rows, "rollups": rollups,
+                "files": [path for path, _ in accepted], "rejected": rejected, "timings": timings}
+    except Exception as e:
+        if len(parts) == 1:
+            rejected.append((accepted[0][0], str(e)))
+            return {"columns": None, "rows": [], "rollups": [], "files": [], "rejected": rejected, "timings": timings}
+
+    # Échec du groupe : nouvel essai fichier par fichier pour isoler le fichier fautif
+    columns, rows, rollups, files = None, [], [], []
+    for part, (file_path, timestamp) in zip(parts, accepted):
+        try:
+            columns, file_rows, file_rollups = _score(artifacts, [part], [timestamp], timings)
+            rows.extend(file_rows)
+            rollups.extend(file_rollups)
+            files.append(file_path)
+        except Exception as e:
+            rejected.append((file_path, str(e)))
+    return {"columns": columns, "rows": rows, "rollups": rollups, "files": files, "rejected": rejected,
+            "timings": timings}
+
+
+def _score_part(load, timestamp):
+    """
+    Score un morceau de fichier volumineux lu par `load(artifacts, timings)`.
+    Un morceau invalide rejette le fichier entier (`rejected` contient alors l'erreur).
+    """
+    artifacts = registry.get()
+    try:
+        timings = {}
+        part = load(artifacts, timings)
+        columns, rows, rollups = _score(artifacts, [part], [timestamp], timings)
+        return {"columns": columns, "rows": rows, "rollups": rollups, "files": [], "rejected": [], "timings": timings,
+                "prediction_cache": _drain_prediction_cache(artifacts)}
+    except Exception as e:
+        return {"columns": None, "rows": [], "rollups": [], "files": [], "rejected": [(None, str(e))]}
+
+
+def _load_csv_chunk(data, artifacts, timings):
+    start = time.perf_counter()
+    df_raw = read_file(io.BytesIO(data))
+    start = _tick(timings, "parse", start)
+    numeric = artifacts.encoder.numeric_values(df_raw)
+    X = artifacts.encoder.encode(df_raw, numeric)
+    _tick(timings, "encode", start)
+    return X, numeric
+
+
+def score_chunk(data, timestamp):
+    """
+    Tâche exécutée dans un processus du pool : un morceau de fichier CSV volumineux (octets de lignes complètes).
+    """
+    return _score_part(lambda artifacts, timings: _load_csv_chunk(data, artifacts, timings), timestamp)
+
+
+def score_rows(file_path, start, stop, timestamp):
+    """
+    Tâche exécutée dans un processus du pool : lignes [start, stop[ d'un fichier binaire volumineux
+    (cf. `row_chunks`), lues directement dans le fichier.
+    """
+    return _score_part(lambda artifacts, timings: load_file(file_path, artifacts, timings, rows=(start, stop)),
+                       timestamp)
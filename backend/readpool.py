@@ -0,0 +1,114 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db import connect_readonly
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# Nombre de connexions de lecture (= threads d'exécution des requêtes SQL de l'API)
+READ_POOL_SIZE = int(os.environ.get("READ_POOL_SIZE", "4"))
+# Durée maximale d'une lecture, attente d'une connexion comprise (au-delà : requête SQL interrompue, 504)
+READ_TIMEOUT_SECONDS = float(os.environ.get("READ_TIMEOUT_SECONDS", "5"))
+# Contrôle d'admission : nombre maximal de lectures en cours ou en attente (au-delà : 503 immédiat)
+READ_MAX_PENDING = int(os.environ.get("READ_MAX_PENDING", "32"))
+
+
+class ReadOverloaded(Exception):
+    """Trop de lectures en attente : la requête est refusée sans être mise en file."""
+
+
+class ReadTimeout(Exception):
+    """La lecture a dépassé READ_TIMEOUT_SECONDS et a été interrompue."""
+
+
+# ------------------------ 2️⃣ 🏊 POOL DE CONNEXIONS EN LECTURE SEULE ------------------------
+
+class _ReadTask:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conn = None
+        self.cancelled = False
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.conn is not None:
+                self.conn.interrupt()  # Arrête la requête SQL en cours (thread-safe)
+
+
+class ReadPool:
+    """
+    Exécute les lectures de l'API sur un jeu de connexions SQLite longue durée, en lecture seule.
+
+    - Un thread par connexion (exécuteur borné à `size`) : le nombre de requêtes SQL simultanées est fixe,
+      quel que soit le nombre de clients, et les connexions gardent leur cache de pages d'une requête à l'autre.
+    - `run` est une coroutine : les handlers `async def` attendent le résultat sans occuper de thread.
+    - Admission : au-delà de `max_pending` lectures en cours ou en attente, `ReadOverloaded` est levée
+      immédiatement (503) au lieu d'empiler les requêtes.
+    - Délai : après `timeout` secondes, la requête SQL est interrompue (`Connection.interrupt`)
+      ou retirée de la file si elle n'a pas démarré, et `ReadTimeout` est levée (504).
+    - Connexions ouvertes à la demande : la base peut ne pas encore exister au démarrage du serveur.
+    """
+
+    def __init__(self, db_path, size=READ_POOL_SIZE, timeout=READ_TIMEOUT_SECONDS, max_pending=READ_MAX_PENDING):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._connections = queue.LifoQueue()  # La connexion la plus récemment utilisée a le cache le plus chaud
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="read")
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _call(self, task, fn, args):
+        # Exécuté dans un thread de l'exécuteur : au plus `size` appels simultanés, donc au plus `size` connexions
+        with task.lock:
+            if task.cancelled:
+                return None  # Délai expiré pendant l'attente dans la file
+            try:
+                conn = self._connections.get_nowait()
+            except queue.Empty:
+                conn = connect_readonly(self.db_path, check_same_thread=False)
+            task.conn = conn
+
+        healthy = True
+        try:
+            return fn(conn, *args)
+        except sqlite3.DatabaseError as e:
+            healthy = isinstance(e, sqlite3.OperationalError)  # Interruption, verrou... : connexion réutilisable
+            raise
+        finally:
+            with task.lock:
+                task.conn = None
+            if healthy:
+                self._connections.put(conn)
+            else:
+                conn.close()
+
+    async def run(self, fn, *args):
+        """
+        Exécute `fn(conn, *args)` sur une connexion du pool et retourne son résultat.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ReadOverloaded(f"{self._pending} lectures déjà en attente")
+            self._pending += 1
+
+        task = _ReadTask()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, self._call, task, fn, args)
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            raise ReadTimeout(f"Lecture interrompue après {self.timeout:g} s")
+        finally:
+            with self._lock:
+                self._pending -= 1
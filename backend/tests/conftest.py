@@ -0,0 +1,122 @@
+import os
+import sys
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import ingestion  # noqa: E402
+import online  # noqa: E402
+import process  # noqa: E402
+from artifacts import Artifacts, ArtifactRegistry  # noqa: E402
+from db import compact_frame, rollup_rows  # noqa: E402
+from encoder import FeatureEncoder  # noqa: E402
+from generate_fake_data import NORMAL_LABEL, generate  # noqa: E402
+from process import score_features  # noqa: E402
+
+# Quelques attaques pondérées : forêt multi-classe à 5 classes, entraînée en une fraction de seconde
+ATTACKS = {"smurf.": 4, "neptune.": 3, "back.": 1, "satan.": 1}
+
+
+# ------------------------ 1️⃣ 📦 ARTEFACTS DE TEST ------------------------
+
+@pytest.fixture(scope="session")
+def reference_columns():
+    return (list(joblib.load(os.path.join(BACKEND_DIR, "reference_columns.pkl"))),
+            list(joblib.load(os.path.join(BACKEND_DIR, "reference_columns_post_processing.pkl"))))
+
+
+@pytest.fixture(scope="session")
+def encoder(reference_columns):
+    return FeatureEncoder(*reference_columns)
+
+
+@pytest.fixture(scope="session")
+def raw_batch():
+    return generate(3000, rng=0, attack_ratio=0.5, attacks=ATTACKS)
+
+
+@pytest.fixture(scope="session")
+def encoded(encoder, raw_batch):
+    """
+    (X float32, variables numériques float64) du lot de test.
+    """
+    numeric = encoder.numeric_values(raw_batch)
+    return encoder.encode(raw_batch, numeric), numeric
+
+
+@pytest.fixture(scope="session")
+def binary_model(encoder, encoded, raw_batch):
+    model = RandomForestClassifier(n_estimators=15, max_depth=10, random_state=0)
+    model.fit(encoder.model_input(encoded[0]), (raw_batch["label"] != NORMAL_LABEL).astype(int))
+    return model
+
+
+@pytest.fixture(scope="session")
+def multiclass_model(encoder, encoded, raw_batch):
+    model = RandomForestClassifier(n_estimators=15, max_depth=10, random_state=0)
+    model.fit(encoder.model_input(encoded[0]), raw_batch["label"].astype(str))
+    return model
+
+
+@pytest.fixture
+def make_artifacts(reference_columns, binary_model):
+    """
+    Fabrique d'instantanés d'artefacts (modèle binaire de test, modèle multi-classe optionnel).
+    """
+    def make(multiclass_model=None, model=binary_model, version=1):
+        return Artifacts(model, *reference_columns, version=version, hashes={}, multiclass_model=multiclass_model)
+    return make
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path, reference_columns, binary_model):
+    """
+    Registre d'artefacts sur des fichiers temporaires (vérifiés à chaque appel),
+    à la place du registre partagé dans les modules qui scorent.
+    """
+    paths = {name: str(tmp_path / f"{name}.pkl") for name in ("model", "columns", "post")}
+    joblib.dump(binary_model, paths["model"])
+    joblib.dump(reference_columns[0], paths["columns"])
+    joblib.dump(reference_columns[1], paths["post"])
+    registry = ArtifactRegistry(paths["model"], paths["columns"], paths["post"], check_interval=0)
+    registry.get()
+    for module in (process, online, ingestion):
+        monkeypatch.setattr(module, "registry", registry)
+    return registry
+
+
+@pytest.fixture
+def nan_rows(encoded):
+    """
+    Copie de X avec des valeurs manquantes (chemin `missing_go_to_left`).
+    """
+    X = encoded[0][:200].copy()
+    X[::7, 1] = np.nan
+    X[3::11, 0] = np.nan
+    return X
+
+
+# ------------------------ 2️⃣ 🗄️ LOTS POUR L'ÉCRIVAIN ------------------------
+
+@pytest.fixture
+def scored_batch(make_artifacts, encoded, reference_columns):
+    """
+    Fabrique de lots prêts pour `SQLiteWriter.insert_rows` : (colonnes, lignes, agrégats) de `rows` lignes
+    du lot de test à partir de `offset`, au format de stockage demandé.
+    """
+    artifacts = make_artifacts()
+
+    def make(rows, offset=0, timestamp="2026-01-01T00:00:00", storage_mode="wide"):
+        X, numeric = encoded[0][offset:offset + rows], encoded[1][offset:offset + rows]
+        df = score_features(artifacts, X, numeric)
+        df.insert(0, "timestamp", timestamp)
+        rollups = rollup_rows(df)
+        if storage_mode == "compact":
+            df = compact_frame(df, reference_columns[1])
+        return list(df.columns), df.values.tolist(), rollups
+    return make
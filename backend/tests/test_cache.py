@@ -0,0 +1,173 @@
+import asyncio
+
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+import cache
+import process
+from cache import IngestGeneration, PredictionCache, ResponseCache, row_keys, unique_rows
+from process import score_features
+
+
+def _flood(X, repeats=20):
+    """
+    Lot d'inondation : quelques lignes distinctes répétées et mélangées.
+    """
+    rows = np.repeat(X[:50], repeats, axis=0)
+    return rows[np.random.default_rng(0).permutation(len(rows))]
+
+
+# ------------------------ 1️⃣ 🧮 LIGNES DISTINCTES ------------------------
+
+def test_unique_rows_is_exact(encoded):
+    X = _flood(encoded[0])
+    X[::97, 2] = np.nan
+    X[5, 0] = -0.0 if X[5, 0] == 0 else np.nextafter(X[5, 0], np.float32(np.inf))  # Un seul bit diffère
+    first, inverse = unique_rows(X)
+    assert np.array_equal(X[first][inverse].view(np.uint32), X.view(np.uint32))
+    assert len(first) == len(set(row_keys(X)))
+
+
+def test_unique_rows_digest_collision_falls_back_to_exact_sort(monkeypatch, encoded):
+    X = _flood(encoded[0], repeats=3)
+    # Projections nulles : toutes les lignes ont la même empreinte
+    monkeypatch.setattr(cache, "_ROW_PROJECTIONS", {(X.shape[1], X.dtype): np.zeros((X.shape[1], 2), X.dtype)})
+    first, inverse = unique_rows(X)
+    assert len(first) == 50 and np.array_equal(X[first][inverse], X)
+
+
+def test_unique_rows_all_distinct(encoded):
+    first, inverse = unique_rows(encoded[0][:100])
+    assert np.array_equal(first, np.arange(100)) and np.array_equal(inverse, np.arange(100))
+
+
+# ------------------------ 2️⃣ 🎯 PRÉDICTIONS EN CACHE ------------------------
+
+@pytest.mark.parametrize("cascade", [False, True])
+def test_cached_scoring_matches_sklearn(make_artifacts, encoder, encoded, binary_model, multiclass_model, cascade):
+    artifacts = make_artifacts(multiclass_model if cascade else None)
+    X = _flood(encoded[0])
+    numeric = np.repeat(encoded[1][:50], 20, axis=0)[np.random.default_rng(0).permutation(len(X))]
+    reference = binary_model.predict_proba(encoder.model_input(X))[:, 1]
+
+    for expected_counts in ({"model": 50, "batch": 950, "cache": 0}, {"model": 0, "batch": 950, "cache": 50}):
+        df = score_features(artifacts, X, numeric)
+        assert np.array_equal(df["Prediction_Probability"].to_numpy(), reference)
+        assert artifacts.prediction_cache.drain_counts() == expected_counts
+
+    if cascade:
+        multiclass = multiclass_model.predict_proba(encoder.model_input(X))
+        flagged = reference >= process.CASCADE_THRESHOLD
+        assert df["Attack_Type"][flagged].tolist() == multiclass_model.classes_[multiclass.argmax(axis=1)][flagged].tolist()
+        assert df["Attack_Probability"][flagged].tolist() == multiclass.max(axis=1)[flagged].tolist()
+        assert df["Attack_Type"][~flagged].isna().all()
+    else:
+        assert df["Attack_Type"].isna().all()
+
+
+def test_partial_hits_with_small_cache(make_artifacts, encoder, encoded, binary_model):
+    artifacts = make_artifacts()
+    artifacts.prediction_cache = PredictionCache(max_entries=100)
+    X, numeric = encoded[0][:300], encoded[1][:300]
+    score_features(artifacts, X[:150], numeric[:150])
+    df = score_features(artifacts, X, numeric)
+    assert np.array_equal(df["Prediction_Probability"].to_numpy(),
+                          binary_model.predict_proba(encoder.model_input(X))[:, 1])
+    assert artifacts.prediction_cache.drain_counts() == {"model": 150 + 200, "batch": 0, "cache": 100}
+    assert len(artifacts.prediction_cache) == 100
+
+
+def test_lru_eviction():
+    lru = PredictionCache(max_entries=2)
+    lru.put_many([b"a", b"b"], [1, 2])
+    assert lru.get_many([b"a", b"z"]) == [1, None]  # "a" devient la plus récente
+    lru.put_many([b"c"], [3])
+    assert lru.get_many([b"a", b"b", b"c"]) == [1, None, 3]
+    lru.put_many([b"d", b"e", b"f"], [4, 5, 6])
+    assert len(lru) == 2 and lru.get_many([b"e", b"f"]) == [5, 6]
+
+
+# ------------------------ 3️⃣ 🏷️ ETAG ET 304 ------------------------
+
+def _request(query=b"", etag=None, path="/get_data"):
+    headers = [(b"if-none-match", etag.encode("latin-1"))] if etag else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": headers})
+
+
+def test_etag_and_not_modified():
+    responses = ResponseCache(IngestGeneration())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [{"id": 1, "anomaly_score": 0.5}]
+
+    first = responses.respond(_request(b"limit=5&protocol=tcp"), compute)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.body == b'[{"id":1,"anomaly_score":0.5}]'
+    assert first.headers["cache-control"] == "no-cache"
+
+    # Mêmes paramètres dans un autre ordre : même entrée, 304 sans corps ni nouveau calcul
+    revalidated = responses.respond(_request(b"protocol=tcp&limit=5", etag=f'W/"x", {etag}'), compute)
+    assert revalidated.status_code == 304 and revalidated.body == b"" and revalidated.headers["etag"] == etag
+    assert len(calls) == 1
+    assert responses.respond(_request(b"limit=5&protocol=tcp", etag='"autre"'), compute).status_code == 200
+
+
+def test_commit_invalidates_entry_and_etag_follows_content():
+    generation = IngestGeneration()
+    responses = ResponseCache(generation)
+    rows = [{"id": 1}]
+    etag = responses.respond(_request(), lambda: rows).headers["etag"]
+
+    generation.bump()  # Commit sans changement du résultat : recalcul, même ETag, toujours 304
+    assert responses.respond(_request(etag=etag), lambda: rows).status_code == 304
+    generation.bump()
+    changed = responses.respond(_request(etag=etag), lambda: rows + [{"id": 2}])
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+def test_commit_during_compute_leaves_entry_stale():
+    generation = IngestGeneration()
+    responses = ResponseCache(generation)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        generation.bump()  # Commit pendant le calcul : le résultat peut déjà être périmé
+        return {"rows": len(calls)}
+
+    responses.respond(_request(), compute)
+    assert responses.respond(_request(), compute).body == b'{"rows":2}' and len(calls) == 2
+
+
+def test_variants_and_errors_are_not_shared():
+    responses = ResponseCache(IngestGeneration(), max_entries=4)
+    json_body = responses.respond(_request(), lambda: {"format": "records"}, variant="records")
+    columns = responses.respond(_request(), lambda: b'{"format":"columns"}', variant="columns")
+    assert json_body.headers["etag"] != columns.headers["etag"] and columns.body == b'{"format":"columns"}'
+
+    def failing():
+        raise RuntimeError("lecture impossible")
+
+    with pytest.raises(RuntimeError):
+        responses.respond(_request(path="/stats"), failing)
+    assert responses.get(("/stats", (), None)) is None
+
+
+def test_respond_async_computes_once():
+    responses = ResponseCache(IngestGeneration())
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"ok": True}
+
+    async def scenario():
+        first = await responses.respond_async(_request(), compute)
+        second = await responses.respond_async(_request(etag=first.headers["etag"]), compute)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert (first.status_code, second.status_code) == (200, 304) and len(calls) == 1
@@ -0,0 +1,311 @@
+import sqlite3
+
+import pytest
+
+from db import (PROTOCOLS, SCORE_BUCKETS, SQLiteWriter, connections_query, init_db, init_rollups, list_partitions,
+                stats_query, timeseries_query)
+
+
+@pytest.fixture
+def database(tmp_path, reference_columns):
+    """
+    Fabrique (chemin, écrivain) d'une base initialisée au mode de stockage et de partitionnement demandés.
+    """
+    writers = []
+
+    def make(storage_mode="wide", partition_by="none"):
+        path = str(tmp_path / f"{storage_mode}_{partition_by}.sqlite")
+        init_db(path, reference_columns[1], storage_mode=storage_mode, partition_by=partition_by)
+        writers.append(SQLiteWriter(path, storage_mode=storage_mode, partition_by=partition_by))
+        return path, writers[-1]
+
+    yield make
+    for writer in writers:
+        writer.close()
+
+
+def _query(path, partition_by, storage_mode, **filters):
+    conn = sqlite3.connect(path)
+    try:
+        query, params = connections_query(limit=10000, max_limit=10000, storage_mode=storage_mode,
+                                          partitions=list_partitions(conn, partition_by), **filters)
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _ids_and_stamps(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT id, timestamp FROM connections").fetchall()
+    finally:
+        conn.close()
+
+
+# ------------------------ 1️⃣ 🕒 HORODATAGE AU COMMIT ------------------------
+
+@pytest.mark.parametrize("storage_mode, partition_by", [("wide", "none"), ("compact", "day")])
+def test_rows_are_stamped_at_commit_time(database, scored_batch, storage_mode, partition_by):
+    path, writer = database(storage_mode, partition_by)
+    # Timestamps amont dans le désordre (fichier volumineux découpé après des petits fichiers plus récents)
+    for offset, timestamp in [(0, "2030-01-01T00:00:00"), (40, "2000-01-01T00:00:00"), (80, "2015-06-01T12:00:00")]:
+        columns, rows, rollups = scored_batch(40, offset, timestamp, storage_mode)
+        writer.insert_rows(rows, columns, rollups)
+
+    conn = sqlite3.connect(path)
+    stamps = [ts for ts, in conn.execute("SELECT timestamp FROM connections ORDER BY id")]
+    assert len(stamps) == 120 and stamps == sorted(stamps) and len(set(stamps)) == 3
+    assert stamps[0] > "2026"
+    # Agrégats par minute cohérents avec les lignes horodatées
+    by_minute = dict(conn.execute("SELECT substr(timestamp, 1, 16), COUNT(*) FROM connections GROUP BY 1"))
+    assert dict(conn.execute("SELECT minute, SUM(count) FROM rollup_minute GROUP BY minute")) == by_minute
+    conn.close()
+
+
+def test_unstamped_rows_keep_their_timestamps(database, scored_batch):
+    path, writer = database("wide", "none")
+    # Historique chargé avec ses propres timestamps (benchmarks), puis un commit horodaté normalement
+    for offset, timestamp in [(0, "2030-01-01T00:00:00"), (40, "2030-01-01T00:05:00")]:
+        columns, rows, rollups = scored_batch(40, offset, timestamp)
+        writer.insert_rows(rows, columns, rollups, stamp=False)
+    columns, rows, rollups = scored_batch(40, 80)
+    writer.insert_rows(rows, columns, rollups)
+
+    conn = sqlite3.connect(path)
+    stamps = [ts for ts, in conn.execute("SELECT timestamp FROM connections ORDER BY id")]
+    assert stamps[:80] == ["2030-01-01T00:00:00"] * 40 + ["2030-01-01T00:05:00"] * 40
+    # Horloge en retard sur l'historique : le commit suivant est horodaté à sa dernière ligne, pas avant
+    assert stamps[80:] == ["2030-01-01T00:05:00"] * 40
+    minutes = dict(conn.execute("SELECT minute, SUM(count) FROM rollup_minute GROUP BY minute"))
+    assert minutes == {"2030-01-01T00:00": 40, "2030-01-01T00:05": 80}
+    conn.close()
+
+
+@pytest.mark.parametrize("storage_mode, partition_by", [("wide", "none"), ("compact", "day")])
+def test_time_window_returns_exactly_the_rows_inside(database, scored_batch, storage_mode, partition_by):
+    path, writer = database(storage_mode, partition_by)
+    for offset in range(0, 200, 40):
+        columns, rows, rollups = scored_batch(40, offset, "2000-01-01T00:00:00", storage_mode)
+        writer.insert_rows(rows, columns, rollups)
+
+    conn = sqlite3.connect(path)
+    stamps = [ts for ts, in conn.execute("SELECT DISTINCT timestamp FROM connections ORDER BY timestamp")]
+    conn.close()
+    start, end = stamps[1], stamps[3]
+    expected = sorted(row_id for row_id, ts in _ids_and_stamps(path) if start <= ts < end)
+    rows = _query(path, partition_by, storage_mode, start=start, end=end)
+    assert sorted(row[0] for row in rows) == expected and len(expected) == 80
+
+
+def test_timeseries_window_uses_commit_order(database, scored_batch):
+    path, writer = database()
+    for offset, timestamp in [(0, "2030-01-01T00:00:00"), (100, "2000-01-01T00:00:00")]:
+        columns, rows, rollups = scored_batch(100, offset, timestamp)
+        writer.insert_rows(rows, columns, rollups)
+
+    conn = sqlite3.connect(path)
+    first, second = [ts for ts, in conn.execute("SELECT DISTINCT timestamp FROM connections ORDER BY timestamp")]
+    df = timeseries_query(conn, start=second, points=20)
+    conn.close()
+    assert len(df) and (df["timestamp"] >= second).all()
+
+
+# ------------------------ 2️⃣ 🗓️ RÉTENTION DES PARTITIONS ------------------------
+
+def test_retention_with_recent_legacy_partition(database, scored_batch, reference_columns):
+    from db import ROLLUP_TABLE, create_partition, drop_expired_partitions, partition_bounds
+
+    # Base non partitionnée dont la table devient la partition legacy : lignes de 2020 et d'aujourd'hui
+    path, writer = database("wide", "none")
+    columns, rows, rollups = scored_batch(40)
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE connections SET timestamp = '2020-05-01T00:00:00' WHERE id <= 20")
+    conn.close()
+    init_db(path, reference_columns[1], storage_mode="wide", partition_by="day")
+
+    # Partition expirée après la legacy (dans l'ordre des id), puis partition du jour
+    conn = sqlite3.connect(path)
+    name, start, end = partition_bounds("2021-01-01", "day", "wide")
+    columns, rows, _ = scored_batch(10, 40, "2021-01-01T10:00:00")
+    with conn:
+        create_partition(conn, name, start, end, "wide")
+        conn.executemany(f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+        conn.executemany(f"INSERT INTO {ROLLUP_TABLE} VALUES (?, 'tcp', 0, 0, 1, 0, 0)",
+                         [("1999-12-31T23:59",), ("2020-05-01T00:00",), ("2021-01-01T10:00",)])
+    conn.close()
+    writer = SQLiteWriter(path, storage_mode="wide", partition_by="day")
+    columns, rows, rollups = scored_batch(10, 50)
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+
+    conn = sqlite3.connect(path)
+    assert drop_expired_partitions(conn, retention_hours=24, storage_mode="wide") == [name]
+    partitions = [row[0] for row in list_partitions(conn, "day")]
+    assert partitions[0] == "connections_legacy" and name not in partitions and len(partitions) == 2
+    # Agrégats conservés à partir de la plus ancienne ligne restante (legacy, 2020), pas du début de la partition supprimée
+    minutes = [minute for minute, in conn.execute(f"SELECT minute FROM {ROLLUP_TABLE} ORDER BY minute")]
+    assert minutes[:2] == ["2020-05-01T00:00", "2021-01-01T10:00"]
+    assert conn.execute("SELECT COUNT(*) FROM connections").fetchone()[0] == 50
+    # Rien d'autre à supprimer : la legacy contient des lignes récentes, la partition du jour porte la séquence
+    assert drop_expired_partitions(conn, retention_hours=24, storage_mode="wide") == []
+    conn.close()
+
+
+def test_retention_drops_expired_legacy_partition(database, scored_batch, reference_columns):
+    from db import drop_expired_partitions
+
+    path, writer = database("wide", "none")
+    columns, rows, rollups = scored_batch(20)
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("UPDATE connections SET timestamp = '2020-05-01T00:00:00'")
+    conn.close()
+    init_db(path, reference_columns[1], storage_mode="wide", partition_by="day")
+    writer = SQLiteWriter(path, storage_mode="wide", partition_by="day")
+    columns, rows, rollups = scored_batch(10, 20)
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+
+    conn = sqlite3.connect(path)
+    assert drop_expired_partitions(conn, retention_hours=24, storage_mode="wide") == ["connections_legacy"]
+    assert conn.execute("SELECT COUNT(*) FROM connections").fetchone()[0] == 10
+    conn.close()
+
+
+# ------------------------ 3️⃣ 🗜️ MIGRATION VERS LE SCHÉMA COMPACT ------------------------
+
+def _snapshot(path):
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.execute("SELECT * FROM connections ORDER BY id")
+        return [description[0] for description in cursor.description], cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def test_compact_migration_round_trip(database, scored_batch, reference_columns):
+    path, writer = database("wide", "none")
+    columns, rows, rollups = scored_batch(60)
+    rows[3][columns.index("src_bytes")] = float("nan")  # NULL en base
+    rows[5][columns.index("Attack_Type")], rows[5][columns.index("Attack_Probability")] = "smurf.", 0.75
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    before = _snapshot(path)
+    page_before = _query(path, "none", "wide", protocol="tcp")
+
+    init_db(path, reference_columns[1], storage_mode="compact", partition_by="none")
+    assert _snapshot(path) == before  # Vue d'expansion : mêmes colonnes, mêmes valeurs, mêmes id
+    assert _query(path, "none", "compact", protocol="tcp") == page_before
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name = 'connections'").fetchone()[0] == "view"
+    conn.close()
+
+    # L'écrivain compact reprend après le dernier id migré
+    writer = SQLiteWriter(path, storage_mode="compact", partition_by="none")
+    columns, rows, rollups = scored_batch(10, 60, storage_mode="compact")
+    last_id = writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    assert last_id == before[1][-1][0] + 10
+    init_db(path, reference_columns[1], storage_mode="compact", partition_by="none")  # Idempotent
+    assert len(_snapshot(path)[1]) == 70
+
+
+def test_compact_migration_of_table_without_cascade_columns(database, scored_batch, reference_columns):
+    path, writer = database("wide", "none")
+    columns, rows, rollups = scored_batch(20)
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("ALTER TABLE connections DROP COLUMN Attack_Type")
+        conn.execute("ALTER TABLE connections DROP COLUMN Attack_Probability")
+    conn.close()
+    names, before = _snapshot(path)
+
+    init_db(path, reference_columns[1], storage_mode="compact", partition_by="none")
+    migrated_names, migrated = _snapshot(path)
+    assert migrated_names == names + ["Attack_Type", "Attack_Probability"]
+    assert [row[:len(names)] for row in migrated] == before
+    assert all(row[len(names):] == (None, None) for row in migrated)
+
+
+# ------------------------ 4️⃣ 📊 AGRÉGATS PAR MINUTE ------------------------
+
+def _stats_from_rows(path, start=None, end=None, protocol="all"):
+    """
+    Statistiques recalculées ligne à ligne sur la table brute, fenêtre alignée sur la minute comme `/stats`.
+    """
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f"""
+        SELECT timestamp, {", ".join(f"protocol_type_{p}" for p in PROTOCOLS)},
+               Predicted_Class, Prediction_Probability, src_bytes, dst_bytes
+        FROM connections
+    """).fetchall()
+    conn.close()
+
+    histogram, by_protocol, by_class, timeline = [0] * SCORE_BUCKETS, {}, {}, {}
+    for timestamp, *flags, predicted, probability, src, dst in rows:
+        name = next((p for p, flag in zip(PROTOCOLS, flags) if flag), "unknown")
+        minute = timestamp[:16]
+        if (start and minute < start[:16]) or (end and minute >= end[:16]) or protocol not in ("all", name):
+            continue
+        histogram[min(int(probability * SCORE_BUCKETS), SCORE_BUCKETS - 1)] += 1
+        by_protocol[name.upper()] = by_protocol.get(name.upper(), 0) + 1
+        by_class[str(predicted)] = by_class.get(str(predicted), 0) + 1
+        count, src_sum, dst_sum = timeline.get((minute, predicted), (0, 0.0, 0.0))
+        timeline[(minute, predicted)] = (count + 1, src_sum + src, dst_sum + dst)
+    return {
+        "total": sum(histogram),
+        "by_protocol": by_protocol,
+        "by_class": by_class,
+        "counts": histogram,
+        "timeline": [
+            {"minute": minute, "predicted_class": c, "count": count, "src_bytes": src, "dst_bytes": dst}
+            for (minute, c), (count, src, dst) in sorted(timeline.items())
+        ],
+    }
+
+
+def _assert_same_timeline(timeline, expected):
+    # Sommes d'octets en flottants : l'ordre d'addition diffère entre agrégats et lignes brutes
+    key = ("minute", "predicted_class", "count")
+    assert [tuple(point[k] for k in key) for point in timeline] == [tuple(point[k] for k in key) for point in expected]
+    for point, reference in zip(timeline, expected):
+        assert (point["src_bytes"], point["dst_bytes"]) == pytest.approx((reference["src_bytes"], reference["dst_bytes"]))
+
+
+@pytest.mark.parametrize("storage_mode", ["wide", "compact"])
+def test_minute_rollups_match_raw_rows(database, scored_batch, storage_mode):
+    path, writer = database(storage_mode, "none")
+    # Lots à cheval sur plusieurs minutes, certaines alimentées par plusieurs commits
+    for offset, timestamp in [(0, "2030-01-01T00:00:10"), (60, "2030-01-01T00:01:59"), (120, "2030-01-01T00:01:00"),
+                              (180, "2030-01-01T00:02:30"), (240, "2030-01-01T00:04:00")]:
+        columns, rows, rollups = scored_batch(60, offset, timestamp, storage_mode)
+        writer.insert_rows(rows, columns, rollups, stamp=False)
+
+    conn = sqlite3.connect(path)
+    windows = [{}, {"start": "2030-01-01T00:01:30", "end": "2030-01-01T00:04:00"}, {"end": "2030-01-01T00:02:00"},
+               {"start": "2030-01-01T00:02:00", "protocol": "tcp"}, {"protocol": "icmp"}]
+    for window in windows:
+        stats, expected = stats_query(conn, **window), _stats_from_rows(path, **window)
+        assert stats["total"] == expected["total"] and stats["score_histogram"]["counts"] == expected["counts"]
+        assert stats["by_protocol"] == expected["by_protocol"] and stats["by_class"] == expected["by_class"]
+        _assert_same_timeline(stats["timeline"], expected["timeline"])
+    assert stats_query(conn)["total"] == 300
+    assert stats_query(conn, start="2030-01-01T00:01:30", end="2030-01-01T00:04:00")["total"] == 180
+
+    # Agrégats reconstruits depuis les lignes stockées (première initialisation) : identiques aux agrégats incrémentaux
+    incremental = stats_query(conn)
+    with conn:
+        conn.execute("DROP TABLE rollup_minute")
+    init_rollups(conn)
+    rebuilt = stats_query(conn)
+    assert {key: value for key, value in rebuilt.items() if key != "timeline"} == \
+        {key: value for key, value in incremental.items() if key != "timeline"}
+    _assert_same_timeline(rebuilt["timeline"], incremental["timeline"])
+    conn.close()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from encoder import CATEGORICAL_COLUMNS, FeatureEncoder
+from generate_fake_data import generate
+
+
+def _get_dummies_reference(df_raw, reference_columns, model_columns, categorical_columns):
+    """
+    Prétraitement historique : noms de colonnes, `get_dummies`, "VRAI"/"FAUX" -> 1/0,
+    puis colonnes du modèle manquantes à 0 et ordre du modèle (`reindex`).
+    """
+    df = df_raw.copy()
+    df.columns = reference_columns[:df.shape[1]]
+    df_encoded = pd.get_dummies(df, columns=list(categorical_columns)).replace({"VRAI": 1, "FAUX": 0})
+    return df_encoded.reindex(columns=model_columns, fill_value=0).to_numpy(dtype=np.float32)
+
+
+@pytest.fixture(scope="module")
+def parity_batch():
+    """
+    Lot généré avec des catégories inconnues du modèle, des booléens textuels
+    et des catégories du modèle absentes du lot (colonnes One-Hot manquantes).
+    """
+    df = generate(2000, rng=7)
+    df = df[~df["service"].isin(["http", "smtp"])].reset_index(drop=True)  # Colonnes service_http, service_smtp absentes
+    df.loc[::17, "protocol_type"] = "sctp"
+    df.loc[5::23, "service"] = "inconnu"
+    df.loc[3::29, "flag"] = "XX"
+    df["logged_in"] = np.where(df["logged_in"].astype(bool), "VRAI", "FAUX")
+    return df
+
+
+@pytest.mark.parametrize("categorical_columns", [CATEGORICAL_COLUMNS, ("protocol_type", "flag")])
+def test_encoder_matches_get_dummies(reference_columns, parity_batch, categorical_columns):
+    raw_columns, model_columns = reference_columns
+    # Ordre des colonnes du modèle mélangé, et une colonne sans équivalent dans le fichier brut
+    model_columns = list(np.random.default_rng(0).permutation(model_columns)) + ["colonne_absente"]
+    encoder = FeatureEncoder(raw_columns, model_columns, categorical_columns)
+
+    raw = parity_batch.copy()
+    raw.columns = range(raw.shape[1])  # Fichier sans en-tête, comme `read_csv(header=None)`
+    X = encoder.encode(raw)
+    expected = _get_dummies_reference(raw, raw_columns, model_columns, categorical_columns)
+
+    assert X.dtype == np.float32 and X.shape == expected.shape
+    assert np.array_equal(X, expected)
+    assert not X[:, model_columns.index("colonne_absente")].any()
+    assert not X[:, model_columns.index("service_http")].any()
+    unseen = (parity_batch["protocol_type"] == "sctp").to_numpy()
+    protocols = [j for j, name in enumerate(model_columns) if name.startswith("protocol_type_")]
+    assert unseen.any() and not X[np.ix_(unseen, protocols)].any()
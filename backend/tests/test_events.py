@@ -0,0 +1,102 @@
+import asyncio
+import json
+import math
+import sqlite3
+
+import pytest
+
+from db import RECORD_COLUMNS, SQLiteWriter, connections_query, dashboard_records, init_db
+from events import EventBroker, TooManySubscribers, _message
+
+
+def _events(chunk):
+    """
+    Événements SSE (nom, données JSON) d'un morceau de flux.
+    """
+    events = []
+    for block in chunk.decode("utf-8").strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+# ------------------------ 1️⃣ 🧾 ENREGISTREMENTS DIFFUSÉS ------------------------
+
+@pytest.mark.parametrize("storage_mode", ["wide", "compact"])
+def test_records_match_get_data(tmp_path, scored_batch, reference_columns, storage_mode):
+    path = str(tmp_path / "db.sqlite")
+    init_db(path, reference_columns[1], storage_mode=storage_mode, partition_by="none")
+    columns, rows, rollups = scored_batch(30, storage_mode=storage_mode)
+    # Valeur manquante dans une variable exposée : NULL en base, null dans les deux réponses
+    rows[4][columns.index("src_bytes")] = float("nan")
+
+    writer = SQLiteWriter(path, storage_mode=storage_mode, partition_by="none")
+    last_id = writer.insert_rows(rows, columns, rollups)
+    writer.close()
+    records = dashboard_records(columns, rows, last_id, reference_columns[1], storage_mode)
+
+    conn = sqlite3.connect(path)
+    query, params = connections_query(limit=100, storage_mode=storage_mode)
+    expected = [dict(zip(RECORD_COLUMNS, row)) for row in conn.execute(query, params)]
+    conn.close()
+    assert records == expected
+    assert list(records[0]) == list(RECORD_COLUMNS)
+    assert records[-5]["source_ip"] is None
+    assert _message(records, None, None)  # Sérialisable (allow_nan=False)
+
+
+def test_non_finite_values_become_null(scored_batch, reference_columns):
+    columns, rows, _ = scored_batch(3)
+    rows[0][columns.index("Prediction_Probability")] = float("nan")
+    rows[1][columns.index("dst_bytes")] = float("inf")
+    records = dashboard_records(columns, rows, 3, reference_columns[1], "wide")
+    assert records[-1]["anomaly_score"] is None and records[-2]["destination_ip"] is None
+    payload = _events(_message(records, None, None))[0][1]
+    assert payload["count"] == 3 and not any(
+        isinstance(value, float) and not math.isfinite(value) for row in payload["rows"] for value in row.values())
+
+
+# ------------------------ 2️⃣ 📡 DIFFUSION ------------------------
+
+def _records(ids, score=0.9):
+    return [{"id": i, "anomaly_score": score} for i in sorted(ids, reverse=True)]
+
+
+def test_message_filters_by_min_score_and_flags_truncation():
+    records = _records([3], 0.2) + _records([2, 1], 0.8)
+    assert _message(records, None, 0.9) is None
+    event, payload = _events(_message(records, 10, 0.5))[0]
+    assert event == "rows" and payload["truncated"] and [row["id"] for row in payload["rows"]] == [2, 1]
+
+
+def test_slow_subscriber_drops_oldest_and_gets_gap_event():
+    async def scenario():
+        broker = EventBroker(max_subscribers=2)
+        subscription = broker.subscribe()
+        subscription._messages = type(subscription._messages)(maxlen=2)
+        for i in range(1, 6):
+            broker.publish(_records([i]))
+
+        stream = broker.stream(subscription, keepalive=0.01)
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        events = _events(await stream.__anext__()) + _events(await stream.__anext__())
+        await stream.aclose()
+        return broker, events
+
+    broker, events = asyncio.run(scenario())
+    assert events[0] == ("gap", {"dropped": 3})
+    assert [payload["rows"][0]["id"] for name, payload in events[1:]] == [4, 5]
+    assert not broker.has_subscribers  # Abonnement retiré à la fermeture du flux
+
+
+def test_subscriber_limit():
+    async def scenario():
+        broker = EventBroker(max_subscribers=1)
+        first = broker.subscribe()
+        with pytest.raises(TooManySubscribers):
+            broker.subscribe()
+        broker.unsubscribe(first)
+        broker.subscribe()
+
+    asyncio.run(scenario())
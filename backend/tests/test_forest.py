@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier
+
+from forest import CompiledForest, compile_forest
+
+
+def _reference(model, encoder, X):
+    return model.predict_proba(pd.DataFrame(X, columns=encoder.columns))
+
+
+@pytest.mark.parametrize("name", ["binary_model", "multiclass_model"])
+def test_identical_to_sklearn(request, encoder, encoded, name):
+    model = request.getfixturevalue(name)
+    X = encoded[0]
+    for size in (1, 10, 999, len(X)):
+        assert np.array_equal(CompiledForest(model).predict_proba(X[:size]), _reference(model, encoder, X[:size]))
+
+
+@pytest.mark.parametrize("name", ["binary_model", "multiclass_model"])
+def test_identical_with_missing_values(request, encoder, nan_rows, name):
+    model = request.getfixturevalue(name)
+    assert np.array_equal(CompiledForest(model).predict_proba(nan_rows), _reference(model, encoder, nan_rows))
+
+
+def test_identical_with_threads(encoder, encoded, multiclass_model):
+    X = encoded[0]
+    forest = CompiledForest(multiclass_model, threads=3, block_rows=256)
+    assert np.array_equal(forest.predict_proba(X), _reference(multiclass_model, encoder, X))
+
+
+def test_extra_trees_multiclass(encoder, encoded, raw_batch):
+    X = encoded[0]
+    model = ExtraTreesClassifier(n_estimators=10, max_depth=8, random_state=0)
+    model.fit(encoder.model_input(X), raw_batch["label"].astype(str))
+    assert np.array_equal(compile_forest(model).predict_proba(X), _reference(model, encoder, X))
+
+
+def test_unsupported_model_is_not_compiled():
+    assert compile_forest(object()) is None
+    assert compile_forest(None) is None
@@ -0,0 +1,60 @@
+import io
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from db import SQLiteWriter, connections_query, init_db
+from formats import encode_frame, stream_query
+
+
+# Flottants qu'un arrondi à 15 chiffres (défaut de pandas : 10) ne relit pas à l'identique
+FLOATS = [0.1 + 0.2, 1 / 3, 0.7333333333333333, 6369.616873214543, 1e-7, 1e16, 5e-324, -2.5, 1.0]
+
+
+@pytest.mark.parametrize("fmt", ["records", "columns"])
+def test_encode_frame_round_trips_floats(fmt):
+    df = pd.DataFrame({
+        "id": range(len(FLOATS) + 2),
+        "anomaly_score": FLOATS + [float("nan"), float("inf")],
+        "attack_type": ["smurf.", None, "é\"%s,"] + [None] * (len(FLOATS) - 1),
+    })
+    payload = json.loads(encode_frame(df, fmt))
+    columns = {name: [row[name] for row in payload] for name in df.columns} if fmt == "records" else payload
+    assert list(columns) == list(df.columns)
+    assert columns["anomaly_score"] == FLOATS + [None, None]  # Égalité exacte des doubles
+    assert columns["id"] == list(range(len(FLOATS) + 2))
+    assert columns["attack_type"] == ["smurf.", None, "é\"%s,"] + [None] * (len(FLOATS) - 1)
+    if fmt == "records":
+        # Mêmes valeurs que les enregistrements de `/events` (json.dumps)
+        records = df.astype(object).where(df.notna() & (df != float("inf")), None).to_dict(orient="records")
+        assert payload == json.loads(json.dumps(records))
+
+
+def test_ndjson_stream_round_trips_floats(tmp_path):
+    path = str(tmp_path / "values.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER, anomaly_score REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", enumerate(FLOATS))
+    conn.commit()
+    conn.close()
+    stream = b"".join(stream_query(lambda: sqlite3.connect(path), "SELECT * FROM t", (), "ndjson"))
+    assert [json.loads(line)["anomaly_score"] for line in stream.splitlines()] == FLOATS
+
+
+def test_arrow_stream_types_attack_type_as_string(tmp_path, scored_batch, reference_columns):
+    pa = pytest.importorskip("pyarrow")
+    path = str(tmp_path / "db.sqlite")
+    init_db(path, reference_columns[1], partition_by="none")
+    writer = SQLiteWriter(path, partition_by="none")
+    columns, rows, rollups = scored_batch(20)
+    rows[0][columns.index("Attack_Type")] = "smurf."
+    writer.insert_rows(rows, columns, rollups)
+    writer.close()
+
+    query, params = connections_query(limit=100)
+    stream = b"".join(stream_query(lambda: sqlite3.connect(path), query, params, "arrow"))
+    table = pa.ipc.open_stream(io.BytesIO(stream)).read_all()
+    assert table.schema.field("attack_type").type == pa.string()
+    assert table.column("attack_type").to_pylist()[-1] == "smurf." and table.num_rows == 20
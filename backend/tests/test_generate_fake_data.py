@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+import pytest
+
+from generate_fake_data import NORMAL_LABEL, generate, stream_files
+
+
+def _files(folder):
+    """
+    Fichiers déposés, dans l'ordre de dépôt (aucun temporaire ne doit subsister).
+    """
+    names = os.listdir(folder)
+    assert not [name for name in names if name.startswith(".")]
+    return sorted((os.path.join(folder, name) for name in names), key=os.path.getctime)
+
+
+def _labels(paths):
+    return pd.concat([pd.read_csv(path, header=None).iloc[:, -1] for path in paths], ignore_index=True)
+
+
+def test_stream_holds_target_rate(tmp_path):
+    # 2 000 lignes/s en fichiers de 200 lignes : un fichier toutes les 100 ms pendant 1 s
+    stream_files(str(tmp_path), rows_per_second=2000, file_rows=200, seed=0, duration=1, verbose=False)
+    paths = _files(str(tmp_path))
+    assert 9 <= len(paths) <= 11
+    assert all(len(pd.read_csv(path, header=None)) == 200 for path in paths)
+    # Cadence fixe, sans dérive : dixième fichier déposé ~0,9 s après le premier
+    spread = os.path.getctime(paths[-1]) - os.path.getctime(paths[0])
+    assert (len(paths) - 1) * 0.1 - 0.05 <= spread <= (len(paths) - 1) * 0.1 + 0.1
+
+
+def test_stream_is_reproducible_with_seed(tmp_path):
+    contents = []
+    for run, seed in enumerate((42, 42, 7)):
+        folder = str(tmp_path / str(run))
+        stream_files(folder, rows_per_second=100_000, file_rows=50, seed=seed, duration=0.003, verbose=False)
+        with open(_files(folder)[0], "rb") as f:
+            contents.append(f.read())
+    assert contents[0] == contents[1] and contents[0] != contents[2]
+
+
+@pytest.mark.parametrize("attack_ratio", [0.0, 0.2, 0.9])
+def test_attack_ratio_holds(tmp_path, attack_ratio):
+    stream_files(str(tmp_path), rows_per_second=1_000_000, file_rows=5000, seed=1, attack_ratio=attack_ratio,
+                 duration=0.02, verbose=False)
+    labels = _labels(_files(str(tmp_path)))
+    assert len(labels) >= 5000
+    assert (labels != NORMAL_LABEL).mean() == pytest.approx(attack_ratio, abs=0.02)
+
+
+def test_weighted_attacks():
+    labels = generate(20_000, rng=3, attack_ratio=0.5, attacks={"smurf.": 3, "neptune.": 1})["label"]
+    counts = labels.value_counts()
+    assert set(counts.index) == {NORMAL_LABEL, "smurf.", "neptune."}
+    assert counts["smurf."] / counts["neptune."] == pytest.approx(3, rel=0.1)
+    assert counts[NORMAL_LABEL] / len(labels) == pytest.approx(0.5, abs=0.02)
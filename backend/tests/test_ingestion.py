@@ -0,0 +1,289 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import ingestion
+from db import init_db
+from generate_fake_data import write_file
+from ingestion import IngestionEngine
+from process import row_chunks
+from watcher import FolderWatcher
+
+ROWS = 400
+
+
+@pytest.fixture
+def engine(tmp_path, registry, reference_columns):
+    """
+    Moteur sans processus de scoring, dont seuls les threads de lecture et d'écriture tournent :
+    le test joue le rôle du scan du dossier. Fabrique (moteur, chemin du fichier volumineux, chemin de la base).
+    """
+    def make(batch_max_delay_ms=5, batch_max_rows=ingestion.BATCH_MAX_ROWS):
+        db_path = str(tmp_path / "db.sqlite")
+        init_db(db_path, reference_columns[1])
+        engine = IngestionEngine(str(tmp_path / "in"), db_path, workers=0, batch_max_rows=batch_max_rows,
+                                 batch_max_delay_ms=batch_max_delay_ms, stream_chunk_bytes=4096)
+        engine._executor = engine._new_executor()
+        threading.Thread(target=engine._writer_loop, daemon=True).start()
+        threading.Thread(target=engine._stream_loop, daemon=True).start()
+        return engine, db_path
+    return make
+
+
+def _scan(engine, path, timeout=30):
+    """
+    Confie le fichier au thread de lecture, comme le scan du dossier, et attend sa libération.
+    """
+    with engine._lock:
+        engine._in_flight.add(path)
+    engine._streams.put((path, "2026-01-01T00:00:00"))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with engine._lock:
+            if path not in engine._in_flight:
+                return
+        time.sleep(0.01)
+    raise TimeoutError(path)
+
+
+def _write_binary(df, folder, fmt, encoder):
+    """
+    Écrit un lot en fichier binaire découpé en plusieurs RecordBatch / groupes de lignes de 50 lignes.
+    Le .npy contient la matrice encodée, variables numériques exactes (float64).
+    """
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pa_parquet
+
+    path = os.path.join(folder, "large" + {"arrow": ".arrow", "arrow_stream": ".ipc", "parquet": ".parquet"}.get(fmt, ".npy"))
+    if fmt == "npy":
+        numeric = encoder.numeric_values(df)
+        matrix = encoder.encode(df, numeric).astype(np.float64)
+        matrix[:, encoder.numeric_dst] = numeric
+        np.save(path, matrix)
+        return path
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == "parquet":
+        pa_parquet.write_table(table, path, row_group_size=50)
+    else:
+        new = pa.ipc.new_file if fmt == "arrow" else pa.ipc.new_stream
+        with pa.OSFile(path, "wb") as sink, new(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=50)
+    return path
+
+
+def _count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM connections").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def large_file(tmp_path, raw_batch):
+    os.makedirs(tmp_path / "in")
+    return write_file(raw_batch.iloc[:ROWS], str(tmp_path / "in"), "large")
+
+
+def test_stop_between_commit_and_removal_does_not_reinsert(monkeypatch, engine, large_file):
+    engine, db_path = engine()
+    remove = ingestion._remove
+    # Arrêt simulé entre le commit du dernier morceau et la suppression du fichier
+    monkeypatch.setattr(ingestion, "_remove", lambda path: None)
+    _scan(engine, large_file)
+    assert _count(db_path) == ROWS and os.path.exists(large_file)
+
+    monkeypatch.setattr(ingestion, "_remove", remove)
+    _scan(engine, large_file)
+    assert _count(db_path) == ROWS and not os.path.exists(large_file)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM ingest_progress").fetchone()[0] == 0
+    conn.close()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_failed_chunk_resumes_after_pending_chunks(monkeypatch, engine, large_file, encoder, raw_batch, fmt):
+    # Lots longs : les morceaux précédant l'échec sont encore en attente de commit quand la fin du fichier arrive
+    engine, db_path = engine(batch_max_delay_ms=300)
+    if fmt != "csv":
+        os.remove(large_file)
+        large_file = _write_binary(raw_batch.iloc[:ROWS], os.path.dirname(large_file), fmt, encoder)
+    task = "score_chunk" if fmt == "csv" else "score_rows"
+    score, calls = getattr(ingestion, task), []
+
+    def failing(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise RuntimeError("processus interrompu")
+        return score(*args)
+
+    monkeypatch.setattr(ingestion, task, failing)
+    _scan(engine, large_file)
+    assert 0 < _count(db_path) < ROWS and os.path.exists(large_file)
+
+    _scan(engine, large_file)  # Reprise au prochain scan
+    assert _count(db_path) == ROWS and not os.path.exists(large_file)
+
+
+def test_submit_failure_releases_unqueued_files(monkeypatch, tmp_path, registry, reference_columns, raw_batch):
+    db_path = str(tmp_path / "db.sqlite")
+    init_db(db_path, reference_columns[1])
+    os.makedirs(tmp_path / "in")
+    paths = [write_file(raw_batch.iloc[:10], str(tmp_path / "in"), f"file_{i}") for i in range(3)]
+    engine = IngestionEngine(str(tmp_path / "in"), db_path, workers=0, task_max_files=1)
+    engine._executor = engine._new_executor()
+    engine._executor.shutdown()  # Pool arrêté : `submit` lève RuntimeError
+    submit, calls = engine._submit, []
+
+    def spy(fn, *args):
+        calls.append(args)
+        return submit(fn, *args)
+
+    monkeypatch.setattr(engine, "_submit", spy)
+    monkeypatch.setattr(ingestion, "FolderWatcher", lambda folder: FolderWatcher(folder, mode="poll", settle_seconds=0))
+    threading.Thread(target=engine._dispatch_loop, daemon=True).start()
+
+    deadline = time.monotonic() + 2  # Avant le nouvel essai de la boucle (3 s après l'erreur)
+    while time.monotonic() < deadline:
+        with engine._lock:
+            if calls and not engine._in_flight:
+                break
+        time.sleep(0.01)
+    # Aucun fichier ne reste marqué en cours : le prochain scan les reprendra tous
+    assert len(calls) == 1 and engine._in_flight == set() and all(os.path.exists(path) for path in paths)
+
+
+def _rows(db_path):
+    # Lignes commitées, sans id ni timestamp (attribués par l'écrivain)
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[2:] for row in conn.execute("SELECT * FROM connections ORDER BY id")]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "arrow_stream", "parquet", "npy"])
+def test_large_binary_file_matches_csv_path(engine, large_file, encoder, raw_batch, fmt):
+    engine, db_path = engine()
+    _scan(engine, large_file)
+    path = _write_binary(raw_batch.iloc[:ROWS], os.path.dirname(large_file), fmt, encoder)
+    chunks = row_chunks(path, engine.stream_chunk_bytes)
+    assert len(chunks) > 1 and chunks[0][0] == 0 and chunks[-1][1] == ROWS
+    assert all(stop == start for (_, stop), (start, _) in zip(chunks, chunks[1:]))
+    if fmt != "npy":
+        assert all(start % 50 == 0 for start, _ in chunks)  # Alignés sur les RecordBatch / groupes de lignes
+
+    _scan(engine, path)
+    rows = _rows(db_path)
+    assert len(rows) == 2 * ROWS and not os.path.exists(path)
+    # Mêmes lignes que par le CSV, au dernier bit près du texte relu par `read_csv`
+    assert all(binary == pytest.approx(csv, rel=1e-12, nan_ok=True) for csv, binary in zip(rows[:ROWS], rows[ROWS:]))
+
+
+def test_large_binary_file_resumes_from_committed_row(engine, large_file, encoder, raw_batch):
+    engine, db_path = engine()
+    os.remove(large_file)
+    path = _write_binary(raw_batch.iloc[:ROWS], str(engine.folder), "npy", encoder)
+    st = os.stat(path)
+    chunks = row_chunks(path, engine.stream_chunk_bytes)
+    # Arrêt simulé après le commit des premiers morceaux : avancement enregistré à la ligne atteinte
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO ingest_progress VALUES (?, ?, ?, ?)", ("large.npy", st.st_size, st.st_mtime_ns, chunks[1][1]))
+    conn.commit()
+    conn.close()
+
+    assert row_chunks(path, engine.stream_chunk_bytes, chunks[1][1]) == chunks[2:]
+    _scan(engine, path)
+    assert _count(db_path) == ROWS - chunks[1][1] and not os.path.exists(path)
+
+
+def test_unreadable_large_binary_file_is_rejected(engine, tmp_path):
+    engine, db_path = engine()
+    os.makedirs(engine.folder, exist_ok=True)
+    path = str(tmp_path / "in" / "broken.parquet")
+    with open(path, "wb") as f:
+        f.write(b"pas un fichier parquet" * 100)
+    _scan(engine, path)
+    assert _count(db_path) == 0 and not os.path.exists(path)
+
+
+def _spy_commits(monkeypatch, engine):
+    """
+    Enregistre (instant de début, nombre de lignes) de chaque commit de l'écrivain, une fois terminé.
+    """
+    commit, commits = engine._commit, []
+
+    def spy(batch):
+        start = time.monotonic()
+        commit(batch)
+        commits.append((start, len(batch.rows)))
+
+    monkeypatch.setattr(engine, "_commit", spy)
+    return commits
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_batch_commits_as_soon_as_it_reaches_max_rows(monkeypatch, engine, scored_batch):
+    # Délai d'attente d'une minute : seul le nombre de lignes peut déclencher le commit
+    engine, db_path = engine(batch_max_delay_ms=60_000, batch_max_rows=100)
+    commits = _spy_commits(monkeypatch, engine)
+    for offset in (0, 40, 80):
+        engine.submit_scored(*scored_batch(40, offset))
+
+    assert _wait_for(lambda: commits)
+    assert [rows for _, rows in commits] == [120] and _count(db_path) == 120  # Un seul commit, tous les morceaux
+
+    engine.submit_scored(*scored_batch(40, 120))  # Sous le seuil : attend l'échéance
+    time.sleep(0.3)
+    assert len(commits) == 1 and _count(db_path) == 120
+
+
+def test_batch_commits_at_its_deadline(monkeypatch, engine, scored_batch):
+    engine, db_path = engine(batch_max_delay_ms=300, batch_max_rows=10_000)
+    commits = _spy_commits(monkeypatch, engine)
+    start = time.monotonic()
+    engine.submit_scored(*scored_batch(10))
+    time.sleep(0.1)
+    engine.submit_scored(*scored_batch(10, 10))  # Rejoint le lot ouvert, sans repousser l'échéance
+
+    assert _wait_for(lambda: commits)
+    at, rows = commits[0]
+    assert rows == 20 and 0.3 <= at - start < 1.3
+    assert _count(db_path) == 20
+
+
+def test_writer_commits_in_submission_order_while_readers_stay_open(engine, scored_batch):
+    engine, db_path = engine(batch_max_delay_ms=50)
+    batches = [scored_batch(30, offset) for offset in (0, 30, 60)]
+    futures = [Future() for _ in batches]
+    for future in futures:
+        engine._tasks.put((future, [], None))
+
+    # Lecteur en transaction pendant les écritures (WAL) : ni blocage ni « database is locked »
+    reader = sqlite3.connect(db_path)
+    reader.execute("BEGIN")
+    assert reader.execute("SELECT COUNT(*) FROM connections").fetchone()[0] == 0
+
+    for future, (columns, rows, rollups) in reversed(list(zip(futures, batches))):  # Scoring terminé à rebours
+        future.set_result({"columns": columns, "rows": rows, "rollups": rollups, "files": [], "rejected": []})
+        time.sleep(0.02)
+
+    assert _wait_for(lambda: _count(db_path) == 90)
+    assert reader.execute("SELECT COUNT(*) FROM connections").fetchone()[0] == 0  # Instantané du lecteur inchangé
+    reader.rollback()
+    assert reader.execute("SELECT COUNT(*) FROM connections").fetchone()[0] == 90
+    reader.close()
+    # Lignes dans l'ordre de soumission, pas dans l'ordre de fin du scoring
+    expected = [tuple(row[1:]) for _, rows, _ in batches for row in rows]
+    assert _rows(db_path) == expected
@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import ingestion
+import metrics
+from db import init_db
+from generate_fake_data import write_file
+from ingestion import IngestionEngine
+from readpool import ReadPool
+from watcher import FolderWatcher
+
+STAGES = ("parse", "encode", "predict", "insert", "delete")
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, reference_columns):
+    """
+    Client de l'API sur une base et un dossier surveillé temporaires (sans les threads du démarrage).
+    """
+    db_path, folder = str(tmp_path / "db.sqlite"), str(tmp_path / "in")
+    os.makedirs(folder)
+    init_db(db_path, reference_columns[1])
+    monkeypatch.setattr(app, "DB_PATH", db_path)
+    monkeypatch.setattr(app, "WATCHED_FOLDER", folder)
+    monkeypatch.setattr(app, "read_pool", ReadPool(db_path))
+    return TestClient(app.app)
+
+
+def _samples(client):
+    """
+    Échantillons exposés par /metrics : {"nom{étiquettes}": valeur}.
+    """
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_metrics_expose_the_operating_series(client):
+    text = client.get("/metrics").text
+    for name, kind in [("ingest_stage_seconds", "histogram"), ("ingest_rows_total", "counter"),
+                       ("watch_backlog_files", "gauge"), ("watch_oldest_file_age_seconds", "gauge"),
+                       ("db_size_bytes", "gauge"), ("http_request_seconds", "histogram")]:
+        assert f"# TYPE {name} {kind}\n" in text
+    # Une ligne par échantillon : nom, étiquettes éventuelles, valeur
+    assert all(re.fullmatch(r'[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? \S+', line)
+               for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_metrics_move_after_an_ingestion(monkeypatch, client, registry, raw_batch):
+    before = _samples(client)
+    for i in range(2):
+        write_file(raw_batch.iloc[i * 50:(i + 1) * 50], app.WATCHED_FOLDER, f"file_{i}")
+    time.sleep(0.05)
+    waiting = _samples(client)
+    assert waiting["watch_backlog_files"] == 2 and waiting["watch_oldest_file_age_seconds"] >= 0.05
+
+    monkeypatch.setattr(ingestion, "FolderWatcher",
+                        lambda folder: FolderWatcher(folder, mode="poll", poll_interval=0.02, settle_seconds=0))
+    IngestionEngine(app.WATCHED_FOLDER, app.DB_PATH, workers=0, batch_max_delay_ms=5).start()
+    assert _wait_for(lambda: not os.listdir(app.WATCHED_FOLDER))
+    assert client.get("/get_data", params={"limit": 10}).status_code == 200
+
+    # Les fichiers sont supprimés juste après le commit : les compteurs du commit peuvent suivre de peu
+    assert _wait_for(lambda: _samples(client)["ingest_rows_total"] - before.get("ingest_rows_total", 0) == 100)
+    after = _samples(client)
+    for stage in STAGES:
+        key = f'ingest_stage_seconds_count{{stage="{stage}"}}'
+        assert after[key] > before.get(key, 0), stage
+    assert after["watch_backlog_files"] == 0 and after["watch_oldest_file_age_seconds"] == 0
+    assert after["db_size_bytes"] > before["db_size_bytes"]
+    key = 'http_request_seconds_count{endpoint="/get_data",format="records"}'
+    assert after[key] == before.get(key, 0) + 1
+
+
+def test_sampled_log_suppresses_bursts(monkeypatch, capsys):
+    monkeypatch.setattr(metrics, "LOG_SAMPLE_SECONDS", 0.2)
+    monkeypatch.setattr(metrics, "_log_state", {})
+    for i in range(5):
+        metrics.log_sampled("ingest_commit", rows=i)
+    metrics.log_sampled("file_rejected", file="a.txt")  # Chaque événement a sa propre fenêtre
+    time.sleep(0.25)
+    metrics.log_sampled("ingest_commit", rows=5)
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(r["event"], r.get("rows"), r["suppressed"]) for r in records] == [
+        ("ingest_commit", 0, 0), ("file_rejected", None, 0), ("ingest_commit", 5, 4)]
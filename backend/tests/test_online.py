@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+import joblib
+import pytest
+
+from online import PredictionBatcher, parse_records
+
+
+@pytest.fixture
+def spied_registry(monkeypatch, registry):
+    """
+    Registre de test dont les chargements notent le thread qui les exécute.
+    """
+    registry.load_threads = []
+    load = registry._load
+
+    def spy(signature):
+        registry.load_threads.append(threading.current_thread().name)
+        load(signature)
+
+    monkeypatch.setattr(registry, "_load", spy)
+    return registry
+
+
+def test_reload_happens_in_inference_thread(spied_registry, raw_batch, binary_model):
+    registry = spied_registry
+
+    async def scenario():
+        batcher = PredictionBatcher(max_wait_ms=0)
+        first = await batcher.predict(parse_records(raw_batch.iloc[:5].values.tolist()))
+        # Nouveau modèle sur disque : la requête suivante le détecte hors de la boucle
+        joblib.dump(binary_model, registry.paths["model"], compress=3)
+        second = await batcher.predict(parse_records(raw_batch.iloc[5:10].values.tolist()))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.attrs["model_version"] == 1 and second.attrs["model_version"] == 2
+    assert registry.load_threads and all(name.startswith("predict") for name in registry.load_threads)
+
+
+def test_current_never_reloads(spied_registry, binary_model):
+    registry = spied_registry
+    joblib.dump(binary_model, registry.paths["model"], compress=3)
+    assert registry.current.version == 1 and registry.load_threads == []
+    assert registry.get().version == 2 and registry.current.version == 2
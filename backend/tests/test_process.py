@@ -0,0 +1,115 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import process
+from artifacts import ArtifactRegistry
+from db import compact_frame
+from process import score_features
+
+
+def _scored(artifacts, encoded, rows=None):
+    X, numeric = encoded
+    if rows is not None:
+        X, numeric = X[:rows], numeric[:rows]
+    timings = {}
+    return score_features(artifacts, X, numeric, timings), timings
+
+
+@pytest.fixture
+def uncached(make_artifacts):
+    # Cascade évaluée sans le cache des prédictions (couvert par test_cache.py)
+    def make(multiclass_model=None):
+        artifacts = make_artifacts(multiclass_model)
+        artifacts.prediction_cache = None
+        return artifacts
+    return make
+
+
+@pytest.mark.parametrize("rows", [500, 3000])  # Forêt compilée, puis scikit-learn au-delà de FOREST_MAX_ROWS
+def test_binary_only_without_multiclass_model(uncached, encoder, encoded, binary_model, rows):
+    df, timings = _scored(uncached(), encoded, rows)
+    reference = binary_model.predict_proba(encoder.model_input(encoded[0][:rows]))[:, 1]
+
+    assert np.array_equal(df["Prediction_Probability"].to_numpy(), reference)
+    assert np.array_equal(df["Predicted_Class"].to_numpy(), (reference >= 0.5).astype(int))
+    assert df["Attack_Type"].isna().all() and df["Attack_Probability"].isna().all()
+    assert "predict_multiclass" not in timings
+
+
+@pytest.mark.parametrize("rows", [500, 3000])
+def test_cascade_matches_sklearn(uncached, encoder, encoded, binary_model, multiclass_model, rows):
+    df, timings = _scored(uncached(multiclass_model), encoded, rows)
+    X = encoder.model_input(encoded[0][:rows])
+    binary = binary_model.predict_proba(X)[:, 1]
+    multiclass = multiclass_model.predict_proba(X)
+    flagged = binary >= process.CASCADE_THRESHOLD
+
+    assert np.array_equal(df["Prediction_Probability"].to_numpy(), binary)
+    assert flagged.any() and not flagged.all()
+    expected_type = multiclass_model.classes_[multiclass.argmax(axis=1)]
+    assert df["Attack_Type"][flagged].tolist() == expected_type[flagged].tolist()
+    assert df["Attack_Probability"][flagged].tolist() == multiclass.max(axis=1)[flagged].tolist()
+    assert df["Attack_Type"][~flagged].isna().all() and df["Attack_Probability"][~flagged].isna().all()
+    assert "predict_multiclass" in timings
+
+
+def test_cascade_threshold(monkeypatch, uncached, encoded, multiclass_model):
+    artifacts = uncached(multiclass_model)
+    monkeypatch.setattr(process, "CASCADE_THRESHOLD", 0.0)
+    assert _scored(artifacts, encoded, 200)[0]["Attack_Type"].notna().all()
+    monkeypatch.setattr(process, "CASCADE_THRESHOLD", 1.1)
+    df, timings = _scored(artifacts, encoded, 200)
+    assert df["Attack_Type"].isna().all() and "predict_multiclass" not in timings
+
+
+def test_multiclass_model_with_other_column_order(make_artifacts, encoder, encoded, raw_batch):
+    X = encoded[0]
+    columns = encoder.columns[::-1]
+    model = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0)
+    model.fit(pd.DataFrame(X[:, ::-1], columns=columns), raw_batch["label"].astype(str))
+    artifacts = make_artifacts(model)
+    assert artifacts.multiclass_order is not None
+
+    for rows in (100, len(X)):
+        labels, probabilities = artifacts.predict_attack(X[:rows])
+        reference = model.predict_proba(pd.DataFrame(X[:rows, ::-1], columns=columns))
+        assert labels.tolist() == model.classes_[reference.argmax(axis=1)].tolist()
+        assert np.array_equal(probabilities, reference.max(axis=1))
+
+
+def test_registry_loads_optional_multiclass_model(tmp_path, reference_columns, binary_model, multiclass_model):
+    paths = {name: str(tmp_path / f"{name}.pkl") for name in ("model", "columns", "post", "multiclass")}
+    joblib.dump(binary_model, paths["model"])
+    joblib.dump(reference_columns[0], paths["columns"])
+    joblib.dump(reference_columns[1], paths["post"])
+    registry = ArtifactRegistry(paths["model"], paths["columns"], paths["post"], check_interval=0,
+                                multiclass_model_path=paths["multiclass"])
+
+    assert registry.get().multiclass_model is None
+    joblib.dump(multiclass_model, paths["multiclass"])
+    artifacts = registry.get()
+    assert artifacts.version == 2 and list(artifacts.multiclass_model.classes_) == list(multiclass_model.classes_)
+    os.remove(paths["multiclass"])
+    artifacts = registry.get()
+    assert artifacts.version == 3 and artifacts.multiclass_model is None
+
+
+def test_scored_rows_uses_the_scoring_snapshot(monkeypatch, make_artifacts, encoded, reference_columns):
+    class Unavailable:
+        def get(self):
+            raise AssertionError("Instantané relu pendant la conversion")
+
+    # Mode compact : le repli utilise les colonnes de référence de l'instantané qui a scoré les lignes
+    monkeypatch.setattr(process, "registry", Unavailable())
+    monkeypatch.setattr(process, "STORAGE_MODE", "compact")
+    artifacts = make_artifacts()
+    df = score_features(artifacts, encoded[0][:100], encoded[1][:100])
+    df.insert(0, "timestamp", "2026-01-01T00:00:00")
+    columns, rows, rollups = process.scored_rows(artifacts, df)
+    assert columns == list(compact_frame(df, reference_columns[1]).columns) and len(rows) == 100
+    assert sum(rollup[4] for rollup in rollups) == 100
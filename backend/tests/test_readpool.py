@@ -0,0 +1,79 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from readpool import ReadOverloaded, ReadPool, ReadTimeout
+
+# Requête sans fin tant qu'elle n'est pas interrompue (compteur récursif)
+ENDLESS_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.close()
+    return path
+
+
+def _count(conn):
+    return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+
+def test_reads_beyond_max_pending_are_rejected_immediately(db_path):
+    pool = ReadPool(db_path, size=1, timeout=5, max_pending=2)
+    release = threading.Event()
+
+    def blocked(conn):
+        release.wait(5)
+        return _count(conn)
+
+    async def scenario():
+        # Une lecture en cours, une en attente d'une connexion : la suivante est refusée sans attendre
+        running = [asyncio.ensure_future(pool.run(blocked)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.pending == 2
+        start = time.monotonic()
+        with pytest.raises(ReadOverloaded):
+            await pool.run(_count)
+        rejected_in = time.monotonic() - start
+        release.set()
+        return await asyncio.gather(*running), rejected_in, await pool.run(_count)
+
+    results, rejected_in, after = asyncio.run(scenario())
+    assert results == [10, 10] and rejected_in < 0.1
+    assert pool.pending == 0 and after == 10  # Places libérées une fois les lectures terminées
+
+
+def test_slow_read_is_interrupted_after_timeout(db_path):
+    pool = ReadPool(db_path, size=1, timeout=0.2, max_pending=4)
+    started = []
+
+    def endless(conn):
+        started.append(time.monotonic())
+        return conn.execute(ENDLESS_QUERY).fetchone()
+
+    def queued(conn):
+        started.append(None)
+        return _count(conn)
+
+    async def scenario():
+        start = time.monotonic()
+        # La seconde lecture attend la seule connexion, occupée : elle expire sans avoir démarré
+        results = await asyncio.gather(pool.run(endless), pool.run(queued), return_exceptions=True)
+        elapsed = time.monotonic() - start
+        await asyncio.sleep(0.05)  # Fin de la requête interrompue dans son thread
+        return results, elapsed, await pool.run(_count)
+
+    results, elapsed, after = asyncio.run(scenario())
+    assert all(isinstance(result, ReadTimeout) for result in results)
+    assert 0.2 <= elapsed < 1
+    assert len(started) == 1 and started[0] is not None  # La lecture en file n'a jamais été exécutée
+    # Requête SQL interrompue : la connexion est rendue au pool et sert à la lecture suivante
+    assert after == 10 and pool.pending == 0
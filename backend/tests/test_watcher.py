@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+import watcher
+from watcher import FolderWatcher
+
+
+def _drop(folder, name, content=b"1,2,3\n"):
+    """
+    Dépôt d'un fichier complet : écriture dans un temporaire puis renommage, comme le générateur.
+    """
+    tmp_path = os.path.join(folder, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, os.path.join(folder, name))
+
+
+def _names(paths):
+    return [os.path.basename(path) for path in paths]
+
+
+@pytest.fixture
+def make_inotify_watcher(tmp_path):
+    """
+    Fabrique d'un observateur inotify sur `tmp_path` (ignoré si inotify est indisponible).
+    """
+    watchers = []
+
+    def make():
+        try:
+            watchers.append(FolderWatcher(str(tmp_path), mode="inotify", settle_seconds=0, poll_interval=0.2))
+        except OSError as e:
+            pytest.skip(f"inotify indisponible : {e}")
+        return watchers[-1]
+    yield make
+    for folder_watcher in watchers:
+        folder_watcher.close()
+
+
+def test_inotify_drains_every_ready_file_in_arrival_order(tmp_path, make_inotify_watcher):
+    _drop(str(tmp_path), "present_at_start.txt")
+    inotify_watcher = make_inotify_watcher()
+    assert _names(inotify_watcher.drain()) == ["present_at_start.txt"]  # Scan initial
+
+    for name in ("c.txt", "a.txt", "b.txt"):
+        _drop(str(tmp_path), name)
+    with open(tmp_path / "written_in_place.txt", "wb") as f:  # Écrit sans renommage : visible à sa fermeture
+        f.write(b"4,5,6\n")
+    with open(tmp_path / "still_open.part", "wb") as f:
+        f.write(b"7,8")
+    inotify_watcher.wait(timeout=1)
+
+    # Un seul réveil : tous les fichiers prêts, dans l'ordre d'arrivée, jamais un temporaire
+    assert _names(inotify_watcher.drain()) == ["c.txt", "a.txt", "b.txt", "written_in_place.txt"]
+    assert inotify_watcher.drain() == []
+
+
+def test_inotify_overflow_triggers_full_rescan(tmp_path, make_inotify_watcher):
+    inotify_watcher = make_inotify_watcher()
+    inotify_watcher.drain()
+    for name in ("first.txt", "second.txt"):
+        _drop(str(tmp_path), name)
+        time.sleep(0.01)
+    # Événements perdus (file inotify saturée) : le rescan suivant retrouve les fichiers par date de changement
+    inotify_watcher._pending.clear()
+    inotify_watcher._needs_rescan = True
+    assert _names(inotify_watcher.drain()) == ["first.txt", "second.txt"]
+
+
+def test_poll_fallback_when_inotify_is_unavailable(monkeypatch, tmp_path):
+    def unavailable(folder):
+        raise OSError("inotify_init1 a échoué")
+
+    monkeypatch.setattr(watcher, "_Inotify", unavailable)
+    folder_watcher = FolderWatcher(str(tmp_path), mode="auto", settle_seconds=0.2, poll_interval=0.05)
+    assert folder_watcher.mode == "poll"
+    with pytest.raises(OSError):
+        FolderWatcher(str(tmp_path), mode="inotify")
+
+    for name in ("z.txt", "y.txt"):
+        _drop(str(tmp_path), name)
+        time.sleep(0.01)
+    _drop(str(tmp_path), ".hidden.txt")
+    assert folder_watcher.drain() == []  # Modifiés il y a moins de `settle_seconds` : peut-être incomplets
+
+    time.sleep(0.25)
+    folder_watcher.wait()
+    assert _names(folder_watcher.drain()) == ["z.txt", "y.txt"]  # Ordre de dépôt (date de changement)
@@ -0,0 +1,218 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from collections import OrderedDict
+
+# ------------------------ 1️⃣ ⚙️ CONFIGURATION ------------------------
+
+# "auto" : inotify si disponible (Linux), sinon scrutation ; "inotify" ou "poll" pour forcer un mode
+WATCH_MODE = os.environ.get("WATCH_MODE", "auto")
+# Délai maximal entre deux réveils (scrutation, ou filet de sécurité en mode inotify)
+WATCH_POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", "1"))
+# Lors d'un scan, un fichier doit être inchangé depuis ce délai pour être considéré complet
+WATCH_SETTLE_SECONDS = float(os.environ.get("WATCH_SETTLE_SECONDS", "0.5"))
+# En mode inotify, rescan complet du dossier à cet intervalle (rattrape un éventuel événement perdu)
+WATCH_RESCAN_INTERVAL = float(os.environ.get("WATCH_RESCAN_INTERVAL", "30"))
+
+# Préfixes/suffixes des fichiers en cours d'écriture (écriture dans un temporaire puis `rename`)
+TEMP_PREFIXES = (".", "~")
+TEMP_SUFFIXES = (".tmp", ".part", ".partial", ".swp")
+
+# Constantes inotify (cf. <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_temporary(name):
+    """
+    Indique si un nom de fichier correspond à un fichier encore en cours d'écriture.
+    """
+    return name.startswith(TEMP_PREFIXES) or name.endswith(TEMP_SUFFIXES)
+
+
+def folder_backlog(folder):
+    """
+    Nombre de fichiers complets en attente dans le dossier et âge (secondes) du plus ancien, 0 si aucun.
+    """
+    count, oldest_ns = 0, None
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if is_temporary(entry.name):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                count += 1
+                oldest_ns = st.st_mtime_ns if oldest_ns is None else min(oldest_ns, st.st_mtime_ns)
+    except FileNotFoundError:
+        return 0, 0.0
+    age = max(0.0, (time.time_ns() - oldest_ns) / 1e9) if oldest_ns is not None else 0.0
+    return count, age
+
+
+# ------------------------ 2️⃣ 🔔 INOTIFY (LINUX) ------------------------
+
+class _Inotify:
+    """
+    Accès minimal à inotify via ctypes (aucune dépendance externe).
+    Ne remonte que les fichiers complets : fermés après écriture ou renommés dans le dossier.
+    """
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 a échoué")
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch a échoué sur {folder}")
+
+    def read(self, timeout):
+        """
+        Attend au plus `timeout` secondes et retourne (noms dans l'ordre d'arrivée, débordement).
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return [], False
+
+        names, overflow = [], False
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                offset += _EVENT_HEADER.size
+                name = buffer[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    names.append(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+# ------------------------ 3️⃣ 👀 SURVEILLANCE DU DOSSIER ------------------------
+
+class FolderWatcher:
+    """
+    Surveille un dossier et retourne, à chaque réveil, tous les fichiers prêts dans l'ordre d'arrivée.
+
+    - Linux : réveil sur événement inotify (`IN_CLOSE_WRITE`, `IN_MOVED_TO`), sans attente fixe.
+    - Ailleurs (ou si inotify est indisponible) : scrutation par `os.scandir`.
+    - Les fichiers temporaires (`.nom`, `*.tmp`, `*.part`...) ne sont jamais retournés.
+    """
+
+    def __init__(self, folder, mode=WATCH_MODE, poll_interval=WATCH_POLL_INTERVAL,
+                 settle_seconds=WATCH_SETTLE_SECONDS, rescan_interval=WATCH_RESCAN_INTERVAL):
+        self.folder = folder
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.rescan_interval = rescan_interval
+        self._pending = OrderedDict()
+        self._inotify = None
+        self._needs_rescan = True
+        self._last_rescan = 0.0
+
+        os.makedirs(folder, exist_ok=True)
+
+        if mode in ("auto", "inotify"):
+            try:
+                self._inotify = _Inotify(folder)
+            except (OSError, AttributeError) as e:
+                if mode == "inotify":
+                    raise
+                print(f"⚠️ inotify indisponible ({e}), bascule en scrutation", flush=True)
+
+        self.mode = "inotify" if self._inotify is not None else "poll"
+        print(f"👀 Surveillance de {folder} (mode {self.mode})", flush=True)
+
+    def _scan(self, settle_seconds):
+        """
+        Liste les fichiers prêts du dossier, triés par date de changement (ordre d'arrivée).
+        """
+        now = time.time_ns()
+        settle_ns = int(settle_seconds * 1e9)
+        entries = []
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if is_temporary(entry.name) or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if settle_ns and now - st.st_mtime_ns < settle_ns:
+                    continue  # Peut-être encore en cours d'écriture : on le reprendra au prochain passage
+                entries.append((st.st_ctime_ns, entry.name))
+        entries.sort()
+        return [name for _, name in entries]
+
+    def wait(self, timeout=None):
+        """
+        Bloque jusqu'à l'arrivée de nouveaux fichiers, au plus `timeout` secondes
+        (par défaut `poll_interval`).
+        """
+        if timeout is None or timeout > self.poll_interval:
+            timeout = self.poll_interval
+
+        if self._inotify is None:
+            time.sleep(timeout)
+            return
+
+        names, overflow = self._inotify.read(timeout)
+        for name in names:
+            if not is_temporary(name):
+                self._pending[name] = None
+        if overflow:
+            print("⚠️ File d'événements inotify saturée, rescan complet du dossier", flush=True)
+            self._needs_rescan = True
+
+    def drain(self):
+        """
+        Retourne les chemins de tous les fichiers prêts, dans l'ordre d'arrivée, et vide la file.
+        """
+        if self._inotify is None:
+            names = self._scan(self.settle_seconds)
+        else:
+            if self._needs_rescan or time.monotonic() - self._last_rescan > self.rescan_interval:
+                # Fichiers déjà présents au démarrage / événements perdus : le scan (trié par ctime)
+                # passe en tête, les événements reçus entre-temps suivent dans leur ordre
+                scanned = self._scan(self.settle_seconds)
+                known = set(scanned)
+                names = scanned + [name for name in self._pending if name not in known]
+                self._needs_rescan = False
+                self._last_rescan = time.monotonic()
+            else:
+                names = list(self._pending)
+            self._pending.clear()
+
+        paths = []
+        for name in names:
+            path = os.path.join(self.folder, name)
+            if os.path.isfile(path):
+                paths.append(path)
+        return paths
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
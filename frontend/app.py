@@ -3,10 +3,26 @@ from dash import dcc, html, dash_table
 import plotly.express as px
 import pandas as pd
 import requests
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
 from dash.dependencies import Input, Output, State
 
 # URL de l'API Backend
 API_URL = "http://backend:8000/get_data"
+STATS_URL = "http://backend:8000/stats"
+EVENTS_URL = "http://backend:8000/events"
+
+# Taille maximale de la fenêtre glissante conservée dans le navigateur
+ROLLING_WINDOW = 2000
+
+# Intervalle de rafraîchissement des onglets (ms) : lu dans la mémoire du serveur Dash, sans requête au backend
+LIVE_REFRESH_MS = 2000
+
+# Budget de points du graphique d'activité (≈ largeur en pixels) : la période choisie est sous-échantillonnée par le backend
+GRAPH_POINTS = 2000
 
 # Initialisation de l'application Dash
 app = dash.Dash(__name__)
@@ -27,9 +43,24 @@ app.layout = html.Div([
         style={"width": "50%"}
     ),
 
+    # Période couverte par les statistiques (calculées côté serveur sur tout l'historique)
+    dcc.Dropdown(
+        id="stats-range",
+        options=[{"label": "Dernière heure", "value": 1},
+                 {"label": "Dernières 24 h", "value": 24},
+                 {"label": "7 derniers jours", "value": 24 * 7},
+                 {"label": "Tout l'historique", "value": 0}],
+        value=24,
+        clearable=False,
+        style={"width": "50%"}
+    ),
+
     # Bouton pour demander les données filtrées
     html.Button("🔄 Charger les Données", id="load-data-btn", n_clicks=0),
 
+    # Mise à jour en direct (après le premier chargement) à partir du flux partagé du serveur Dash
+    dcc.Interval(id="live-interval", interval=LIVE_REFRESH_MS),
+
     # Graphique des connexions réseau
     dcc.Graph(id="network-traffic-graph"),
 
@@ -42,7 +73,8 @@ app.layout = html.Div([
             {"name": "IP Destination", "id": "destination_ip"},
             {"name": "Protocole", "id": "protocol"},
             {"name": "Port", "id": "port"},
-            {"name": "Score Anomalie", "id": "anomaly_score"}
+            {"name": "Score Anomalie", "id": "anomaly_score"},
+            {"name": "Type d'Attaque", "id": "attack_type"}
         ],
         page_size=10,
         style_table={'overflowX': 'auto'}
@@ -55,20 +87,31 @@ app.layout = html.Div([
 
     # Stockage des données
     dcc.Store(id="stored-data"),
+    dcc.Store(id="stats-data"),
+    dcc.Store(id="series-data"),
 ])
 
 
 # Fonction pour récupérer les données depuis le backend en fonction des filtres
-def fetch_data(protocol):
+def fetch_data(protocol, since_id=None):
+    """
+    Récupère les dernières connexions. Avec `since_id`, seules les lignes insérées après cet id
+    sont demandées (mode delta).
+    """
     print("🔄 Récupération des données en cours...")  # Log début récupération
 
     try:
         params = {"protocol": protocol} if protocol != "all" else {}
+        if since_id is not None:
+            params["since_id"] = since_id
+            params["limit"] = ROLLING_WINDOW
         response = requests.get(API_URL, params=params)
 
         if response.status_code == 200:
             print("✅ Données chargées avec succès !")  # Log succès
-            return pd.DataFrame(response.json())
+            payload = response.json()
+            # Le backend renvoie un message (et non une liste) quand il n'y a rien de nouveau
+            return pd.DataFrame(payload) if isinstance(payload, list) else pd.DataFrame()
 
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des données : {e}")
@@ -76,67 +119,292 @@ def fetch_data(protocol):
     return pd.DataFrame()
 
 
+class LiveFeed:
+    """
+    Abonnement unique du serveur Dash au flux `/events` du backend (Server-Sent Events), dans un thread d'arrière-plan.
+    Les dernières lignes poussées (ROLLING_WINDOW au plus, de la plus récente à la plus ancienne) sont gardées
+    en mémoire et partagées par tous les onglets : N spectateurs coûtent une diffusion, pas N requêtes SQL.
+    Toutes les lignes d'id supérieur à `floor` sont en mémoire ; à la connexion, ou si le backend signale
+    des messages perdus ("gap") ou tronqués, les lignes manquantes sont redemandées une fois via `/get_data`.
+    """
+
+    def __init__(self, url=EVENTS_URL, size=ROLLING_WINDOW):
+        self.url = url
+        self.size = size
+        self.connected = False
+        self.last_id = 0
+        self._rows = deque(maxlen=size)
+        self._floor = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def rows_since(self, since_id, protocol):
+        """
+        Lignes d'id > `since_id` (filtrées par protocole, plus récentes d'abord) et id atteint par le flux,
+        ou (None, None) si le flux ne peut pas garantir de les avoir toutes (déconnecté ou trop en retard).
+        """
+        with self._lock:
+            if not self.connected or self._floor is None or since_id < self._floor:
+                return None, None
+            rows = []
+            for row in self._rows:
+                if row["id"] <= since_id:
+                    break
+                if protocol == "all" or row["protocol"] == protocol:
+                    rows.append(row)
+            return rows, self.last_id
+
+    def _run(self):
+        while True:
+            try:
+                with requests.get(self.url, stream=True, timeout=(5, 60)) as response:
+                    response.raise_for_status()
+                    # Abonnement ouvert avant le rattrapage : aucune ligne commitée entre les deux n'est perdue
+                    self._resync()
+                    self.connected = True
+                    print("📡 Abonné au flux des nouvelles lignes", flush=True)
+
+                    event = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):
+                            event = line[len("event:"):].strip()
+                        elif line.startswith("data:") and event == "gap":
+                            self._resync()
+                        elif line.startswith("data:") and event == "rows":
+                            payload = json.loads(line[len("data:"):])
+                            if payload["truncated"]:
+                                self._resync()
+                            self._merge(payload["rows"])
+            except Exception as e:
+                print(f"❌ Flux des nouvelles lignes interrompu : {e}", flush=True)
+
+            self.connected = False
+            time.sleep(3)
+
+    def _resync(self):
+        """
+        Rattrape par `/get_data` (mode delta) les lignes que le flux n'a pas transmises.
+        """
+        response = requests.get(API_URL, params={"since_id": self.last_id, "limit": self.size}, timeout=10)
+        response.raise_for_status()
+        payload = response.json()
+        if isinstance(payload, dict) and "error" in payload:
+            raise RuntimeError(payload["error"])
+        # Le backend renvoie un message (et non une liste) quand il n'y a rien de nouveau
+        rows = payload if isinstance(payload, list) else []
+        with self._lock:
+            if len(rows) >= self.size:
+                # Plus de lignes manquantes que la fenêtre : seules les plus récentes sont gardées
+                self._floor = max(self._floor or 0, rows[-1]["id"] - 1)
+            elif self._floor is None:
+                self._floor = 0
+        self._merge(rows)
+
+    def _merge(self, rows):
+        # `rows` : de la plus récente à la plus ancienne, comme la fenêtre
+        with self._lock:
+            for row in reversed(rows):
+                if row["id"] <= self.last_id:
+                    continue  # Déjà reçue (rattrapage et flux se recouvrent)
+                if len(self._rows) == self.size:
+                    self._floor = max(self._floor, self._rows[-1]["id"])  # Ligne évincée de la fenêtre
+                self._rows.appendleft(row)
+                self.last_id = row["id"]
+
+
+# Flux partagé par tous les onglets (démarré au premier chargement)
+live_feed = LiveFeed()
+
+
 @app.callback(
     Output("stored-data", "data"),
+    [Input("load-data-btn", "n_clicks"),
+     Input("live-interval", "n_intervals")],
+    [State("protocol-filter", "value"),
+     State("stored-data", "data")]
+)
+def store_data(n_clicks, n_intervals, selected_protocol, stored):
+    """
+    Premier chargement (ou changement de protocole) : chargement complet.
+    Ensuite, au clic comme à chaque tick de `live-interval` : les lignes plus récentes que `synced_id`
+    sont prises dans le flux partagé (`live_feed`, sans requête au backend), puis ajoutées en tête
+    de la fenêtre glissante (bornée à ROLLING_WINDOW lignes). Si le flux ne les a pas toutes,
+    seules les lignes manquantes sont demandées (mode delta) ; flux indisponible : mise à jour au clic uniquement.
+    """
+    if n_clicks == 0:
+        return {"protocol": selected_protocol, "rows": []}
+    live_feed.start()
+
+    if not stored or stored.get("protocol") != selected_protocol or stored.get("synced_id") is None:
+        synced_id = live_feed.last_id  # Lu avant la requête : toutes les lignes jusqu'à cet id sont déjà commitées
+        rows = fetch_data(selected_protocol).to_dict("records")[:ROLLING_WINDOW]
+        return {"protocol": selected_protocol, "rows": rows,
+                "synced_id": max([synced_id] + [row["id"] for row in rows])}
+
+    clicked = any(t["prop_id"].startswith("load-data-btn") for t in dash.callback_context.triggered)
+    delta, synced_id = live_feed.rows_since(stored["synced_id"], selected_protocol)
+    if delta is None:
+        if not (clicked or live_feed.connected):
+            return dash.no_update
+        synced_id = max(live_feed.last_id, stored["synced_id"])
+        delta = fetch_data(selected_protocol, since_id=stored["synced_id"]).to_dict("records")
+        synced_id = max([synced_id] + [row["id"] for row in delta])
+    elif not delta and synced_id == stored["synced_id"]:
+        return dash.no_update  # Rien de nouveau : aucun rendu
+
+    # Le backend renvoie les lignes de la plus récente à la plus ancienne, comme la fenêtre stockée
+    rows = (delta + stored["rows"])[:ROLLING_WINDOW]
+    return {"protocol": selected_protocol, "rows": rows, "synced_id": synced_id}
+
+
+def fetch_stats(protocol, hours):
+    """
+    Récupère les statistiques agrégées du backend (`/stats`) sur les `hours` dernières heures
+    (0 = tout l'historique).
+    """
+    try:
+        params = {"protocol": protocol} if protocol != "all" else {}
+        if hours:
+            params["start"] = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        response = requests.get(STATS_URL, params=params)
+
+        if response.status_code == 200:
+            return response.json()
+
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération des statistiques : {e}")
+
+    return {}
+
+
+@app.callback(
+    Output("stats-data", "data"),
     [Input("load-data-btn", "n_clicks")],
-    [State("protocol-filter", "value")]
+    [State("protocol-filter", "value"),
+     State("stats-range", "value")]
 )
-def store_data(n_clicks, selected_protocol):
+def store_stats(n_clicks, selected_protocol, hours):
     if n_clicks > 0:
-        return fetch_data(selected_protocol).to_dict("records")
+        return fetch_stats(selected_protocol, hours)
+    return {}
+
+
+def fetch_series(protocol, hours):
+    """
+    Récupère la série sous-échantillonnée du graphique d'activité (`/get_data?points=`) sur les `hours`
+    dernières heures (0 = tout l'historique) : au plus GRAPH_POINTS lignes, pics d'anomalie conservés.
+    """
+    try:
+        params = {"points": GRAPH_POINTS}
+        if protocol != "all":
+            params["protocol"] = protocol
+        if hours:
+            params["start"] = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        response = requests.get(API_URL, params=params)
+
+        if response.status_code == 200:
+            payload = response.json()
+            return payload if isinstance(payload, list) else []
+
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération de la série temporelle : {e}")
+
     return []
 
 
+@app.callback(
+    Output("series-data", "data"),
+    [Input("load-data-btn", "n_clicks")],
+    [State("protocol-filter", "value"),
+     State("stats-range", "value")]
+)
+def store_series(n_clicks, selected_protocol, hours):
+    if n_clicks > 0:
+        return {"protocol": selected_protocol, "rows": fetch_series(selected_protocol, hours)}
+    return {}
+
+
 # Callback pour mettre à jour les graphiques et le tableau
 @app.callback(
     [Output("network-traffic-graph", "figure"),
-     Output("log-table", "data"),
-     Output("anomaly-histogram", "figure"),
-     Output("protocol-pie-chart", "figure"),
-     Output("source-ip-bar-chart", "figure")],
-    [Input("stored-data", "data")]
+     Output("log-table", "data")],
+    [Input("stored-data", "data"),
+     Input("series-data", "data")]
 )
-def update_visuals(stored_data):
-    df = pd.DataFrame(stored_data)
+def update_visuals(stored_data, series):
+    df = pd.DataFrame(stored_data["rows"] if stored_data else [])
 
-    if df.empty:
+    # Graphique : série sous-échantillonnée de la période, prolongée par les lignes reçues en direct depuis
+    same_protocol = series and stored_data and series.get("protocol") == stored_data.get("protocol")
+    points = pd.DataFrame(series["rows"] if same_protocol else [])
+    if not df.empty:
+        live = df if points.empty else df[df["id"] > points["id"].max()]
+        points = pd.concat([live, points], ignore_index=True)
+
+    if points.empty:
         empty_fig = px.scatter(title="Aucune donnée disponible")
-        return empty_fig, [], empty_fig, empty_fig, empty_fig
+        return empty_fig, df.to_dict("records")
 
-    # Graphique des connexions réseau avec anomalies
+    # Une trace WebGL par classe prédite (et non une par point) : des milliers de points restent fluides
+    points["classe"] = points["port"].map({0: "Normal", 1: "Anomalie"})
     traffic_fig = px.scatter(
-        df,
+        points,
         x="timestamp",
         y="anomaly_score",
-        color="source_ip",
+        color="classe",
         title="Activité Réseau & Anomalies",
-        labels={"timestamp": "Temps", "anomaly_score": "Score d'Anomalie"},
+        labels={"timestamp": "Temps", "anomaly_score": "Score d'Anomalie", "classe": "Classe"},
         size="anomaly_score",
-        hover_data=["source_ip", "destination_ip", "port"]
+        hover_data=["source_ip", "destination_ip", "port", "attack_type"],
+        render_mode="webgl"
     )
 
-    # Histogramme des scores d'anomalie
-    anomaly_histogram = px.histogram(
-        df, x="anomaly_score", nbins=20,
+    return traffic_fig, df.to_dict("records")
+
+
+# Callback pour les graphiques de synthèse, alimentés par les agrégats du backend (`/stats`)
+@app.callback(
+    [Output("anomaly-histogram", "figure"),
+     Output("protocol-pie-chart", "figure"),
+     Output("source-ip-bar-chart", "figure")],
+    [Input("stats-data", "data")]
+)
+def update_stats_visuals(stats):
+    if not stats or not stats.get("total"):
+        empty_fig = px.scatter(title="Aucune donnée disponible")
+        return empty_fig, empty_fig, empty_fig
+
+    # Histogramme des scores d'anomalie (classes pré-calculées côté serveur)
+    width = stats["score_histogram"]["bucket_width"]
+    counts = stats["score_histogram"]["counts"]
+    anomaly_histogram = px.bar(
+        x=[round(i * width, 2) for i in range(len(counts))], y=counts,
         title="Distribution des Scores d'Anomalie",
-        labels={"anomaly_score": "Score d'Anomalie"}
+        labels={"x": "Score d'Anomalie", "y": "Nombre de Connexions"}
     )
 
     # Graphique circulaire des protocoles utilisés
     protocol_pie = px.pie(
-        df, names="protocol",
+        names=list(stats["by_protocol"].keys()), values=list(stats["by_protocol"].values()),
         title="Répartition des Protocoles Réseau"
     )
 
-    # Graphique en barres des connexions par IP source
-    source_ip_bar = px.bar(
-        df["source_ip"].value_counts().reset_index(),
-        x="index", y="source_ip",
-        title="Nombre de Connexions par IP Source",
-        labels={"index": "IP Source", "source_ip": "Nombre de Connexions"}
+    # Volume de connexions par minute, normales / anomalies
+    timeline = pd.DataFrame(stats["timeline"])
+    timeline["predicted_class"] = timeline["predicted_class"].map({0: "Normal", 1: "Anomalie"})
+    connections_bar = px.bar(
+        timeline, x="minute", y="count", color="predicted_class",
+        title="Nombre de Connexions par Minute",
+        labels={"minute": "Minute", "count": "Nombre de Connexions", "predicted_class": "Classe"}
     )
 
-    return traffic_fig, df.to_dict("records"), anomaly_histogram, protocol_pie, source_ip_bar
+    return anomaly_histogram, protocol_pie, connections_bar
 
 
 # Lancement du serveur Dash